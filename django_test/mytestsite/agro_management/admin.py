@@ -3,8 +3,20 @@ Configuración del panel de administración de Django para la aplicación agro_m
 Este archivo define cómo se mostrarán y gestionarán los modelos en el panel de administración.
 """
 
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.http import HttpResponse
+from django.core.exceptions import ImproperlyConfigured
 from .models import *
+from .asignacion import crear_asignaciones, proponer_asignaciones
+from .informes import generar_informe
+from .nomina import calcular_nomina
+from .parcelas import con_ultima_utilizacion, ultima_utilizacion
+from .trazabilidad import exportar_lista_retiro
+from .rutas import planificar_envios
+from .estados import transicionar
+from .facturacion import facturar
+from .totales import reconciliar_facturas
+from .proveedores import actualizar_indicadores, confirmar_coincidencias, rechazar_coincidencias
 
 #####################################
 # ADMINISTRACIÓN DE CULTIVOS
@@ -13,9 +25,16 @@ from .models import *
 @admin.register(Parcela)
 class ParcelaAdmin(admin.ModelAdmin):
     """Configuración de la vista de administración para Parcelas"""
-    list_display = ('codigo', 'nombre', 'superficie', 'ubicacion', 'fecha_ultima_utilizacion')  # Campos mostrados en la lista
+    list_display = ('codigo', 'nombre', 'superficie', 'ubicacion', 'ultima_utilizacion_efectiva', 'latitud', 'longitud')  # Campos mostrados en la lista
     search_fields = ('codigo', 'nombre', 'ubicacion')  # Campos para búsqueda
 
+    def get_queryset(self, request):
+        return con_ultima_utilizacion(super().get_queryset(request))
+
+    @admin.display(description="Última utilización", ordering='fin_ocupacion')
+    def ultima_utilizacion_efectiva(self, obj):
+        return ultima_utilizacion(obj.fecha_ultima_utilizacion, obj.fin_ocupacion)
+
 @admin.register(Cultivo)
 class CultivoAdmin(admin.ModelAdmin):
     """Configuración de la vista de administración para Cultivos"""
@@ -23,6 +42,36 @@ class CultivoAdmin(admin.ModelAdmin):
     search_fields = ('parcela__nombre', 'variedad__nombre')  # Campos para búsqueda
     list_filter = ('fecha_siembra',)  # Filtros disponibles
 
+@admin.register(PronosticoCosecha)
+class PronosticoCosechaAdmin(admin.ModelAdmin):
+    """Configuración de la vista de administración para Pronósticos de Cosecha"""
+    list_display = ('cultivo', 'fecha_cosecha', 'rendimiento_ha', 'produccion_minima_kg', 'produccion_kg', 'produccion_maxima_kg', 'fecha_calculo')
+    list_filter = ('cultivo__variedad', 'cultivo__parcela')
+
+@admin.register(ErrorPronostico)
+class ErrorPronosticoAdmin(admin.ModelAdmin):
+    """Distribución del error de los pronósticos por variedad, parcela y global"""
+    list_display = ('ambito', 'variedad', 'parcela', 'observaciones', 'error_medio', 'desviacion', 'percentil_10', 'percentil_90', 'error_dias_medio')
+    list_filter = ('ambito',)
+
+@admin.register(Sensor)
+class SensorAdmin(admin.ModelAdmin):
+    """Sensores de campo instalados en las parcelas y su token de envío"""
+    list_display = ('codigo', 'tipo', 'parcela', 'activo')
+    list_select_related = ('parcela',)
+    list_filter = ('tipo', 'activo')
+    search_fields = ('codigo', 'parcela__codigo', 'parcela__nombre')
+    readonly_fields = ('token',)
+
+@admin.register(AgregadoSensor)
+class AgregadoSensorAdmin(admin.ModelAdmin):
+    """Agregados por hora y por día de las lecturas de sensores"""
+    list_display = ('sensor', 'granularidad', 'inicio', 'lecturas', 'minimo', 'media', 'maximo')
+    list_select_related = ('sensor',)
+    list_filter = ('granularidad', 'sensor__tipo')
+    search_fields = ('sensor__codigo',)
+    date_hierarchy = 'inicio'
+
 @admin.register(TipoCultivo)
 class TipoCultivoAdmin(admin.ModelAdmin):
     """Configuración de la vista de administración para Tipos de Cultivo"""
@@ -30,16 +79,90 @@ class TipoCultivoAdmin(admin.ModelAdmin):
     search_fields = ('nombre',)
     list_filter = ('categoria',)
 
+class UmbralFenologicoInline(admin.TabularInline):
+    """Grados-día con los que la variedad alcanza cada etapa"""
+    model = UmbralFenologico
+    extra = 0
+
 @admin.register(Variedad)
 class VariedadAdmin(admin.ModelAdmin):
     """Configuración de la vista de administración para Variedades de Cultivo"""
-    list_display = ('nombre', 'tipo_cultivo', 'tiempo_maduracion', 'rendimiento_esperado')
+    list_display = ('nombre', 'tipo_cultivo', 'tiempo_maduracion', 'rendimiento_esperado', 'temperatura_base', 'temperatura_maxima')
     search_fields = ('nombre', 'tipo_cultivo__nombre')
+    inlines = [UmbralFenologicoInline]
+
+@admin.register(PrediccionEtapa)
+class PrediccionEtapaAdmin(admin.ModelAdmin):
+    """Fechas previstas de las etapas fenológicas según los grados-día acumulados"""
+    list_display = ('cultivo', 'umbral', 'fecha_estimada', 'fecha_observada', 'grados_dia_acumulados', 'fecha_calculo')
+    list_select_related = ('cultivo__variedad', 'cultivo__parcela', 'umbral__variedad')
+    list_filter = ('umbral__variedad', 'umbral__es_cosecha')
+
+@admin.register(ClimaDiario)
+class ClimaDiarioAdmin(admin.ModelAdmin):
+    """Registros diarios de la estación meteorológica"""
+    list_display = ('fecha', 'temperatura_minima', 'temperatura_maxima', 'precipitacion')
+    date_hierarchy = 'fecha'
+
+@admin.register(LaborAgricola)
+class LaborAgricolaAdmin(admin.ModelAdmin):
+    """Configuración de la vista de administración para Labores Agrícolas"""
+    list_display = ('tipo_labor', 'cultivo', 'fecha_realizacion', 'horas_empleadas', 'personal_asignado')
+    list_filter = ('tipo_labor', 'fecha_realizacion')
+    actions = ('asignar_personal',)
+
+    @admin.action(description="Asignar personal automáticamente")
+    def asignar_personal(self, request, queryset):
+        propuesta = proponer_asignaciones(queryset)
+        creadas = crear_asignaciones(propuesta)
+        self.message_user(request, f"{len(creadas)} asignaciones creadas", messages.SUCCESS)
+        if propuesta['sin_cubrir']:
+            faltan = sum(labor['faltan'] for labor in propuesta['sin_cubrir'])
+            self.message_user(
+                request,
+                f"{len(propuesta['sin_cubrir'])} labores quedan sin cubrir ({faltan} trabajadores faltantes)",
+                messages.WARNING,
+            )
+
+@admin.register(LoteInsumo)
+class LoteInsumoAdmin(admin.ModelAdmin):
+    """Configuración de la vista de administración para Lotes de Insumo"""
+    list_display = ('codigo_lote', 'insumo', 'proveedor', 'proveedor_registrado', 'fecha_adquisicion', 'cantidad_actual')
+    search_fields = ('codigo_lote', 'proveedor', 'proveedor_registrado__nombre')
+    list_filter = ('insumo__categoria', 'proveedor_registrado')
+    actions = ('exportar_retiro',)
+
+    @admin.action(description="Exportar lista de retiro (CSV)")
+    def exportar_retiro(self, request, queryset):
+        respuesta = HttpResponse(exportar_lista_retiro(queryset), content_type='text/csv; charset=utf-8')
+        respuesta['Content-Disposition'] = 'attachment; filename="lista_retiro.csv"'
+        return respuesta
 
 #####################################
 # ADMINISTRACIÓN DE VENTAS
 #####################################
 
+class TransicionesAdmin(admin.ModelAdmin):
+    """Modelos con máquina de estados (estados.py): el estado sólo cambia con las acciones"""
+    maquina = None
+
+    def get_readonly_fields(self, request, obj=None):
+        return (*super().get_readonly_fields(request, obj), 'estado')
+
+    def transicionar(self, request, queryset, destino):
+        resultado = transicionar(self.maquina, list(queryset.values_list('pk', flat=True)), destino, usuario=request.user)
+        mensaje = f"{resultado['cambiados']} pasados a {destino}"
+        if resultado['omitidos']:
+            mensaje += f"; {resultado['omitidos']} omitidos porque su estado no lo permite"
+        self.message_user(request, mensaje, messages.SUCCESS if resultado['cambiados'] else messages.WARNING)
+
+def accion_transicion(destino, descripcion):
+    @admin.action(description=descripcion)
+    def accion(modeladmin, request, queryset):
+        modeladmin.transicionar(request, queryset, destino)
+    accion.__name__ = f"pasar_a_{destino}"
+    return accion
+
 @admin.register(Cliente)
 class ClienteAdmin(admin.ModelAdmin):
     """Configuración de la vista de administración para Clientes"""
@@ -48,11 +171,32 @@ class ClienteAdmin(admin.ModelAdmin):
     list_filter = ('tipo',)
 
 @admin.register(Pedido)
-class PedidoAdmin(admin.ModelAdmin):
+class PedidoAdmin(TransicionesAdmin):
     """Configuración de la vista de administración para Pedidos"""
-    list_display = ('codigo', 'cliente', 'fecha_pedido', 'fecha_entrega_solicitada', 'estado')
+    list_display = ('codigo', 'cliente', 'fecha_pedido', 'fecha_entrega_solicitada', 'ruta', 'estado', 'lineas', 'total', 'peso_total')
+    list_select_related = ('cliente', 'ruta')
+    readonly_fields = ('lineas', 'total', 'peso_total')
     search_fields = ('codigo', 'cliente__nombre')
-    list_filter = ('estado', 'fecha_pedido')
+    list_filter = ('estado', 'fecha_pedido', 'ruta')
+    maquina = 'pedido'
+    actions = (
+        accion_transicion('en_proceso', "Pasar a en proceso (reserva inventario)"),
+        accion_transicion('pendiente', "Devolver a pendiente (libera la reserva)"),
+        accion_transicion('enviado', "Marcar como enviados (descuenta inventario)"),
+        accion_transicion('entregado', "Marcar como entregados"),
+        accion_transicion('cancelado', "Cancelar (libera la reserva)"),
+        'facturar_entregados',
+    )
+
+    @admin.action(description="Facturar los entregados sin factura")
+    def facturar_entregados(self, request, queryset):
+        resultado = facturar(list(queryset.values_list('pk', flat=True)))
+        if not resultado['facturadas']:
+            self.message_user(request, "Ningún pedido seleccionado está entregado y sin factura", messages.WARNING)
+            return
+        self.message_user(
+            request, f"{resultado['facturadas']} facturas emitidas ({resultado['desde']} a {resultado['hasta']})", messages.SUCCESS,
+        )
 
 @admin.register(ProductoTerminado)
 class ProductoTerminadoAdmin(admin.ModelAdmin):
@@ -62,11 +206,78 @@ class ProductoTerminadoAdmin(admin.ModelAdmin):
     list_filter = ('categoria_calidad',)
 
 @admin.register(Factura)
-class FacturaAdmin(admin.ModelAdmin):
+class FacturaAdmin(TransicionesAdmin):
     """Configuración de la vista de administración para Facturas"""
-    list_display = ('numero', 'pedido', 'fecha_emision', 'total', 'estado')
+    list_display = ('numero', 'pedido', 'fecha_emision', 'total', 'pagado', 'saldo', 'estado')
+    list_select_related = ('pedido__cliente',)
+    readonly_fields = ('pagado', 'saldo')
     search_fields = ('numero', 'pedido__codigo')
     list_filter = ('estado', 'fecha_emision')
+    maquina = 'factura'
+    actions = ('recalcular_saldos', accion_transicion('anulada', "Anular facturas emitidas"))
+
+    @admin.action(description="Recalcular saldos desde los pagos")
+    def recalcular_saldos(self, request, queryset):
+        total = reconciliar_facturas(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, f"{total} facturas recalculadas", messages.SUCCESS)
+
+@admin.register(SaldoClienteHistorico)
+class SaldoClienteHistoricoAdmin(admin.ModelAdmin):
+    """Instantáneas diarias de la antigüedad de saldos por cliente"""
+    list_display = (
+        'fecha', 'cliente', 'saldo_total', 'por_vencer', 'vencido_0_30', 'vencido_31_60',
+        'vencido_61_90', 'vencido_90_mas', 'facturas',
+    )
+    list_select_related = ('cliente',)
+    date_hierarchy = 'fecha'
+    search_fields = ('cliente__nombre',)
+
+@admin.register(SecuenciaDocumento)
+class SecuenciaDocumentoAdmin(admin.ModelAdmin):
+    """Numeración por bloques de los documentos (facturas)"""
+    list_display = ('nombre', 'siguiente')
+
+@admin.register(EventoEstado)
+class EventoEstadoAdmin(admin.ModelAdmin):
+    """Registro de las transiciones de estado hechas en bloque"""
+    list_display = ('fecha', 'modelo', 'objeto_id', 'estado_anterior', 'estado_nuevo', 'usuario', 'motivo')
+    list_select_related = ('usuario',)
+    list_filter = ('modelo', 'estado_nuevo')
+    date_hierarchy = 'fecha'
+    search_fields = ('objeto_id', 'motivo')
+
+class ParadaEnvioInline(admin.TabularInline):
+    """Paradas ordenadas de un envío"""
+    model = ParadaEnvio
+    extra = 0
+    fields = ('orden', 'pedido', 'distancia_acumulada', 'minutos_llegada', 'llegada_estimada')
+    readonly_fields = fields
+    ordering = ('orden',)
+
+@admin.register(Envio)
+class EnvioAdmin(TransicionesAdmin):
+    """Configuración de la vista de administración para Envíos"""
+    list_display = ('codigo', 'fecha_programada', 'hora_salida', 'ruta', 'vehiculo', 'estado')
+    list_select_related = ('ruta', 'vehiculo')
+    list_filter = ('estado', 'fecha_programada', 'ruta')
+    search_fields = ('codigo', 'vehiculo__placa')
+    inlines = (ParadaEnvioInline,)
+    maquina = 'envio'
+    actions = (
+        'planificar_paradas',
+        accion_transicion('en_transito', "Despachar (sus pedidos pasan a enviados)"),
+        accion_transicion('entregado', "Marcar como entregados (y sus pedidos)"),
+        accion_transicion('cancelado', "Cancelar envíos programados"),
+    )
+
+    @admin.action(description="Ordenar paradas y recalcular llegadas")
+    def planificar_paradas(self, request, queryset):
+        try:
+            paradas = planificar_envios(list(queryset.values_list('pk', flat=True)))
+        except ImproperlyConfigured as error:
+            self.message_user(request, str(error), messages.ERROR)
+            return
+        self.message_user(request, f"{len(paradas)} paradas planificadas", messages.SUCCESS)
 
 #####################################
 # ADMINISTRACIÓN DE RECURSOS
@@ -79,13 +290,105 @@ class TrabajadorAdmin(admin.ModelAdmin):
     search_fields = ('codigo', 'nombre_completo', 'documento_identidad')
     list_filter = ('estado', 'cargo')
 
+class LineaNominaInline(admin.TabularInline):
+    model = LineaNomina
+    extra = 0
+    readonly_fields = ('trabajador', 'contrato', 'salario_base', 'horas_trabajadas', 'horas_extra', 'pago_horas_extra', 'total_bruto')
+    can_delete = False
+
+@admin.register(PeriodoNomina)
+class PeriodoNominaAdmin(admin.ModelAdmin):
+    """Configuración de la vista de administración para Periodos de Nómina"""
+    list_display = ('codigo', 'fecha_inicio', 'fecha_fin', 'estado', 'fecha_calculo')
+    list_filter = ('estado',)
+    inlines = (LineaNominaInline,)
+    actions = ('calcular',)
+
+    @admin.action(description="Calcular nómina y costos de mano de obra")
+    def calcular(self, request, queryset):
+        for periodo in queryset:
+            try:
+                lineas = calcular_nomina(periodo)
+            except ValueError as error:
+                self.message_user(request, str(error), messages.ERROR)
+                continue
+            self.message_user(request, f"{periodo.codigo}: {lineas} líneas calculadas", messages.SUCCESS)
+
+@admin.register(EstadoCapacitacion)
+class EstadoCapacitacionAdmin(admin.ModelAdmin):
+    """Configuración de la vista de administración para la matriz de cumplimiento de capacitaciones"""
+    list_display = ('trabajador', 'capacitacion', 'estado', 'fecha_completada', 'fecha_vencimiento')
+    search_fields = ('trabajador__codigo', 'trabajador__nombre_completo', 'capacitacion__nombre')
+    list_filter = ('estado', 'capacitacion', 'trabajador__cargo')
+    list_select_related = ('trabajador', 'capacitacion')
+
 @admin.register(Maquinaria)
 class MaquinariaAdmin(admin.ModelAdmin):
     """Configuración de la vista de administración para Maquinaria"""
-    list_display = ('codigo', 'categoria', 'marca', 'modelo', 'estado')
+    list_display = ('codigo', 'categoria', 'marca', 'modelo', 'horas_uso', 'estado')
     search_fields = ('codigo', 'marca', 'modelo')
     list_filter = ('estado', 'categoria')
 
+@admin.register(MantenimientoMaquinaria)
+class MantenimientoMaquinariaAdmin(TransicionesAdmin):
+    """Configuración de la vista de administración para Mantenimientos de Maquinaria"""
+    list_display = ('codigo', 'maquinaria', 'tipo', 'fecha_programada', 'fecha_inicio', 'fecha_finalizacion', 'estado')
+    list_select_related = ('maquinaria',)
+    list_filter = ('estado', 'tipo', 'fecha_programada')
+    search_fields = ('codigo', 'maquinaria__codigo')
+    maquina = 'mantenimiento'
+    actions = (
+        accion_transicion('en_proceso', "Iniciar mantenimiento"),
+        accion_transicion('completado', "Completar mantenimiento"),
+        accion_transicion('cancelado', "Cancelar mantenimiento"),
+    )
+
+@admin.register(DispositivoTelemetria)
+class DispositivoTelemetriaAdmin(admin.ModelAdmin):
+    """Equipos de telemetría y su token de envío"""
+    list_display = ('codigo', 'tipo', 'vehiculo', 'maquinaria', 'activo')
+    list_select_related = ('vehiculo', 'maquinaria')
+    list_filter = ('tipo', 'activo')
+    search_fields = ('codigo', 'vehiculo__placa', 'maquinaria__codigo')
+    readonly_fields = ('token',)
+
+@admin.register(EstadoDispositivo)
+class EstadoDispositivoAdmin(admin.ModelAdmin):
+    """Última posición y lectura de cada equipo"""
+    list_display = ('dispositivo', 'momento', 'latitud', 'longitud', 'velocidad', 'horas_motor')
+    list_select_related = ('dispositivo',)
+    search_fields = ('dispositivo__codigo',)
+
+@admin.register(ResumenTelemetria)
+class ResumenTelemetriaAdmin(admin.ModelAdmin):
+    """Resúmenes de telemetría por minuto y por hora"""
+    list_display = ('dispositivo', 'granularidad', 'inicio', 'lecturas', 'velocidad_maxima', 'horas_motor_max')
+    list_select_related = ('dispositivo',)
+    list_filter = ('granularidad',)
+    search_fields = ('dispositivo__codigo',)
+    date_hierarchy = 'inicio'
+
+@admin.register(InformeFinanciero)
+class InformeFinancieroAdmin(admin.ModelAdmin):
+    """Configuración de la vista de administración para Informes Financieros"""
+    list_display = ('codigo', 'titulo', 'tipo', 'fecha_inicio', 'fecha_fin', 'fecha_generacion', 'archivo')
+    search_fields = ('codigo', 'titulo')
+    list_filter = ('tipo', 'fecha_generacion')
+    actions = ('generar_csv', 'generar_html')
+
+    def _generar(self, request, queryset, formato):
+        for informe in queryset:
+            ruta = generar_informe(informe, formato=formato)
+            self.message_user(request, f"{informe.codigo}: generado en {ruta}", messages.SUCCESS)
+
+    @admin.action(description="Generar informe en CSV")
+    def generar_csv(self, request, queryset):
+        self._generar(request, queryset, 'csv')
+
+    @admin.action(description="Generar informe en HTML")
+    def generar_html(self, request, queryset):
+        self._generar(request, queryset, 'html')
+
 @admin.register(CostoOperativo)
 class CostoOperativoAdmin(admin.ModelAdmin):
     """Configuración de la vista de administración para Costos Operativos"""
@@ -110,10 +413,8 @@ admin.site.register(ControlPlagasEnfermedades)
 admin.site.register(AccionCorrectiva)
 admin.site.register(EtapaFenologica)
 admin.site.register(TipoLabor)
-admin.site.register(LaborAgricola)
 admin.site.register(CategoriaInsumo)
 admin.site.register(InsumoAgricola)
-admin.site.register(LoteInsumo)
 admin.site.register(UsoInsumo)
 admin.site.register(ContactoCliente)
 admin.site.register(PreferenciaProducto)
@@ -126,7 +427,6 @@ admin.site.register(DetallePedido)
 admin.site.register(Vehiculo)
 admin.site.register(RutaEntrega)
 admin.site.register(PuntoIntermedio)
-admin.site.register(Envio)
 admin.site.register(DocumentoEnvio)
 admin.site.register(Pago)
 admin.site.register(Devolucion)
@@ -136,17 +436,61 @@ admin.site.register(Habilidad)
 admin.site.register(HabilidadTrabajador)
 admin.site.register(Capacitacion)
 admin.site.register(CapacitacionTrabajador)
+admin.site.register(RequisitoCapacitacion)
 admin.site.register(Contrato)
+admin.site.register(RequisitoLabor)
 admin.site.register(AsignacionLabor)
 admin.site.register(CategoriaMaquinaria)
-admin.site.register(MantenimientoMaquinaria)
+admin.site.register(ReglaMantenimiento)
 admin.site.register(UsoMaquinaria)
+admin.site.register(OcupacionRecurso)
+admin.site.register(SegmentoOcupacion)
 admin.site.register(TipoCosto)
 admin.site.register(Presupuesto)
 admin.site.register(LineaPresupuesto)
-admin.site.register(InformeFinanciero)
 admin.site.register(AnalisisRentabilidad)
 admin.site.register(Proveedor)
+
+@admin.register(CoincidenciaProveedor)
+class CoincidenciaProveedorAdmin(admin.ModelAdmin):
+    """Revisión de las coincidencias entre el texto de los lotes y los proveedores registrados"""
+    list_display = ('texto', 'proveedor', 'puntuacion', 'metodo', 'estado', 'fecha_revision')
+    list_editable = ('proveedor',)
+    search_fields = ('texto', 'proveedor__nombre')
+    list_filter = ('estado', 'metodo')
+    actions = ('confirmar', 'rechazar')
+
+    @admin.action(description="Confirmar y vincular los lotes")
+    def confirmar(self, request, queryset):
+        vinculados = confirmar_coincidencias(queryset)
+        self.message_user(request, f"{vinculados} lotes vinculados", messages.SUCCESS)
+
+    @admin.action(description="Rechazar coincidencias")
+    def rechazar(self, request, queryset):
+        rechazadas = rechazar_coincidencias(queryset)
+        self.message_user(request, f"{rechazadas} coincidencias rechazadas", messages.SUCCESS)
 admin.site.register(ContactoProveedor)
 admin.site.register(Contrato_Proveedor)
-admin.site.register(EvaluacionProveedor)
\ No newline at end of file
+
+@admin.register(EvaluacionProveedor)
+class EvaluacionProveedorAdmin(admin.ModelAdmin):
+    """Configuración de la vista de administración para EvaluacionProveedor"""
+    list_display = ('proveedor', 'fecha', 'puntuacion_total', 'evaluador')
+    list_filter = ('fecha',)
+    search_fields = ('proveedor__nombre', 'evaluador')
+
+@admin.register(IndicadorProveedor)
+class IndicadorProveedorAdmin(admin.ModelAdmin):
+    """Ranking de proveedores por puntuación compuesta"""
+    list_display = (
+        'proveedor', 'puntuacion', 'promedio_90', 'evaluaciones_90', 'promedio_365',
+        'tasa_caducidad', 'tasa_consumo', 'fecha_calculo',
+    )
+    ordering = ('-puntuacion',)
+    search_fields = ('proveedor__nombre',)
+    actions = ('recalcular',)
+
+    @admin.action(description="Recalcular indicadores")
+    def recalcular(self, request, queryset):
+        total = actualizar_indicadores(queryset.values_list('proveedor_id', flat=True))
+        self.message_user(request, f"{total} indicadores recalculados", messages.SUCCESS)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AgroManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'agro_management'
+
+    def ready(self):
+        # Registrar los manejadores de señales de la aplicación
+        from . import signals  # noqa: F401
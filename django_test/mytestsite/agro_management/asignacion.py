@@ -0,0 +1,189 @@
+"""
+Asignación automática de trabajadores a labores agrícolas.
+
+El motor recibe un conjunto de LaborAgricola (normalmente las de un día o una
+semana) y propone asignaciones que respetan:
+
+- los requisitos de habilidad de cada TipoLabor (RequisitoLabor),
+- la vigencia de los contratos de cada trabajador en la fecha de la labor,
+- el máximo de horas diarias por trabajador, descontando las asignaciones
+  que ya existen.
+
+Habilidades y contratos se representan como conjuntos de bits (enteros de
+Python): cada trabajador tiene un índice y cada par (habilidad, nivel) un bit.
+Los candidatos de una labor salen de intersecciones de bits, y las horas
+libres se guardan en un array plano trabajador × día.
+"""
+
+import datetime
+import heapq
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .models import (
+    AsignacionLabor, Contrato, HabilidadTrabajador, LaborAgricola, RequisitoLabor, Trabajador,
+)
+
+# Orden de los niveles: un nivel cubre todos los inferiores
+NIVELES = [clave for clave, _ in HabilidadTrabajador.NIVEL_CHOICES]
+
+
+def _indices(bits):
+    """Recorre los índices de los bits activos de un entero."""
+    while bits:
+        bajo = bits & -bits
+        yield bajo.bit_length() - 1
+        bits ^= bajo
+
+
+def proponer_asignaciones(labores, horas_maximas_dia=None):
+    """
+    Calcula una propuesta de asignación para las labores indicadas.
+
+    Devuelve un diccionario con la lista 'asignaciones' (trabajador_id,
+    labor_id, horas) y la lista 'sin_cubrir' con las labores a las que les
+    faltan trabajadores. No escribe nada en la base de datos.
+    """
+    if horas_maximas_dia is None:
+        horas_maximas_dia = getattr(settings, 'ASIGNACION_HORAS_MAXIMAS_DIA', 8)
+
+    labores = list(
+        LaborAgricola.objects
+        .filter(pk__in=labores.values('pk') if hasattr(labores, 'values') else labores)
+        .annotate(ya_asignados=Count('asignaciones'))
+        .values('pk', 'tipo_labor_id', 'fecha_realizacion', 'horas_empleadas', 'personal_asignado', 'ya_asignados')
+    )
+    resultado = {'asignaciones': [], 'sin_cubrir': []}
+    if not labores:
+        return resultado
+
+    fechas = sorted({labor['fecha_realizacion'] for labor in labores})
+    inicio, fin = fechas[0], fechas[-1]
+    dias = (fin - inicio).days + 1
+
+    # Bits de requisito: (habilidad, nivel) -> índice
+    requisitos = defaultdict(int)
+    bit_requisito = {}
+    for tipo_labor_id, habilidad_id, nivel in RequisitoLabor.objects.values_list(
+            'tipo_labor_id', 'habilidad_id', 'nivel_minimo'):
+        clave = (habilidad_id, nivel)
+        if clave not in bit_requisito:
+            bit_requisito[clave] = len(bit_requisito)
+        requisitos[tipo_labor_id] |= 1 << bit_requisito[clave]
+
+    # Trabajadores activos con contrato vigente en algún día del rango
+    contratos = list(
+        Contrato.objects
+        .filter(trabajador__estado__iexact='activo', fecha_inicio__lte=fin)
+        .filter(Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=inicio))
+        .values_list('trabajador_id', 'fecha_inicio', 'fecha_fin')
+    )
+    ids = sorted({trabajador_id for trabajador_id, _, _ in contratos})
+    indice = {trabajador_id: i for i, trabajador_id in enumerate(ids)}
+
+    vigentes = [0] * dias
+    for trabajador_id, desde, hasta in contratos:
+        bit = 1 << indice[trabajador_id]
+        primero = max((desde - inicio).days, 0)
+        ultimo = min(((hasta or fin) - inicio).days, dias - 1)
+        for dia in range(primero, ultimo + 1):
+            vigentes[dia] |= bit
+
+    # Bitset de trabajadores por bit de requisito y número de habilidades útiles
+    trabajadores_por_bit = [0] * len(bit_requisito)
+    habilidades = array('H', [0]) * len(ids)
+    for trabajador_id, habilidad_id, nivel in HabilidadTrabajador.objects.filter(
+            trabajador_id__in=ids, habilidad_id__in={h for h, _ in bit_requisito}).values_list(
+            'trabajador_id', 'habilidad_id', 'nivel'):
+        i = indice[trabajador_id]
+        habilidades[i] += 1
+        for minimo in NIVELES[:NIVELES.index(nivel) + 1]:
+            bit = bit_requisito.get((habilidad_id, minimo))
+            if bit is not None:
+                trabajadores_por_bit[bit] |= 1 << i
+
+    todos = (1 << len(ids)) - 1
+    aptos_cache = {}
+
+    def aptos(mascara):
+        if mascara not in aptos_cache:
+            conjunto = todos
+            for bit in _indices(mascara):
+                conjunto &= trabajadores_por_bit[bit]
+            aptos_cache[mascara] = conjunto
+        return aptos_cache[mascara]
+
+    # Horas libres por trabajador y día (array plano)
+    libres = array('d', [float(horas_maximas_dia)]) * (len(ids) * dias)
+    for trabajador_id, fecha, horas in (
+            AsignacionLabor.objects
+            .filter(trabajador_id__in=ids, labor__fecha_realizacion__range=(inicio, fin))
+            .values_list('trabajador_id', 'labor__fecha_realizacion')
+            .annotate(total=Sum('horas_asignadas'))
+            .order_by()):
+        libres[indice[trabajador_id] * dias + (fecha - inicio).days] -= float(horas)
+
+    ya_en_labor = defaultdict(int)
+    for labor_id, trabajador_id in AsignacionLabor.objects.filter(
+            labor_id__in=[labor['pk'] for labor in labores], trabajador_id__in=ids).values_list(
+            'labor_id', 'trabajador_id'):
+        ya_en_labor[labor_id] |= 1 << indice[trabajador_id]
+
+    # Primero las labores con menos candidatos
+    pendientes = []
+    for labor in labores:
+        dia = (labor['fecha_realizacion'] - inicio).days
+        candidatos = aptos(requisitos[labor['tipo_labor_id']]) & vigentes[dia] & ~ya_en_labor[labor['pk']]
+        pendientes.append((candidatos.bit_count(), labor['pk'], labor, dia, candidatos))
+    pendientes.sort(key=lambda pendiente: pendiente[:2])
+
+    for _, labor_id, labor, dia, candidatos in pendientes:
+        faltan = labor['personal_asignado'] - labor['ya_asignados']
+        if faltan <= 0:
+            continue
+        horas = float(labor['horas_empleadas'])
+        # Preferir a quien tenga menos habilidades requeridas y más horas libres
+        elegidos = heapq.nsmallest(faltan, (
+            (habilidades[i], -libres[i * dias + dia], i)
+            for i in _indices(candidatos)
+            if libres[i * dias + dia] >= horas
+        ))
+        for _, _, i in elegidos:
+            libres[i * dias + dia] -= horas
+            resultado['asignaciones'].append({
+                'trabajador_id': ids[i],
+                'labor_id': labor_id,
+                'horas': labor['horas_empleadas'],
+            })
+        if len(elegidos) < faltan:
+            resultado['sin_cubrir'].append({'labor_id': labor_id, 'faltan': faltan - len(elegidos)})
+
+    return resultado
+
+
+@transaction.atomic
+def crear_asignaciones(propuesta, rol='Operario', batch_size=500):
+    """Crea en bloque las asignaciones de una propuesta."""
+    return AsignacionLabor.objects.bulk_create([
+        AsignacionLabor(
+            trabajador_id=asignacion['trabajador_id'],
+            labor_id=asignacion['labor_id'],
+            horas_asignadas=asignacion['horas'],
+            rol=rol,
+        )
+        for asignacion in propuesta['asignaciones']
+    ], batch_size=batch_size)
+
+
+def labores_del_periodo(fecha_inicio, fecha_fin=None):
+    """Labores con fecha de realización entre fecha_inicio y fecha_fin."""
+    fecha_fin = fecha_fin or fecha_inicio
+    if isinstance(fecha_inicio, str):
+        fecha_inicio = datetime.date.fromisoformat(fecha_inicio)
+    if isinstance(fecha_fin, str):
+        fecha_fin = datetime.date.fromisoformat(fecha_fin)
+    return LaborAgricola.objects.filter(fecha_realizacion__range=(fecha_inicio, fecha_fin))
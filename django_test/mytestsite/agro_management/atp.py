@@ -0,0 +1,229 @@
+"""
+Disponible para prometer (ATP) por variedad.
+
+Para cada Variedad se mantiene en memoria una línea de tiempo de oferta y
+demanda en kilogramos:
+
+- oferta: inventario disponible menos reservado (hoy) y cosechas esperadas de
+  los cultivos abiertos (cantidad de su PronosticoCosecha si existe; fecha
+  según la precedencia de cosechas_esperadas),
+- demanda: líneas de los pedidos pendientes (en su fecha_entrega_solicitada).
+
+De la línea se guarda el saldo acumulado y su mínimo a futuro (mínimo de
+sufijo). Como ese mínimo no decrece con la fecha, la primera fecha en la que
+se pueden comprometer q kg sin dejar el saldo negativo se busca con bisect.
+
+Las líneas se reconstruyen por variedad y sólo cuando cambia su versión
+(VersionATP, que las señales incrementan al modificar inventario, pedidos o
+cultivos) o cuando cambia el día. El contador vive en la base de datos, así
+que la invalidación alcanza a todos los procesos sin configurar una caché
+compartida, y se lee con una sola consulta por llamada a lineas().
+"""
+
+import bisect
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, Exists, F, OuterRef, Value, When
+from django.utils import timezone
+
+from .models import Cultivo, DetallePedido, InventarioProducto, PrediccionEtapa, ProductoTerminado, VersionATP
+
+CERO = Decimal('0')
+
+# Kilogramos por unidad de Presentacion.unidad_medida; el resto se toma como kg
+FACTORES_KG = {
+    'kg': Decimal('1'),
+    'g': Decimal('0.001'),
+    't': Decimal('1000'),
+    'tn': Decimal('1000'),
+    'lb': Decimal('0.45359237'),
+}
+
+# Estados de pedido cuya demanda aún no está reservada en el inventario
+ESTADOS_DEMANDA = ('pendiente',)
+
+_lineas = {}
+
+
+def invalidar(variedad_ids):
+    """Marca como obsoletas las líneas de tiempo de las variedades indicadas."""
+    variedad_ids = {variedad_id for variedad_id in variedad_ids if variedad_id is not None}
+    if not variedad_ids:
+        return
+    VersionATP.objects.bulk_create(
+        [VersionATP(variedad_id=variedad_id) for variedad_id in variedad_ids], ignore_conflicts=True,
+    )
+    VersionATP.objects.filter(variedad_id__in=variedad_ids).update(version=F('version') + 1)
+
+
+def variedades_de_productos(producto_ids):
+    return set(
+        ProductoTerminado.objects.filter(pk__in=producto_ids).values_list('cultivo__variedad_id', flat=True)
+    )
+
+
+def kg_por_unidad(capacidad, unidad_medida):
+    return capacidad * FACTORES_KG.get((unidad_medida or '').strip().lower(), Decimal('1'))
+
+
+def expresion_kg_por_unidad(presentacion):
+    """Equivalente en SQL de kg_por_unidad para la ruta de una Presentacion (p. ej. 'producto__presentacion')."""
+    factor = Case(
+        *[When(**{f'{presentacion}__unidad_medida__iexact': unidad}, then=Value(valor)) for unidad, valor in FACTORES_KG.items()],
+        default=Value(Decimal('1')),
+        output_field=DecimalField(max_digits=12, decimal_places=8),
+    )
+    return F(f'{presentacion}__capacidad') * factor
+
+
+def cosechas_esperadas(variedad_ids, hoy):
+    """
+    Ternas (variedad_id, fecha, kg) de los cultivos aún no cosechados.
+
+    La cantidad es la producción mínima del PronosticoCosecha si existe; si
+    no, área × rendimiento esperado. La fecha sigue esta precedencia:
+
+    1. fecha_cosecha_estimada si fenologia.actualizar() la fijó desde los
+       grados-día (hay una PrediccionEtapa de cosecha con fecha): refleja el
+       clima de la campaña y es la más reciente;
+    2. la fecha del PronosticoCosecha (siembra + ciclo medio de la variedad);
+    3. fecha_cosecha_estimada tal como se planificó.
+    """
+    prediccion_gdd = PrediccionEtapa.objects.filter(
+        cultivo=OuterRef('pk'), umbral__es_cosecha=True, fecha_estimada__isnull=False,
+    )
+    for variedad_id, fecha, area, rendimiento, fecha_pronostico, minima, por_gdd in (
+            Cultivo.objects
+            .filter(variedad_id__in=variedad_ids, fecha_cosecha_real__isnull=True)
+            .annotate(por_gdd=Exists(prediccion_gdd))
+            .values_list(
+                'variedad_id', 'fecha_cosecha_estimada', 'area_sembrada', 'variedad__rendimiento_esperado',
+                'pronostico__fecha_cosecha', 'pronostico__produccion_minima_kg', 'por_gdd',
+            )):
+        if fecha_pronostico is not None and not por_gdd:
+            fecha = fecha_pronostico
+        kg = minima if minima is not None else area * rendimiento
+        yield variedad_id, max(fecha, hoy), kg
+
+
+class LineaATP:
+    """Saldo acumulado de una variedad y su mínimo a futuro, por fecha."""
+
+    def __init__(self, hoy, movimientos):
+        por_fecha = defaultdict(lambda: CERO)
+        por_fecha[hoy] += CERO
+        for fecha, kg in movimientos:
+            por_fecha[max(fecha, hoy)] += kg
+        self.hoy = hoy
+        self.fechas = sorted(por_fecha)
+        self.saldos = []
+        saldo = CERO
+        for fecha in self.fechas:
+            saldo += por_fecha[fecha]
+            self.saldos.append(saldo)
+        self.minimos = list(self.saldos)
+        for i in range(len(self.minimos) - 2, -1, -1):
+            self.minimos[i] = min(self.minimos[i], self.minimos[i + 1])
+
+    def fecha_promesa(self, kg):
+        """Primera fecha desde la que se pueden comprometer kg, o None."""
+        i = bisect.bisect_left(self.minimos, kg)
+        return self.fechas[i] if i < len(self.fechas) else None
+
+    def disponible(self, fecha):
+        """Kilogramos que se pueden prometer para una fecha."""
+        i = bisect.bisect_right(self.fechas, fecha) - 1
+        if i < 0:
+            return CERO
+        return max(self.minimos[i], CERO)
+
+
+def _construir(variedad_ids, hoy):
+    movimientos = defaultdict(list)
+    for variedad_id, disponible, reservada, capacidad, unidad in (
+            InventarioProducto.objects
+            .filter(producto__cultivo__variedad_id__in=variedad_ids)
+            .values_list(
+                'producto__cultivo__variedad_id', 'cantidad_disponible', 'cantidad_reservada',
+                'producto__presentacion__capacidad', 'producto__presentacion__unidad_medida',
+            )):
+        movimientos[variedad_id].append((hoy, (disponible - reservada) * kg_por_unidad(capacidad, unidad)))
+    for variedad_id, fecha, kg in cosechas_esperadas(variedad_ids, hoy):
+        movimientos[variedad_id].append((fecha, kg))
+    for variedad_id, fecha, cantidad, capacidad, unidad in (
+            DetallePedido.objects
+            .filter(producto__cultivo__variedad_id__in=variedad_ids, pedido__estado__in=ESTADOS_DEMANDA)
+            .values_list(
+                'producto__cultivo__variedad_id', 'pedido__fecha_entrega_solicitada', 'cantidad',
+                'producto__presentacion__capacidad', 'producto__presentacion__unidad_medida',
+            )):
+        movimientos[variedad_id].append((fecha, -cantidad * kg_por_unidad(capacidad, unidad)))
+    return {variedad_id: LineaATP(hoy, movimientos[variedad_id]) for variedad_id in variedad_ids}
+
+
+def lineas(variedad_ids, hoy=None):
+    """Líneas de tiempo vigentes de las variedades, reconstruyendo sólo las obsoletas."""
+    hoy = hoy or timezone.localdate()
+    variedad_ids = set(variedad_ids)
+    versiones = dict(VersionATP.objects.filter(variedad_id__in=variedad_ids).values_list('variedad_id', 'version'))
+    resultado = {}
+    obsoletas = []
+    for variedad_id in variedad_ids:
+        version = versiones.get(variedad_id, 0)
+        vigente = _lineas.get(variedad_id)
+        if vigente and vigente[0] == version and vigente[1].hoy == hoy:
+            resultado[variedad_id] = vigente[1]
+        else:
+            obsoletas.append((variedad_id, version))
+    if obsoletas:
+        nuevas = _construir([variedad_id for variedad_id, _ in obsoletas], hoy)
+        for variedad_id, version in obsoletas:
+            _lineas[variedad_id] = (version, nuevas[variedad_id])
+            resultado[variedad_id] = nuevas[variedad_id]
+    return resultado
+
+
+def prometer(lineas_pedido, fecha_solicitada=None, hoy=None):
+    """
+    Fecha de promesa de un pedido de varias líneas.
+
+    lineas_pedido es una lista de pares (producto_id, cantidad en unidades de
+    su presentación). Las líneas de una misma variedad se suman. Devuelve un
+    diccionario con la fecha de promesa del pedido (la mayor de sus
+    variedades, o None si alguna no puede cubrirse) y el detalle por variedad.
+    """
+    hoy = hoy or timezone.localdate()
+    productos = {
+        fila['pk']: fila
+        for fila in ProductoTerminado.objects
+        .filter(pk__in=[producto_id for producto_id, _ in lineas_pedido])
+        .values('pk', variedad_id=F('cultivo__variedad_id'), capacidad=F('presentacion__capacidad'),
+                unidad=F('presentacion__unidad_medida'))
+    }
+    faltantes = [producto_id for producto_id, _ in lineas_pedido if producto_id not in productos]
+    if faltantes:
+        raise ProductoTerminado.DoesNotExist(f"No existen los productos {faltantes}")
+
+    requerido = defaultdict(lambda: CERO)
+    for producto_id, cantidad in lineas_pedido:
+        producto = productos[producto_id]
+        requerido[producto['variedad_id']] += Decimal(cantidad) * kg_por_unidad(producto['capacidad'], producto['unidad'])
+
+    vigentes = lineas(requerido, hoy)
+    detalle = []
+    fecha_pedido = hoy
+    for variedad_id, kg in requerido.items():
+        fecha = vigentes[variedad_id].fecha_promesa(kg)
+        detalle.append({
+            'variedad_id': variedad_id,
+            'kg': kg,
+            'fecha_promesa': fecha,
+            'disponible_en_fecha_solicitada': vigentes[variedad_id].disponible(fecha_solicitada) if fecha_solicitada else None,
+        })
+        fecha_pedido = None if fecha is None or fecha_pedido is None else max(fecha_pedido, fecha)
+    return {
+        'fecha_promesa': fecha_pedido,
+        'cumple': bool(fecha_pedido and fecha_solicitada and fecha_pedido <= fecha_solicitada),
+        'variedades': detalle,
+    }
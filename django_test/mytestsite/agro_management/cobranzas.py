@@ -0,0 +1,206 @@
+"""
+Cuentas por cobrar: antigüedad de saldos, histórico y aplicación de remesas.
+
+La antigüedad se calcula sobre Factura.saldo, que mantiene totales.py, así
+que el reparto por tramos de todos los clientes es una sola consulta
+agrupada por cliente, sin sumar pagos. Cada noche guardar_instantanea()
+guarda ese reparto en SaldoClienteHistorico, de modo que la evolución de la
+cartera se lee sin recalcular nada.
+
+Una remesa (un archivo con muchos pagos) se aplica con bulk_create de los
+Pago y un único UPDATE por lote sobre las facturas afectadas, que se leen
+bloqueadas (select_for_update) antes de validar los montos contra su saldo.
+"""
+
+import csv
+import datetime
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import informes, totales
+from .models import Factura, Pago, SaldoClienteHistorico
+
+CERO = Decimal('0')
+
+# Tramos de antigüedad: (campo, días mínimos, días máximos) desde fecha_vencimiento
+TRAMOS = (
+    ('por_vencer', None, -1),
+    ('vencido_0_30', 0, 30),
+    ('vencido_31_60', 31, 60),
+    ('vencido_61_90', 61, 90),
+    ('vencido_90_mas', 91, None),
+)
+
+CAMPOS_SALDO = ['facturas', 'saldo_total'] + [campo for campo, _, _ in TRAMOS]
+
+
+def _importe(expresion):
+    return Coalesce(expresion, Value(CERO), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def _filtro_tramo(hoy, minimo, maximo):
+    # dias = hoy - fecha_vencimiento, así que el rango de días invierte el de fechas
+    filtro = Q()
+    if minimo is not None:
+        filtro &= Q(fecha_vencimiento__lte=hoy - datetime.timedelta(days=minimo))
+    if maximo is not None:
+        filtro &= Q(fecha_vencimiento__gte=hoy - datetime.timedelta(days=maximo))
+    return filtro
+
+
+def facturas_pendientes():
+    return Factura.objects.filter(saldo__gt=0).exclude(estado='anulada')
+
+
+def _agregados(hoy):
+    agregados = {
+        campo: _importe(Sum('saldo', filter=_filtro_tramo(hoy, minimo, maximo)))
+        for campo, minimo, maximo in TRAMOS
+    }
+    agregados['facturas'] = Count('pk')
+    agregados['saldo_total'] = _importe(Sum('saldo'))
+    return agregados
+
+
+def antiguedad_por_cliente(hoy=None, cliente_ids=None):
+    """
+    Saldo pendiente de cada cliente repartido por tramos de antigüedad, en una
+    consulta agrupada y ordenado de mayor a menor saldo.
+    """
+    hoy = hoy or timezone.localdate()
+    facturas = facturas_pendientes()
+    if cliente_ids is not None:
+        facturas = facturas.filter(pedido__cliente__in=cliente_ids)
+    return list(
+        facturas
+        .values('pedido__cliente_id', 'pedido__cliente__nombre')
+        .annotate(**_agregados(hoy))
+        .order_by('-saldo_total', 'pedido__cliente__nombre')
+    )
+
+
+def antiguedad_total(hoy=None):
+    """Totales de la cartera por tramo."""
+    return facturas_pendientes().aggregate(**_agregados(hoy or timezone.localdate()))
+
+
+@transaction.atomic
+def guardar_instantanea(fecha=None, batch_size=1000):
+    """
+    Guarda la antigüedad por cliente a la fecha indicada (hoy por omisión)
+    en SaldoClienteHistorico, reemplazando la de esa fecha si ya existía.
+    Los saldos son los actuales, así que debe ejecutarse el mismo día.
+    """
+    fecha = fecha or timezone.localdate()
+    filas = [
+        SaldoClienteHistorico(
+            cliente_id=fila['pedido__cliente_id'], fecha=fecha, **{campo: fila[campo] for campo in CAMPOS_SALDO}
+        )
+        for fila in antiguedad_por_cliente(fecha)
+    ]
+    SaldoClienteHistorico.objects.filter(fecha=fecha).delete()
+    SaldoClienteHistorico.objects.bulk_create(filas, batch_size=batch_size)
+    return len(filas)
+
+
+def evolucion(desde, hasta, cliente_id=None):
+    """Serie histórica de la antigüedad (de un cliente o de toda la cartera) leída de las instantáneas."""
+    historico = SaldoClienteHistorico.objects.filter(fecha__range=(desde, hasta))
+    if cliente_id is not None:
+        return list(historico.filter(cliente_id=cliente_id).values('fecha', *CAMPOS_SALDO).order_by('fecha'))
+    return list(
+        historico
+        .values('fecha')
+        .annotate(**{campo: Sum(campo) for campo in CAMPOS_SALDO})
+        .order_by('fecha')
+    )
+
+
+#####################################
+# REMESAS DE PAGOS
+#####################################
+
+def leer_remesa(archivo):
+    """
+    Lee un CSV con cabecera factura,monto[,referencia] y devuelve sus filas
+    como diccionarios con el número de línea del archivo.
+    """
+    for linea, fila in enumerate(csv.DictReader(archivo), start=2):
+        yield {
+            'linea': linea,
+            'factura': (fila.get('factura') or '').strip(),
+            'monto': (fila.get('monto') or '').strip(),
+            'referencia': (fila.get('referencia') or '').strip(),
+        }
+
+
+def _lotes(filas, tamano):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+@transaction.atomic
+def aplicar_remesa(filas, fecha, metodo_pago, referencia='', batch_size=500):
+    """
+    Registra los pagos de una remesa por lotes: por cada lote una consulta
+    de facturas, un bulk_create de Pago y un UPDATE de sus saldos. Las filas
+    con factura desconocida o anulada, monto no válido o superior al saldo
+    pendiente no se aplican y se devuelven en 'errores'.
+    """
+    aplicados = 0
+    monto_total = CERO
+    errores = []
+    for lote in _lotes(filas, batch_size):
+        # Bloqueadas hasta el final: otra remesa o un pago manual simultáneo
+        # esperan y no validan contra el mismo saldo
+        facturas = {
+            numero: {'pk': pk, 'estado': estado, 'saldo': saldo}
+            for pk, numero, estado, saldo in Factura.objects.select_for_update().filter(
+                numero__in={fila['factura'] for fila in lote},
+            ).order_by('pk').values_list('pk', 'numero', 'estado', 'saldo')
+        }
+        pagos = []
+        cambios = defaultdict(lambda: {'pagado': CERO})
+        for fila in lote:
+            factura = facturas.get(fila['factura'])
+            try:
+                monto = Decimal(fila['monto'])
+            except InvalidOperation:
+                monto = None
+            if factura is None:
+                error = 'factura inexistente'
+            elif factura['estado'] == 'anulada':
+                error = 'factura anulada'
+            elif monto is None or not monto.is_finite() or monto <= 0:
+                error = 'monto no válido'
+            elif monto > factura['saldo']:
+                error = f"el monto excede el saldo pendiente ({factura['saldo']})"
+            else:
+                error = None
+            if error:
+                errores.append({'linea': fila.get('linea'), 'factura': fila['factura'], 'error': error})
+                continue
+            factura['saldo'] -= monto
+            cambios[factura['pk']]['pagado'] += monto
+            pagos.append(Pago(
+                factura_id=factura['pk'], fecha=fecha, monto=monto, metodo_pago=metodo_pago,
+                referencia=fila.get('referencia') or referencia,
+            ))
+            monto_total += monto
+        # bulk_create no emite señales: los saldos se ajustan en bloque
+        Pago.objects.bulk_create(pagos, batch_size=batch_size)
+        totales.ajustar_facturas(cambios)
+        informes.invalidar(['pagos'])
+        aplicados += len(pagos)
+    return {'aplicados': aplicados, 'monto': monto_total, 'errores': errores}
@@ -0,0 +1,157 @@
+"""
+Matriz de cumplimiento de capacitaciones.
+
+RequisitoCapacitacion define qué capacitaciones exige cada Cargo o Habilidad.
+EstadoCapacitacion materializa, para cada trabajador activo, el estado de cada
+capacitación que le corresponde. La matriz se resincroniza por trabajador
+cuando cambian sus capacitaciones, habilidades o cargo (o la fecha de fin
+de una capacitación en la que está inscrito), y los informes de
+brechas y vencimientos se resuelven con una sola consulta sobre ella.
+"""
+
+import datetime
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    CapacitacionTrabajador, EstadoCapacitacion, HabilidadTrabajador, RequisitoCapacitacion, Trabajador,
+)
+
+# Prioridad de los estados de CapacitacionTrabajador al elegir el vigente
+PRIORIDAD = {'completada': 3, 'en_curso': 2, 'programada': 1}
+
+
+def _requeridas(trabajador_ids=None):
+    """Pares (trabajador, capacitación) exigidos y su vigencia mínima en días."""
+    trabajadores = Trabajador.objects.filter(estado__iexact='activo')
+    if trabajador_ids is not None:
+        trabajadores = trabajadores.filter(pk__in=trabajador_ids)
+
+    requeridas = {}
+
+    def agregar(trabajador_id, capacitacion_id, vigencia):
+        clave = (trabajador_id, capacitacion_id)
+        if clave not in requeridas:
+            requeridas[clave] = vigencia
+        elif vigencia is not None:
+            actual = requeridas[clave]
+            requeridas[clave] = vigencia if actual is None else min(actual, vigencia)
+
+    for fila in (
+            trabajadores.filter(cargo__capacitaciones_requeridas__isnull=False)
+            .values_list('pk', 'cargo__capacitaciones_requeridas__capacitacion_id',
+                         'cargo__capacitaciones_requeridas__vigencia_dias')):
+        agregar(*fila)
+    for fila in (
+            HabilidadTrabajador.objects
+            .filter(trabajador__in=trabajadores, habilidad__capacitaciones_requeridas__isnull=False)
+            .values_list('trabajador_id', 'habilidad__capacitaciones_requeridas__capacitacion_id',
+                         'habilidad__capacitaciones_requeridas__vigencia_dias')):
+        agregar(*fila)
+    return requeridas
+
+
+@transaction.atomic
+def sincronizar(trabajador_ids=None, batch_size=1000):
+    """
+    Recalcula las filas de la matriz de los trabajadores indicados (o de
+    todos si trabajador_ids es None). Devuelve el número de filas vigentes.
+    """
+    requeridas = _requeridas(trabajador_ids)
+
+    registros = CapacitacionTrabajador.objects.exclude(estado='cancelada')
+    if trabajador_ids is not None:
+        registros = registros.filter(trabajador_id__in=trabajador_ids)
+    mejor = {}
+    for trabajador_id, capacitacion_id, estado, fecha_fin in registros.values_list(
+            'trabajador_id', 'capacitacion_id', 'estado', 'capacitacion__fecha_fin'):
+        clave = (trabajador_id, capacitacion_id)
+        if clave not in requeridas:
+            continue
+        candidato = (PRIORIDAD.get(estado, 0), fecha_fin, estado)
+        if clave not in mejor or candidato > mejor[clave]:
+            mejor[clave] = candidato
+
+    filas = []
+    for (trabajador_id, capacitacion_id), vigencia in requeridas.items():
+        _, fecha_fin, estado = mejor.get((trabajador_id, capacitacion_id), (0, None, 'pendiente'))
+        completada = fecha_fin if estado == 'completada' else None
+        vencimiento = None
+        if completada and vigencia is not None:
+            vencimiento = completada + datetime.timedelta(days=vigencia)
+        filas.append(EstadoCapacitacion(
+            trabajador_id=trabajador_id,
+            capacitacion_id=capacitacion_id,
+            estado=estado,
+            fecha_completada=completada,
+            fecha_vencimiento=vencimiento,
+        ))
+
+    # Quitar las filas que ya no corresponden a ningún requisito
+    sobrantes = EstadoCapacitacion.objects.all()
+    if trabajador_ids is not None:
+        sobrantes = sobrantes.filter(trabajador_id__in=trabajador_ids)
+    obsoletas = [
+        pk for pk, trabajador_id, capacitacion_id in sobrantes.values_list('pk', 'trabajador_id', 'capacitacion_id')
+        if (trabajador_id, capacitacion_id) not in requeridas
+    ]
+    EstadoCapacitacion.objects.filter(pk__in=obsoletas).delete()
+
+    EstadoCapacitacion.objects.bulk_create(
+        filas,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['trabajador', 'capacitacion'],
+        update_fields=['estado', 'fecha_completada', 'fecha_vencimiento'],
+    )
+    return len(filas)
+
+
+def trabajadores_afectados_por_requisito(requisito):
+    """Trabajadores cuya matriz depende de un RequisitoCapacitacion."""
+    if requisito.cargo_id:
+        return list(Trabajador.objects.filter(cargo_id=requisito.cargo_id).values_list('pk', flat=True))
+    return list(
+        HabilidadTrabajador.objects
+        .filter(habilidad_id=requisito.habilidad_id)
+        .values_list('trabajador_id', flat=True)
+        .distinct()
+    )
+
+
+def trabajadores_de_capacitacion(capacitacion_id):
+    """Trabajadores inscritos en una Capacitacion: su fecha de completada sale de ella."""
+    return list(
+        CapacitacionTrabajador.objects
+        .filter(capacitacion_id=capacitacion_id)
+        .values_list('trabajador_id', flat=True)
+        .distinct()
+    )
+
+
+def brechas(hoy=None, cargo=None, capacitacion=None):
+    """Capacitaciones requeridas no completadas o ya vencidas, en una consulta."""
+    hoy = hoy or timezone.localdate()
+    filas = EstadoCapacitacion.objects.filter(
+        ~Q(estado='completada') | Q(fecha_vencimiento__lt=hoy),
+    )
+    if cargo:
+        filas = filas.filter(trabajador__cargo=cargo)
+    if capacitacion:
+        filas = filas.filter(capacitacion=capacitacion)
+    return filas.select_related('trabajador', 'trabajador__cargo', 'capacitacion').order_by(
+        'trabajador__codigo', 'capacitacion__nombre',
+    )
+
+
+def por_vencer(dias=30, hoy=None):
+    """Capacitaciones completadas que vencen en los próximos `dias` días."""
+    hoy = hoy or timezone.localdate()
+    return (
+        EstadoCapacitacion.objects
+        .filter(estado='completada', fecha_vencimiento__range=(hoy, hoy + datetime.timedelta(days=dias)))
+        .select_related('trabajador', 'capacitacion')
+        .order_by('fecha_vencimiento')
+    )
@@ -0,0 +1,204 @@
+"""
+Consolidación de pedidos pendientes en envíos.
+
+Los pedidos pendientes con ruta asignada se agrupan por fecha de entrega
+solicitada y ruta, y cada grupo se empaqueta en los vehículos disponibles
+ese día con el algoritmo first-fit decreasing sobre Pedido.peso_total (que
+mantiene totales.py, así que no se leen las líneas). Al terminar cada carga
+pasa al vehículo libre más pequeño que la admite, para reservar los grandes
+a las rutas siguientes.
+
+Los Envio resultantes y sus vínculos con los pedidos se crean con
+bulk_create. Los pedidos conservan su estado; un pedido incluido en un envío
+programado o en tránsito no se vuelve a consolidar. consolidar() bloquea
+los pedidos candidatos y los vehículos disponibles (select_for_update) y
+vuelve a leerlos: una consolidación simultánea espera a que termine la
+primera y ya no ve sus pedidos ni los vehículos que ocupó.
+"""
+
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from . import eventos, rutas, secuencias
+from .models import Envio, Pedido, Vehiculo
+
+# Vehiculo.estado (texto libre) de los vehículos que pueden asignarse
+ESTADO_VEHICULO_DISPONIBLE = 'disponible'
+
+# Estados de envío que ocupan el vehículo y sus pedidos en su fecha
+ESTADOS_ENVIO_ACTIVOS = ('programado', 'en_transito')
+
+
+def pedidos_por_consolidar(desde, hasta, pedido_ids=None):
+    """Ternas (pedido_id, fecha, ruta_id, peso) de los pedidos pendientes sin envío activo."""
+    pedidos = Pedido.objects.filter(
+        estado='pendiente', ruta__isnull=False, fecha_entrega_solicitada__range=(desde, hasta),
+    )
+    if pedido_ids is not None:
+        pedidos = pedidos.filter(pk__in=pedido_ids)
+    return list(
+        pedidos
+        .exclude(envios__estado__in=ESTADOS_ENVIO_ACTIVOS)
+        .values_list('pk', 'fecha_entrega_solicitada', 'ruta_id', 'peso_total')
+        .order_by()
+    )
+
+
+def _vehiculos_disponibles():
+    return Vehiculo.objects.filter(estado__iexact=ESTADO_VEHICULO_DISPONIBLE, capacidad_carga__gt=0)
+
+
+def vehiculos_libres(desde, hasta):
+    """
+    Vehículos disponibles y los días en que ya tienen un envío activo.
+    Devuelve ([(vehiculo_id, capacidad)], {(vehiculo_id, fecha)}).
+    """
+    vehiculos = list(
+        _vehiculos_disponibles()
+        .values_list('pk', 'capacidad_carga')
+        .order_by('-capacidad_carga', 'pk')
+    )
+    ocupados = set(
+        Envio.objects
+        .filter(estado__in=ESTADOS_ENVIO_ACTIVOS, fecha_programada__range=(desde, hasta))
+        .values_list('vehiculo_id', 'fecha_programada')
+    )
+    return vehiculos, ocupados
+
+
+def empaquetar(pedidos, vehiculos):
+    """
+    First-fit decreasing de pedidos [(pedido_id, peso)] en vehículos
+    [(vehiculo_id, capacidad)] ordenados de mayor a menor capacidad.
+
+    Los vehículos usados se retiran de la lista. Devuelve (cargas,
+    sin_asignar), donde cada carga es un diccionario con vehiculo,
+    capacidad, peso y pedidos.
+    """
+    pedidos = sorted(pedidos, key=lambda pedido: pedido[1], reverse=True)
+    if not pedidos:
+        return [], []
+    minimo = pedidos[-1][1]
+    abiertas, cerradas, sin_asignar = [], [], []
+    for pedido_id, peso in pedidos:
+        for carga in abiertas:
+            if carga['peso'] + peso <= carga['capacidad']:
+                break
+        else:
+            if not vehiculos or vehiculos[0][1] < peso:
+                sin_asignar.append(pedido_id)
+                continue
+            vehiculo_id, capacidad = vehiculos.pop(0)
+            carga = {'vehiculo': vehiculo_id, 'capacidad': capacidad, 'peso': 0, 'pedidos': []}
+            abiertas.append(carga)
+        carga['peso'] += peso
+        carga['pedidos'].append(pedido_id)
+        # Una carga que ya no admite ni el pedido más ligero deja de revisarse
+        if carga['capacidad'] - carga['peso'] < minimo:
+            abiertas.remove(carga)
+            cerradas.append(carga)
+    cargas = cerradas + abiertas
+
+    # Cambio de cada carga (de la más ligera a la más pesada) al vehículo libre más pequeño que la admite
+    for carga in sorted(cargas, key=lambda carga: carga['peso']):
+        menores = [i for i, (_, capacidad) in enumerate(vehiculos) if carga['peso'] <= capacidad < carga['capacidad']]
+        if menores:
+            vehiculo_id, capacidad = vehiculos.pop(menores[-1])
+            vehiculos.append((carga['vehiculo'], carga['capacidad']))
+            vehiculos.sort(key=lambda vehiculo: vehiculo[1], reverse=True)
+            carga['vehiculo'], carga['capacidad'] = vehiculo_id, capacidad
+    return cargas, sin_asignar
+
+
+def planificar(desde, hasta=None, bloquear=False, batch_size=1000):
+    """
+    Plan de consolidación sin guardar: {'envios': [...], 'sin_asignar': [...]}.
+    Las rutas más cargadas de cada día eligen vehículo primero. Con
+    bloquear=True (dentro de una transacción) bloquea los pedidos y los
+    vehículos antes de leerlos.
+    """
+    hasta = hasta or desde
+    pedidos = pedidos_por_consolidar(desde, hasta)
+    if bloquear:
+        candidatos = [pedido_id for pedido_id, *_ in pedidos]
+        pedidos = []
+        for inicio in range(0, len(candidatos), batch_size):
+            lote = candidatos[inicio:inicio + batch_size]
+            list(Pedido.objects.select_for_update().filter(pk__in=lote).order_by('pk').values_list('pk', flat=True))
+            # Relectura tras el bloqueo: descarta lo que otra consolidación incluyó en un envío entretanto
+            pedidos.extend(pedidos_por_consolidar(desde, hasta, lote))
+        # Los vehículos se bloquean después de los pedidos, siempre en el mismo
+        # orden, y vehiculos_libres() lee su ocupación ya con el bloqueo
+        list(_vehiculos_disponibles().select_for_update().order_by('pk').values_list('pk', flat=True))
+    grupos = defaultdict(list)
+    for pedido_id, fecha, ruta_id, peso in pedidos:
+        grupos[fecha, ruta_id].append((pedido_id, peso))
+    vehiculos, ocupados = vehiculos_libres(desde, hasta)
+
+    envios, sin_asignar = [], []
+    for fecha in sorted({fecha for fecha, _ in grupos}):
+        libres = [vehiculo for vehiculo in vehiculos if (vehiculo[0], fecha) not in ocupados]
+        rutas_dia = sorted(
+            (ruta_id for dia, ruta_id in grupos if dia == fecha),
+            key=lambda ruta_id: sum(peso for _, peso in grupos[fecha, ruta_id]),
+            reverse=True,
+        )
+        for ruta_id in rutas_dia:
+            cargas, pendientes = empaquetar(grupos[fecha, ruta_id], libres)
+            envios.extend({'fecha': fecha, 'ruta': ruta_id, **carga} for carga in cargas)
+            sin_asignar.extend({'pedido': pedido_id, 'fecha': fecha, 'ruta': ruta_id} for pedido_id in pendientes)
+    return {'envios': envios, 'sin_asignar': sin_asignar}
+
+
+@transaction.atomic
+def crear_envios(envios, hora_salida=None, batch_size=500):
+    """Crea en bloque los Envio de un plan y sus vínculos con los pedidos."""
+    hora_salida = hora_salida or datetime.time.fromisoformat(getattr(settings, 'ENVIOS_HORA_SALIDA', '06:00'))
+    nuevos = Envio.objects.bulk_create(secuencias.asignar([
+        Envio(
+            vehiculo_id=envio['vehiculo'],
+            ruta_id=envio['ruta'],
+            fecha_programada=envio['fecha'],
+            hora_salida=hora_salida,
+            conductor='',
+            observaciones=f"Consolidado: {len(envio['pedidos'])} pedidos, {envio['peso']} kg de {envio['capacidad']} kg",
+        )
+        for envio in envios
+    ]), batch_size=batch_size)
+    Envio.pedidos.through.objects.bulk_create([
+        Envio.pedidos.through(envio_id=nuevo.pk, pedido_id=pedido_id)
+        for nuevo, envio in zip(nuevos, envios)
+        for pedido_id in envio['pedidos']
+    ], batch_size=batch_size)
+    clientes = dict(
+        Pedido.objects
+        .filter(pk__in=[pedido_id for envio in envios for pedido_id in envio['pedidos']])
+        .values_list('pk', 'cliente_id')
+    )
+    cambios = []
+    for nuevo, envio in zip(nuevos, envios):
+        envio['id'], envio['codigo'] = nuevo.pk, nuevo.codigo
+        # bulk_create no emite señales: los envíos nuevos se publican aquí
+        cambios.append(eventos.cambio_envio(
+            nuevo.pk, nuevo.estado, None, nuevo.codigo, envio['pedidos'],
+            {clientes[pedido_id] for pedido_id in envio['pedidos'] if pedido_id in clientes},
+        ))
+    eventos.publicar_cambios(cambios)
+    return nuevos
+
+
+@transaction.atomic
+def consolidar(desde, hasta=None, hora_salida=None):
+    """
+    Planifica y crea los envíos de los pedidos pendientes entre desde y hasta
+    y, si hay matriz de distancias, ordena sus paradas.
+    """
+    plan = planificar(desde, hasta, bloquear=True)
+    nuevos = crear_envios(plan['envios'], hora_salida)
+    matriz = rutas.cargar_matriz()
+    if nuevos and matriz is not None:
+        rutas.planificar_envios([envio.pk for envio in nuevos], matriz)
+    return plan
@@ -0,0 +1,306 @@
+"""
+Máquinas de estado de Pedido, Envio, Factura y MantenimientoMaquinaria y
+transiciones en bloque.
+
+MAQUINAS declara, por modelo, a qué estados se puede llegar y desde cuáles.
+transicionar() cambia de estado miles de filas por lotes: en cada lote lee y
+bloquea las filas que están en un estado de origen permitido, las actualiza
+con una sola sentencia UPDATE ... WHERE pk IN (...) AND estado IN (orígenes),
+registra un EventoEstado por fila con bulk_create y ejecuta los efectos de la
+transición una vez para todo el lote:
+
+- Pedido en_proceso: reserva en el inventario las cantidades de sus líneas.
+- Pedido pendiente o cancelado: libera lo reservado.
+- Pedido enviado: descuenta las existencias (y lo reservado, si lo había).
+- Pedido entregado: se factura (facturacion.py) si FACTURACION_AL_ENTREGAR.
+- Envio en_transito / entregado: lleva sus pedidos a enviado / entregado.
+- MantenimientoMaquinaria en_proceso / completado / cancelado: fechas,
+  horómetro del servicio y estado de la máquina.
+
+UPDATE y bulk_update no emiten señales: la ATP y las ventas de los informes
+se invalidan y los cambios de pedidos y envíos se publican (eventos.py) desde
+aquí.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import atp, eventos, facturacion, informes
+from .models import (
+    DetallePedido, Envio, EventoEstado, Factura, InventarioProducto, Maquinaria, MantenimientoMaquinaria, Pedido,
+)
+
+CERO = Decimal('0')
+
+# Maquinaria.estado (texto libre) mientras tiene un mantenimiento en curso y al terminarlo
+ESTADO_MAQUINA_MANTENIMIENTO = 'Mantenimiento'
+ESTADO_MAQUINA_OPERATIVA = 'Operativa'
+
+
+#####################################
+# INVENTARIO
+#####################################
+
+def _cantidades(pedido_ids):
+    """{producto_id: cantidad} de las líneas de los pedidos, en una consulta agrupada."""
+    if not pedido_ids:
+        return {}
+    return dict(
+        DetallePedido.objects
+        .filter(pedido_id__in=pedido_ids)
+        .values('producto_id')
+        .annotate(total=Sum('cantidad'))
+        .order_by()
+        .values_list('producto_id', 'total')
+    )
+
+
+def _ajustar_inventario(liberar=None, reservar=None, descontar=None):
+    """
+    Ajusta InventarioProducto de varios productos con un solo bulk_update.
+
+    Cada argumento es {producto_id: cantidad}. Lo liberado sale primero de las
+    ubicaciones con más reservado; lo reservado va a la ubicación con más
+    existencias libres; lo descontado sale primero de donde se acaba de
+    liberar (la mercancía que estaba reservada) y después de las ubicaciones
+    con más existencias.
+    """
+    liberar, reservar, descontar = liberar or {}, reservar or {}, descontar or {}
+    productos = set(liberar) | set(reservar) | set(descontar)
+    if not productos:
+        return
+    ubicaciones = defaultdict(list)
+    for inventario in InventarioProducto.objects.select_for_update().filter(producto_id__in=productos).order_by('pk'):
+        ubicaciones[inventario.producto_id].append(inventario)
+
+    hoy = timezone.localdate()
+    cambiados = []
+    for producto_id, filas in ubicaciones.items():
+        liberadas = {}
+        restante = liberar.get(producto_id, CERO)
+        for inventario in sorted(filas, key=lambda fila: -fila.cantidad_reservada):
+            parte = min(restante, inventario.cantidad_reservada)
+            if parte > 0:
+                inventario.cantidad_reservada -= parte
+                liberadas[inventario.pk] = parte
+                restante -= parte
+        if reservar.get(producto_id):
+            max(filas, key=lambda fila: fila.cantidad_disponible - fila.cantidad_reservada).cantidad_reservada += \
+                reservar[producto_id]
+        restante = descontar.get(producto_id, CERO)
+        orden = sorted(filas, key=lambda fila: (-liberadas.get(fila.pk, CERO), -fila.cantidad_disponible))
+        for inventario in orden:
+            parte = min(restante, liberadas.get(inventario.pk, CERO) or max(inventario.cantidad_disponible, CERO))
+            inventario.cantidad_disponible -= parte
+            restante -= parte
+        if restante > 0:
+            # Sin existencias suficientes: el faltante queda a la vista como saldo negativo
+            orden[0].cantidad_disponible -= restante
+        for inventario in filas:
+            inventario.fecha_ultima_actualizacion = hoy
+        cambiados.extend(filas)
+
+    InventarioProducto.objects.bulk_update(
+        cambiados, ['cantidad_disponible', 'cantidad_reservada', 'fecha_ultima_actualizacion'],
+    )
+    atp.invalidar(atp.variedades_de_productos(productos))
+
+
+#####################################
+# EFECTOS DE LAS TRANSICIONES
+#####################################
+
+def _despues_pedido(filas, destino, usuario, motivo):
+    pedido_ids = [fila['pk'] for fila in filas]
+    reservados = [fila['pk'] for fila in filas if fila['anterior'] == 'en_proceso']
+    if destino == 'en_proceso':
+        _ajustar_inventario(reservar=_cantidades(pedido_ids))
+    elif destino in ('pendiente', 'cancelado'):
+        _ajustar_inventario(liberar=_cantidades(reservados))
+        if destino == 'cancelado':
+            # Las ventas de los informes excluyen los pedidos cancelados
+            informes.invalidar(['ventas'])
+    elif destino == 'enviado':
+        _ajustar_inventario(liberar=_cantidades(reservados), descontar=_cantidades(pedido_ids))
+    elif destino == 'entregado' and getattr(settings, 'FACTURACION_AL_ENTREGAR', True):
+        facturacion.facturar(pedido_ids)
+    # El estado del pedido decide si sus líneas cuentan como demanda en la ATP
+    atp.invalidar(atp.variedades_de_productos(
+        DetallePedido.objects.filter(pedido_id__in=pedido_ids).values('producto_id')
+    ))
+    eventos.publicar_cambios([
+        eventos.cambio_pedido(fila['pk'], fila['cliente_id'], destino, fila['anterior'], fila['codigo'])
+        for fila in filas
+    ])
+
+
+def _despues_envio(filas, destino, usuario, motivo):
+    envio_ids = [fila['pk'] for fila in filas]
+    pedidos, clientes = defaultdict(list), defaultdict(set)
+    for envio_id, pedido_id, cliente_id in Envio.pedidos.through.objects.filter(envio_id__in=envio_ids).values_list(
+            'envio_id', 'pedido_id', 'pedido__cliente_id'):
+        pedidos[envio_id].append(pedido_id)
+        clientes[envio_id].add(cliente_id)
+    eventos.publicar_cambios([
+        eventos.cambio_envio(
+            fila['pk'], destino, fila['anterior'], fila['codigo'], pedidos[fila['pk']], clientes[fila['pk']],
+        )
+        for fila in filas
+    ])
+    estado_pedidos = {'en_transito': 'enviado', 'entregado': 'entregado'}.get(destino)
+    if estado_pedidos:
+        # Los pedidos que no pueden pasar a ese estado (p. ej. cancelados) se omiten
+        transicionar('pedido', [pedido_id for envio_id in envio_ids for pedido_id in pedidos[envio_id]],
+                     estado_pedidos, usuario=usuario, motivo=motivo)
+
+
+def _despues_mantenimiento(filas, destino, usuario, motivo):
+    if destino != 'en_proceso':
+        filas = [fila for fila in filas if fila['anterior'] == 'en_proceso']
+    maquinaria_ids = set(
+        MantenimientoMaquinaria.objects.filter(pk__in=[fila['pk'] for fila in filas]).values_list('maquinaria_id', flat=True)
+    )
+    if destino == 'en_proceso':
+        Maquinaria.objects.filter(pk__in=maquinaria_ids).update(estado=ESTADO_MAQUINA_MANTENIMIENTO)
+    elif maquinaria_ids:
+        # Sólo vuelven a operativas las máquinas sin otro mantenimiento en curso
+        Maquinaria.objects.filter(pk__in=maquinaria_ids, estado__iexact=ESTADO_MAQUINA_MANTENIMIENTO).exclude(
+            Exists(MantenimientoMaquinaria.objects.filter(maquinaria=OuterRef('pk'), estado='en_proceso'))
+        ).update(estado=ESTADO_MAQUINA_OPERATIVA)
+
+
+def _campos_mantenimiento(destino, hoy):
+    if destino == 'en_proceso':
+        return {'fecha_inicio': Coalesce('fecha_inicio', Value(hoy))}
+    if destino == 'completado':
+        # El horómetro del servicio es el punto de partida de la siguiente regla (maquinaria.py)
+        return {
+            'fecha_inicio': Coalesce('fecha_inicio', Value(hoy)),
+            'fecha_finalizacion': Coalesce('fecha_finalizacion', Value(hoy)),
+            'horas_maquina': Subquery(Maquinaria.objects.filter(pk=OuterRef('maquinaria_id')).values('horas_uso')[:1]),
+        }
+    return {}
+
+
+#####################################
+# MÁQUINAS DE ESTADO
+#####################################
+
+# modelo: clase, {estado destino: estados de origen}, campos que necesitan los
+# efectos, efectos del lote y campos que cambian junto con el estado
+MAQUINAS = {
+    'pedido': {
+        'modelo': Pedido,
+        'transiciones': {
+            'en_proceso': ('pendiente',),
+            'pendiente': ('en_proceso',),
+            'enviado': ('pendiente', 'en_proceso'),
+            'entregado': ('enviado',),
+            'cancelado': ('pendiente', 'en_proceso'),
+        },
+        'campos': ('cliente_id', 'codigo'),
+        'efectos': _despues_pedido,
+    },
+    'envio': {
+        'modelo': Envio,
+        'transiciones': {
+            'en_transito': ('programado',),
+            'entregado': ('en_transito',),
+            'cancelado': ('programado',),
+        },
+        'campos': ('codigo',),
+        'efectos': _despues_envio,
+    },
+    'factura': {
+        'modelo': Factura,
+        # emitida/pagada se derivan del saldo (totales.actualizar_estados)
+        'transiciones': {
+            'anulada': ('emitida',),
+        },
+        'campos': (),
+    },
+    'mantenimiento': {
+        'modelo': MantenimientoMaquinaria,
+        'transiciones': {
+            'en_proceso': ('programado',),
+            'completado': ('programado', 'en_proceso'),
+            'cancelado': ('programado', 'en_proceso'),
+        },
+        'campos': (),
+        'efectos': _despues_mantenimiento,
+        'actualizar': _campos_mantenimiento,
+    },
+}
+
+
+def maquina(nombre):
+    try:
+        return MAQUINAS[nombre]
+    except KeyError:
+        raise ValueError(f"No hay máquina de estados para '{nombre}'")
+
+
+def origenes(nombre, destino):
+    """Estados desde los que se puede pasar a destino."""
+    try:
+        return maquina(nombre)['transiciones'][destino]
+    except KeyError:
+        raise ValueError(f"No se puede pasar un {nombre} a '{destino}'")
+
+
+def permitida(nombre, anterior, destino):
+    return anterior in maquina(nombre)['transiciones'].get(destino, ())
+
+
+#####################################
+# TRANSICIONES EN BLOQUE
+#####################################
+
+@transaction.atomic
+def transicionar(nombre, ids, destino, usuario=None, motivo='', batch_size=2000):
+    """
+    Pasa a destino los objetos indicados que estén en un estado de origen
+    permitido; el resto se omite. Devuelve {'cambiados', 'omitidos',
+    'por_estado'} con los cambiados por estado anterior.
+    """
+    definicion = maquina(nombre)
+    desde = origenes(nombre, destino)
+    modelo = definicion['modelo']
+    ids = list(dict.fromkeys(ids))
+    ahora = timezone.now()
+    actualizar = definicion['actualizar'](destino, timezone.localdate()) if 'actualizar' in definicion else {}
+    usuario_id = usuario.pk if usuario is not None else None
+    por_estado = defaultdict(int)
+    cambiados = 0
+    for inicio in range(0, len(ids), batch_size):
+        lote = ids[inicio:inicio + batch_size]
+        filas = [
+            dict(zip(('pk', 'anterior', *definicion['campos']), valores))
+            for valores in modelo.objects.select_for_update().filter(pk__in=lote, estado__in=desde)
+            .values_list('pk', 'estado', *definicion['campos'])
+        ]
+        if not filas:
+            continue
+        # Las filas están bloqueadas: el UPDATE condicional alcanza exactamente a las leídas
+        modelo.objects.filter(pk__in=[fila['pk'] for fila in filas], estado__in=desde).update(
+            estado=destino, **actualizar,
+        )
+        EventoEstado.objects.bulk_create([
+            EventoEstado(
+                modelo=nombre, objeto_id=fila['pk'], estado_anterior=fila['anterior'], estado_nuevo=destino,
+                fecha=ahora, usuario_id=usuario_id, motivo=motivo,
+            )
+            for fila in filas
+        ])
+        if 'efectos' in definicion:
+            definicion['efectos'](filas, destino, usuario, motivo)
+        for fila in filas:
+            por_estado[fila['anterior']] += 1
+        cambiados += len(filas)
+    return {'cambiados': cambiados, 'omitidos': len(ids) - cambiados, 'por_estado': dict(por_estado)}
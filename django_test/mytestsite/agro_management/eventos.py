@@ -0,0 +1,185 @@
+"""
+Publicación de cambios de estado de pedidos y envíos a clientes conectados.
+
+Los cambios se publican en canales ('pedido:<id>', 'envio:<id>',
+'cliente:<id>' y los generales 'pedidos' y 'envios') de un broker que se
+elige con EVENTOS_BROKER. BrokerLocal vive en el proceso: cada suscripción es
+una cola de asyncio y publicar sólo recorre las suscripciones de los canales
+del evento, así que miles de conexiones inactivas no cuestan nada mientras no
+hay cambios. Para varios procesos basta otra clase con la misma interfaz
+(publicar y suscribir) respaldada por un servicio externo.
+
+Cada evento lleva un número creciente y el broker guarda los últimos
+EVENTOS_HISTORIAL, de modo que un cliente que se reconecta con Last-Event-ID
+recibe lo que se perdió en lugar de volver a consultar.
+
+Los eventos se publican al confirmarse la transacción que los produjo.
+"""
+
+import asyncio
+import collections
+import itertools
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class Suscripcion:
+    """Cola de eventos de una conexión, ligada al bucle de asyncio que la creó."""
+
+    def __init__(self, broker, canales, maximo):
+        self.broker = broker
+        self.canales = frozenset(canales)
+        self.bucle = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(maxsize=maximo)
+        self.desbordada = False
+
+    def entregar(self, evento):
+        # Se ejecuta en el bucle de la suscripción
+        if self.desbordada:
+            return
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Un cliente que no lee a tiempo se desconecta y recupera lo perdido al reconectar
+            self.desbordada = True
+
+    @property
+    def agotada(self):
+        """Desbordada y sin eventos por leer: la conexión debe terminar."""
+        return self.desbordada and self.cola.empty()
+
+    async def siguiente(self, timeout):
+        """Siguiente evento o None si pasan `timeout` segundos sin ninguno."""
+        try:
+            return await asyncio.wait_for(self.cola.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def cerrar(self):
+        self.broker.cancelar(self)
+
+
+class BrokerLocal:
+    """Broker en memoria del proceso, seguro para publicar desde cualquier hilo."""
+
+    def __init__(self, historial=None, cola_maxima=None):
+        self.historial = collections.deque(maxlen=historial or getattr(settings, 'EVENTOS_HISTORIAL', 1000))
+        self.cola_maxima = cola_maxima or getattr(settings, 'EVENTOS_COLA_MAXIMA', 1000)
+        self.suscripciones = collections.defaultdict(set)
+        self.contador = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def publicar(self, canales, datos):
+        """Publica un evento en los canales indicados y devuelve su número."""
+        with self.lock:
+            evento = dict(datos, numero=next(self.contador), canales=list(canales))
+            self.historial.append(evento)
+            destinatarios = set()
+            for canal in canales:
+                destinatarios.update(self.suscripciones.get(canal, ()))
+        for suscripcion in destinatarios:
+            try:
+                suscripcion.bucle.call_soon_threadsafe(suscripcion.entregar, evento)
+            except RuntimeError:
+                # Bucle ya cerrado: la conexión terminó sin cancelar su suscripción
+                self.cancelar(suscripcion)
+        return evento['numero']
+
+    def suscribir(self, canales, desde=None):
+        """
+        Suscribe la conexión actual (dentro de un bucle de asyncio) a los
+        canales. Con `desde` devuelve también los eventos del historial
+        posteriores a ese número. Devuelve (suscripción, pendientes);
+        pendientes es None si no se pidió o si el historial ya no los cubre.
+        """
+        suscripcion = Suscripcion(self, canales, self.cola_maxima)
+        with self.lock:
+            for canal in suscripcion.canales:
+                self.suscripciones[canal].add(suscripcion)
+            pendientes = None
+            ultimo = self.historial[-1]['numero'] if self.historial else 0
+            primero = self.historial[0]['numero'] if self.historial else 1
+            # Un número mayor que el último viene de un proceso anterior del broker
+            if desde is not None and primero - 1 <= desde <= ultimo:
+                pendientes = [
+                    evento for evento in self.historial
+                    if evento['numero'] > desde and suscripcion.canales.intersection(evento['canales'])
+                ]
+        return suscripcion, pendientes
+
+    def cancelar(self, suscripcion):
+        with self.lock:
+            for canal in suscripcion.canales:
+                conjunto = self.suscripciones.get(canal)
+                if conjunto is not None:
+                    conjunto.discard(suscripcion)
+                    if not conjunto:
+                        del self.suscripciones[canal]
+
+    def conexiones(self):
+        with self.lock:
+            return len({suscripcion for conjunto in self.suscripciones.values() for suscripcion in conjunto})
+
+
+def obtener_broker():
+    """Broker configurado en EVENTOS_BROKER (BrokerLocal por omisión), uno por proceso."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'EVENTOS_BROKER', 'agro_management.eventos.BrokerLocal'))()
+    return _broker
+
+
+#####################################
+# CAMBIOS DE ESTADO
+#####################################
+
+def canales_pedido(pedido_id, cliente_id):
+    return ['pedidos', f'pedido:{pedido_id}', f'cliente:{cliente_id}']
+
+
+def canales_envio(envio_id, pedido_ids=(), cliente_ids=()):
+    return (
+        ['envios', f'envio:{envio_id}']
+        + [f'pedido:{pedido_id}' for pedido_id in pedido_ids]
+        + [f'cliente:{cliente_id}' for cliente_id in cliente_ids]
+    )
+
+
+def publicar_cambios(cambios):
+    """
+    Publica al confirmar la transacción una lista de cambios
+    (canales, datos), p. ej. los de una transición en bloque.
+    """
+    if not cambios:
+        return
+    momento = timezone.now().isoformat()
+
+    def publicar():
+        broker = obtener_broker()
+        for canales, datos in cambios:
+            broker.publicar(canales, dict(datos, momento=momento))
+
+    transaction.on_commit(publicar)
+
+
+def cambio_pedido(pedido_id, cliente_id, estado, anterior=None, codigo=None):
+    return canales_pedido(pedido_id, cliente_id), {
+        'tipo': 'pedido', 'id': pedido_id, 'codigo': codigo, 'cliente': cliente_id,
+        'estado': estado, 'anterior': anterior,
+    }
+
+
+def cambio_envio(envio_id, estado, anterior=None, codigo=None, pedido_ids=(), cliente_ids=()):
+    return canales_envio(envio_id, pedido_ids, cliente_ids), {
+        'tipo': 'envio', 'id': envio_id, 'codigo': codigo, 'pedidos': list(pedido_ids),
+        'estado': estado, 'anterior': anterior,
+    }
@@ -0,0 +1,86 @@
+"""
+Facturación en lote de los pedidos entregados.
+
+Los pedidos entregados sin factura y con líneas se leen con su neto
+(suma de subtotal - descuento de sus DetallePedido) en una sola consulta
+agrupada. La corrida bloquea esos pedidos (select_for_update) y vuelve a
+leerlos: si otra corrida simultánea facturó alguno mientras se esperaba el
+bloqueo, ya no aparece y se informa como omitido. Los números se asignan
+de una vez con secuencias.asignar y las facturas se crean con bulk_create
+sin ignorar conflictos, de modo que un número o pedido repetido revierte la
+corrida en lugar de perderse en silencio.
+"""
+
+import datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import secuencias
+from .models import Factura, Pedido
+
+CENTIMOS = Decimal('0.01')
+
+
+def pendientes(pedido_ids=None):
+    """[(pedido_id, neto)] de los pedidos entregados sin factura, en una consulta agrupada."""
+    pedidos = Pedido.objects.filter(estado='entregado', factura__isnull=True)
+    if pedido_ids is not None:
+        pedidos = pedidos.filter(pk__in=pedido_ids)
+    return list(
+        pedidos
+        .annotate(neto=Sum(F('detalles__subtotal') - F('detalles__descuento')))
+        .filter(neto__isnull=False)
+        .order_by('pk')
+        .values_list('pk', 'neto')
+    )
+
+
+def facturar(pedido_ids=None, fecha=None, batch_size=1000):
+    """
+    Emite las facturas de los pedidos entregados sin factura (todos o los
+    indicados). Devuelve {'facturadas', 'omitidos', 'desde', 'hasta'} con el
+    menor y el mayor número de las facturas creadas.
+    """
+    fecha = fecha or timezone.localdate()
+    candidatos = [pedido_id for pedido_id, _ in pendientes(pedido_ids)]
+    if not candidatos:
+        return {'facturadas': 0, 'omitidos': 0, 'desde': None, 'hasta': None}
+    tasa = Decimal(str(getattr(settings, 'FACTURACION_TASA_IMPUESTOS', '0.18')))
+    vencimiento = fecha + datetime.timedelta(days=getattr(settings, 'FACTURACION_DIAS_CREDITO', 30))
+
+    with transaction.atomic():
+        filas = []
+        for inicio in range(0, len(candidatos), batch_size):
+            lote = candidatos[inicio:inicio + batch_size]
+            list(Pedido.objects.select_for_update().filter(pk__in=lote).values_list('pk', flat=True))
+            # Relectura tras el bloqueo: descarta lo que otra corrida facturó entretanto
+            filas.extend(pendientes(lote))
+        facturas = []
+        for pedido_id, neto in filas:
+            subtotal = neto.quantize(CENTIMOS, ROUND_HALF_UP)
+            impuestos = (subtotal * tasa).quantize(CENTIMOS, ROUND_HALF_UP)
+            # bulk_create no pasa por Factura.save(): el saldo inicial se fija aquí
+            facturas.append(Factura(
+                pedido_id=pedido_id,
+                fecha_emision=fecha,
+                fecha_vencimiento=vencimiento,
+                subtotal=subtotal,
+                impuestos=impuestos,
+                total=subtotal + impuestos,
+                pagado=0,
+                saldo=subtotal + impuestos,
+            ))
+        secuencias.asignar(facturas, fecha)
+        Factura.objects.bulk_create(facturas, batch_size=batch_size)
+
+    numeros = [factura.numero for factura in facturas]
+    return {
+        'facturadas': len(facturas),
+        'omitidos': len(candidatos) - len(facturas),
+        'desde': min(numeros, default=None),
+        'hasta': max(numeros, default=None),
+    }
@@ -0,0 +1,295 @@
+"""
+Grados-día de crecimiento (GDD) y predicción de etapas fenológicas.
+
+Cada día aporta (min(max(tmin, base), techo) + min(max(tmax, base), techo)) / 2
+- base grados-día, con la temperatura base y máxima de la Variedad. Las
+temperaturas salen de los sensores de temperatura de la parcela (agregados
+diarios de sensores.py) o, si no los hay, de ClimaDiario; los días futuros y
+los huecos usan la climatología de ClimaDiario (media de cada día del año).
+
+Para cada serie de temperaturas distinta (estación o parcela con sensores) y
+cada par (base, techo) se calcula una sola vez la suma acumulada de los
+grados-día del tramo completo, como array('d'). Lo acumulado por un cultivo
+entre dos días es una resta y la fecha en que alcanza cada UmbralFenologico
+de su variedad es una búsqueda binaria (bisect) sobre esa suma, que nunca
+decrece. Así el cálculo de todos los cultivos abiertos no tiene consultas
+por cultivo.
+
+Las predicciones se guardan en PrediccionEtapa y la fecha del umbral de
+cosecha se lleva a Cultivo.fecha_cosecha_estimada con bulk_update. Como
+bulk_update no pasa por Cultivo.clean(), los cultivos cuya nueva fecha hace
+que superen la superficie libre de su parcela se devuelven como conflictos
+para revisarlos (la predicción se guarda igualmente: es el clima, no una
+decisión). En la ATP esa fecha tiene precedencia sobre la del
+PronosticoCosecha (ver atp.cosechas_esperadas).
+"""
+
+import csv
+import datetime
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import accumulate
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg
+from django.db.models.functions import ExtractDay, ExtractMonth
+from django.utils import timezone
+
+from . import atp, parcelas, sensores
+from .models import AgregadoSensor, ClimaDiario, Cultivo, EtapaFenologica, PrediccionEtapa, UmbralFenologico
+
+UN_DIA = datetime.timedelta(days=1)
+
+# Días recientes de la estación con los que se rellenan los días sin climatología
+DIAS_RELLENO = 30
+
+
+def grados_dia(minima, maxima, base, techo):
+    """Grados-día de un día por el método de la media con umbral inferior y superior."""
+    minima = min(max(minima, base), techo)
+    maxima = min(max(maxima, base), techo)
+    return (minima + maxima) / 2 - base
+
+
+#####################################
+# TEMPERATURAS
+#####################################
+
+def _estacion(desde, hasta):
+    return {
+        fecha: (float(minima), float(maxima))
+        for fecha, minima, maxima in ClimaDiario.objects.filter(fecha__range=(desde, hasta))
+        .values_list('fecha', 'temperatura_minima', 'temperatura_maxima')
+    }
+
+
+def _climatologia():
+    """Temperaturas medias de cada (mes, día) y el relleno para los días sin historial."""
+    medias = {
+        (fila['mes'], fila['dia']): (float(fila['minima']), float(fila['maxima']))
+        for fila in ClimaDiario.objects
+        .annotate(mes=ExtractMonth('fecha'), dia=ExtractDay('fecha'))
+        .values('mes', 'dia')
+        .annotate(minima=Avg('temperatura_minima'), maxima=Avg('temperatura_maxima'))
+        .order_by()
+    }
+    recientes = list(
+        ClimaDiario.objects.order_by('-fecha').values_list('temperatura_minima', 'temperatura_maxima')[:DIAS_RELLENO]
+    )
+    relleno = None
+    if recientes:
+        relleno = (
+            sum(float(minima) for minima, _ in recientes) / len(recientes),
+            sum(float(maxima) for _, maxima in recientes) / len(recientes),
+        )
+    return medias, relleno
+
+
+def _sensores(desde, hasta, parcela_ids):
+    """{parcela_id: {fecha: (tmin, tmax)}} de los agregados diarios de sus sensores de temperatura."""
+    por_parcela = defaultdict(dict)
+    for fila in (
+            AgregadoSensor.objects
+            .filter(
+                granularidad='dia',
+                sensor__tipo='temperatura',
+                sensor__parcela_id__in=parcela_ids,
+                inicio__gte=sensores.inicio_dia(desde),
+                inicio__lt=sensores.inicio_dia(hasta + UN_DIA),
+            )
+            .values('sensor__parcela_id', 'inicio')
+            .annotate(minima=Avg('minimo'), maxima=Avg('maximo'))
+            .order_by()):
+        por_parcela[fila['sensor__parcela_id']][timezone.localdate(fila['inicio'])] = (fila['minima'], fila['maxima'])
+    return por_parcela
+
+
+def _serie(dias, observadas, estacion, climatologia, relleno):
+    """
+    Temperaturas (tmin, tmax) de cada día del tramo y el índice del último
+    día con dato. Orden de preferencia: sensores, estación, climatología.
+    """
+    temperaturas = []
+    ultimo = -1
+    for indice, fecha in enumerate(dias):
+        valor = observadas.get(fecha) or estacion.get(fecha)
+        if valor is None:
+            valor = climatologia.get((fecha.month, fecha.day)) or relleno
+        if valor is not None:
+            ultimo = indice
+        temperaturas.append(valor)
+    return temperaturas, ultimo
+
+
+def _acumulada(temperaturas, base, techo):
+    """Suma acumulada de grados-día con un cero inicial: acumulada[i] es lo de los días anteriores a i."""
+    # Los días sin ningún dato no suman; predecir() no acepta fechas posteriores al último con dato
+    return array('d', accumulate(
+        (grados_dia(*valor, base, techo) if valor is not None else 0.0 for valor in temperaturas),
+        initial=0.0,
+    ))
+
+
+#####################################
+# PREDICCIÓN
+#####################################
+
+def predecir(hoy=None):
+    """
+    Predice la fecha de cada etapa con umbral de los cultivos abiertos, sin
+    guardar. Devuelve una lista de diccionarios por cultivo con sus grados-día
+    acumulados hasta hoy y sus etapas.
+    """
+    hoy = hoy or timezone.localdate()
+    horizonte = hoy + datetime.timedelta(days=getattr(settings, 'FENOLOGIA_HORIZONTE_DIAS', 365))
+    umbrales = defaultdict(list)
+    for umbral in UmbralFenologico.objects.order_by('variedad_id', 'grados_dia'):
+        umbrales[umbral.variedad_id].append(umbral)
+    cultivos = list(
+        Cultivo.objects
+        .filter(fecha_cosecha_real__isnull=True, variedad_id__in=umbrales, fecha_siembra__lte=horizonte)
+        .values_list('pk', 'parcela_id', 'variedad_id', 'fecha_siembra', 'fecha_cosecha_estimada',
+                     'variedad__temperatura_base', 'variedad__temperatura_maxima')
+    )
+    if not cultivos:
+        return []
+
+    desde = min(cultivo[3] for cultivo in cultivos)
+    dias = [desde + UN_DIA * i for i in range((horizonte - desde).days + 1)]
+    estacion = _estacion(desde, hoy)
+    climatologia, relleno = _climatologia()
+    observadas = _sensores(desde, hoy, {cultivo[1] for cultivo in cultivos})
+    observadas_etapas = {}
+    for cultivo_id, nombre, fecha in (
+            EtapaFenologica.objects
+            .filter(cultivo_id__in=[cultivo[0] for cultivo in cultivos])
+            .values_list('cultivo_id', 'nombre', 'fecha_inicio')
+            .order_by('fecha_inicio')):
+        observadas_etapas.setdefault((cultivo_id, nombre.strip().lower()), fecha)
+
+    series, acumuladas = {}, {}
+    indice_hoy = (hoy - desde).days
+    resultado = []
+    for cultivo_id, parcela_id, variedad_id, siembra, cosecha_estimada, base, techo in cultivos:
+        # Las parcelas sin sensores de temperatura comparten la serie de la estación
+        fuente = parcela_id if parcela_id in observadas else None
+        if fuente not in series:
+            series[fuente] = _serie(dias, observadas.get(fuente, {}), estacion, climatologia, relleno)
+        temperaturas, ultimo = series[fuente]
+        clave = (fuente, float(base), float(techo))
+        if clave not in acumuladas:
+            acumuladas[clave] = _acumulada(temperaturas, *clave[1:])
+        acumulada = acumuladas[clave]
+
+        inicio = (siembra - desde).days
+        partida = acumulada[inicio]
+        etapas = []
+        for umbral in umbrales[variedad_id]:
+            # Primer día d con acumulada[d + 1] - partida >= umbral
+            posicion = bisect_left(acumulada, partida + float(umbral.grados_dia), lo=inicio + 1)
+            fecha = dias[posicion - 1] if posicion - 1 <= ultimo else None
+            etapas.append({
+                'umbral': umbral,
+                'fecha_estimada': fecha,
+                'fecha_observada': observadas_etapas.get((cultivo_id, umbral.etapa.strip().lower())),
+            })
+        resultado.append({
+            'cultivo': cultivo_id,
+            'parcela': parcela_id,
+            'variedad': variedad_id,
+            'fecha_cosecha_estimada': cosecha_estimada,
+            'grados_dia': acumulada[max(min(indice_hoy + 1, len(acumulada) - 1), inicio)] - partida,
+            'etapas': etapas,
+        })
+    return resultado
+
+
+@transaction.atomic
+def actualizar(hoy=None, batch_size=1000):
+    """
+    Recalcula las predicciones de los cultivos abiertos, reemplaza sus
+    PrediccionEtapa y lleva la fecha del umbral de cosecha a
+    Cultivo.fecha_cosecha_estimada. Devuelve (cultivos, fechas de cosecha
+    cambiadas, conflictos), donde conflictos es {cultivo_id: mensaje} de los
+    cultivos cambiados que ya no caben en su parcela.
+    """
+    predicciones = predecir(hoy)
+    calculo = timezone.now()
+    filas, cambios = [], []
+    con_cosecha = set()
+    for prediccion in predicciones:
+        acumulados = Decimal(str(round(prediccion['grados_dia'], 1)))
+        for etapa in prediccion['etapas']:
+            filas.append(PrediccionEtapa(
+                cultivo_id=prediccion['cultivo'],
+                umbral=etapa['umbral'],
+                fecha_estimada=etapa['fecha_estimada'],
+                fecha_observada=etapa['fecha_observada'],
+                grados_dia_acumulados=acumulados,
+                fecha_calculo=calculo,
+            ))
+            if etapa['umbral'].es_cosecha and etapa['fecha_estimada']:
+                con_cosecha.add(prediccion['variedad'])
+                if etapa['fecha_estimada'] != prediccion['fecha_cosecha_estimada']:
+                    cambios.append((prediccion, etapa['fecha_estimada']))
+
+    PrediccionEtapa.objects.filter(cultivo_id__in=[prediccion['cultivo'] for prediccion in predicciones]).delete()
+    PrediccionEtapa.objects.bulk_create(filas, batch_size=batch_size)
+    Cultivo.objects.bulk_update(
+        [Cultivo(pk=prediccion['cultivo'], fecha_cosecha_estimada=fecha) for prediccion, fecha in cambios],
+        ['fecha_cosecha_estimada'],
+        batch_size=batch_size,
+    )
+    # bulk_update no emite señales: ocupación de parcelas y ATP se actualizan aquí.
+    # Una predicción de cosecha nueva con la misma fecha también cambia la ATP
+    # de los cultivos con pronóstico, así que se invalida toda variedad predicha
+    conflictos = {}
+    if cambios:
+        parcelas.reconstruir({prediccion['parcela'] for prediccion, _ in cambios})
+        conflictos = parcelas.conflictos_de_area([prediccion['cultivo'] for prediccion, _ in cambios])
+    atp.invalidar(con_cosecha)
+    return len(predicciones), len(cambios), conflictos
+
+
+#####################################
+# CARGA DE DATOS METEOROLÓGICOS
+#####################################
+
+def leer_clima(archivo):
+    """
+    Lee un CSV con cabecera fecha,temperatura_minima,temperatura_maxima[,precipitacion].
+    Devuelve (registros ClimaDiario sin guardar, errores por línea).
+    """
+    registros, errores = [], []
+    for linea, fila in enumerate(csv.DictReader(archivo), start=2):
+        try:
+            precipitacion = (fila.get('precipitacion') or '').strip()
+            registro = ClimaDiario(
+                fecha=datetime.date.fromisoformat((fila.get('fecha') or '').strip()),
+                temperatura_minima=Decimal(fila['temperatura_minima']),
+                temperatura_maxima=Decimal(fila['temperatura_maxima']),
+                precipitacion=Decimal(precipitacion) if precipitacion else None,
+            )
+        except (KeyError, TypeError, ValueError, InvalidOperation) as error:
+            errores.append({'linea': linea, 'error': f"Fila no válida: {error}"})
+            continue
+        if registro.temperatura_minima > registro.temperatura_maxima:
+            errores.append({'linea': linea, 'error': 'La temperatura mínima supera a la máxima'})
+            continue
+        registros.append(registro)
+    return registros, errores
+
+
+def guardar_clima(registros, batch_size=1000):
+    """Guarda los registros diarios, reemplazando los de las fechas que ya existían."""
+    ClimaDiario.objects.bulk_create(
+        registros,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['fecha'],
+        update_fields=['temperatura_minima', 'temperatura_maxima', 'precipitacion'],
+    )
+    return len(registros)
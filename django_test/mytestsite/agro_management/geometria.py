@@ -0,0 +1,327 @@
+"""
+Geometría de parcelas y fuentes de agua y consultas de proximidad.
+
+Parcela y FuenteAgua guardan su geometría GeoJSON (coordenadas [lon, lat] en
+WGS84), su centroide y su caja envolvente. En SQLite la caja se replica en
+una tabla virtual R*Tree mediante disparadores, de modo que las consultas
+por caja, por radio y de vecinos más cercanos sólo leen los candidatos del
+índice y afinan la distancia exacta en Python. Si el motor no dispone de
+R*Tree se usa el índice B-tree sobre las columnas de la caja.
+"""
+
+import json
+import math
+
+from django.db import DatabaseError, connection as conexion_por_defecto
+from django.db.models.expressions import RawSQL
+
+RADIO_TIERRA = 6371008.8  # metros
+
+# Tablas R*Tree por modelo (nombre de la tabla base -> tabla virtual)
+TABLAS_RTREE = {
+    'agro_management_parcela': 'agro_management_parcela_rtree',
+    'agro_management_fuenteagua': 'agro_management_fuenteagua_rtree',
+}
+
+_rtree_disponible = {}
+
+
+#####################################
+# CÁLCULOS GEOMÉTRICOS
+#####################################
+
+def _coordenadas(geometria):
+    """Recorre todos los pares [lon, lat] de una geometría GeoJSON."""
+    tipo = geometria['type']
+    if tipo == 'GeometryCollection':
+        for parte in geometria['geometries']:
+            yield from _coordenadas(parte)
+        return
+    pila = [geometria['coordinates']]
+    while pila:
+        actual = pila.pop()
+        if actual and isinstance(actual[0], (int, float)):
+            yield actual[0], actual[1]
+        else:
+            pila.extend(actual)
+
+
+def _anillos(geometria):
+    """Anillos exteriores e interiores de un Polygon o MultiPolygon."""
+    if geometria['type'] == 'Polygon':
+        return [geometria['coordinates']]
+    if geometria['type'] == 'MultiPolygon':
+        return geometria['coordinates']
+    return []
+
+
+def limites(geometria):
+    """Caja envolvente (min_lon, min_lat, max_lon, max_lat) de una geometría."""
+    lons, lats = zip(*_coordenadas(geometria))
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+def centroide(geometria):
+    """Centroide aproximado (lat, lon): el punto o la media de los vértices del anillo exterior."""
+    if geometria['type'] == 'Point':
+        lon, lat = geometria['coordinates'][:2]
+        return lat, lon
+    poligonos = _anillos(geometria)
+    puntos = [p for poligono in poligonos for p in poligono[0][:-1]] if poligonos else list(_coordenadas(geometria))
+    return sum(p[1] for p in puntos) / len(puntos), sum(p[0] for p in puntos) / len(puntos)
+
+
+def completar(objeto):
+    """Rellena centroide y caja de un Parcela o FuenteAgua a partir de su geometría."""
+    if objeto.geometria:
+        objeto.min_lon, objeto.min_lat, objeto.max_lon, objeto.max_lat = limites(objeto.geometria)
+        objeto.latitud, objeto.longitud = centroide(objeto.geometria)
+    elif objeto.latitud is not None and objeto.longitud is not None:
+        objeto.min_lon = objeto.max_lon = objeto.longitud
+        objeto.min_lat = objeto.max_lat = objeto.latitud
+    else:
+        objeto.min_lon = objeto.min_lat = objeto.max_lon = objeto.max_lat = None
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Distancia en metros sobre la esfera terrestre."""
+    f1, f2 = math.radians(lat1), math.radians(lat2)
+    df, dl = f2 - f1, math.radians(lon2 - lon1)
+    a = math.sin(df / 2) ** 2 + math.cos(f1) * math.cos(f2) * math.sin(dl / 2) ** 2
+    return 2 * RADIO_TIERRA * math.asin(math.sqrt(a))
+
+
+def _dentro(x, y, anillo):
+    dentro = False
+    for (x1, y1), (x2, y2) in zip(anillo, anillo[1:]):
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            dentro = not dentro
+    return dentro
+
+
+def distancia(lat, lon, geometria):
+    """
+    Distancia en metros de un punto a una geometría: cero dentro de un
+    polígono y, fuera, la distancia al borde más cercano en una proyección
+    equirectangular local (precisa a la escala de una finca).
+    """
+    if geometria['type'] == 'Point':
+        lon2, lat2 = geometria['coordinates'][:2]
+        return haversine(lat, lon, lat2, lon2)
+    escala = math.cos(math.radians(lat))
+
+    def proyectar(punto):
+        return (
+            math.radians(punto[0] - lon) * escala * RADIO_TIERRA,
+            math.radians(punto[1] - lat) * RADIO_TIERRA,
+        )
+
+    poligonos = _anillos(geometria)
+    for poligono in poligonos:
+        exterior, *huecos = [[proyectar(p) for p in anillo] for anillo in poligono]
+        if _dentro(0.0, 0.0, exterior) and not any(_dentro(0.0, 0.0, hueco) for hueco in huecos):
+            return 0.0
+    segmentos = []
+    for poligono in poligonos:
+        for anillo in poligono:
+            puntos = [proyectar(p) for p in anillo]
+            segmentos.extend(zip(puntos, puntos[1:]))
+    if not segmentos:
+        puntos = [proyectar(p) for p in _coordenadas(geometria)]
+        return min(math.hypot(x, y) for x, y in puntos)
+    minimo = math.inf
+    for (x1, y1), (x2, y2) in segmentos:
+        dx, dy = x2 - x1, y2 - y1
+        largo = dx * dx + dy * dy
+        t = 0.0 if not largo else max(0.0, min(1.0, -(x1 * dx + y1 * dy) / largo))
+        minimo = min(minimo, math.hypot(x1 + t * dx, y1 + t * dy))
+    return minimo
+
+
+def _distancia_objeto(lat, lon, objeto):
+    if objeto.geometria:
+        return distancia(lat, lon, objeto.geometria)
+    return haversine(lat, lon, objeto.latitud, objeto.longitud)
+
+
+def caja_de_radio(lat, lon, metros):
+    """Caja (min_lon, min_lat, max_lon, max_lat) que contiene el círculo."""
+    dlat = math.degrees(metros / RADIO_TIERRA)
+    dlon = math.degrees(metros / (RADIO_TIERRA * max(math.cos(math.radians(lat)), 1e-6)))
+    return lon - dlon, lat - dlat, lon + dlon, lat + dlat
+
+
+#####################################
+# ÍNDICE ESPACIAL
+#####################################
+
+def rtree_disponible(connection=None):
+    """Indica si la base de datos tiene las tablas R*Tree de este módulo."""
+    connection = connection or conexion_por_defecto
+    if connection.alias not in _rtree_disponible:
+        tablas = set(connection.introspection.table_names())
+        _rtree_disponible[connection.alias] = connection.vendor == 'sqlite' and set(TABLAS_RTREE.values()) <= tablas
+    return _rtree_disponible[connection.alias]
+
+
+def crear_indices_espaciales(connection):
+    """
+    Crea (si faltan) las tablas R*Tree y sus disparadores y las sincroniza
+    con las tablas base. Idempotente; sin efecto fuera de SQLite o si SQLite
+    se compiló sin R*Tree.
+    """
+    if connection.vendor != 'sqlite' or not set(TABLAS_RTREE) <= set(connection.introspection.table_names()):
+        return False
+    with connection.cursor() as cursor:
+        try:
+            for base, rtree in TABLAS_RTREE.items():
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {rtree} USING rtree(id, min_lon, max_lon, min_lat, max_lat)"
+                )
+        except DatabaseError:
+            return False
+        for base, rtree in TABLAS_RTREE.items():
+            insertar = (
+                f"INSERT INTO {rtree} SELECT NEW.id, NEW.min_lon, NEW.max_lon, NEW.min_lat, NEW.max_lat "
+                f"WHERE NEW.min_lat IS NOT NULL;"
+            )
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {rtree}_ins AFTER INSERT ON {base} BEGIN {insertar} END")
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {rtree}_upd AFTER UPDATE OF min_lon, max_lon, min_lat, max_lat ON {base} "
+                f"BEGIN DELETE FROM {rtree} WHERE id = OLD.id; {insertar} END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {rtree}_del AFTER DELETE ON {base} "
+                f"BEGIN DELETE FROM {rtree} WHERE id = OLD.id; END"
+            )
+            # Las reconstrucciones de tabla de SQLite eliminan los disparadores: resincronizar
+            cursor.execute(f"DELETE FROM {rtree}")
+            cursor.execute(
+                f"INSERT INTO {rtree} SELECT id, min_lon, max_lon, min_lat, max_lat FROM {base} WHERE min_lat IS NOT NULL"
+            )
+    _rtree_disponible.pop(connection.alias, None)
+    return True
+
+
+def restaurar_indices_espaciales(connection):
+    """Vuelve a crear los disparadores si las tablas R*Tree ya existen."""
+    _rtree_disponible.pop(connection.alias, None)
+    if rtree_disponible(connection):
+        crear_indices_espaciales(connection)
+
+
+def eliminar_indices_espaciales(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for rtree in TABLAS_RTREE.values():
+            for sufijo in ('ins', 'upd', 'del'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {rtree}_{sufijo}")
+            cursor.execute(f"DROP TABLE IF EXISTS {rtree}")
+    _rtree_disponible.pop(connection.alias, None)
+
+
+#####################################
+# CONSULTAS
+#####################################
+
+def en_caja(modelo, min_lon, min_lat, max_lon, max_lat):
+    """Objetos cuya caja envolvente corta la caja indicada."""
+    tabla = modelo._meta.db_table
+    if rtree_disponible():
+        sql = (
+            f"SELECT id FROM {TABLAS_RTREE[tabla]} "
+            f"WHERE max_lon >= %s AND min_lon <= %s AND max_lat >= %s AND min_lat <= %s"
+        )
+        return modelo.objects.filter(pk__in=RawSQL(sql, (min_lon, max_lon, min_lat, max_lat)))
+    return modelo.objects.filter(
+        min_lon__lte=max_lon, max_lon__gte=min_lon, min_lat__lte=max_lat, max_lat__gte=min_lat,
+    )
+
+
+def en_radio(modelo, lat, lon, metros):
+    """Lista de (distancia, objeto) a menos de `metros`, ordenada por distancia."""
+    resultado = []
+    for objeto in en_caja(modelo, *caja_de_radio(lat, lon, metros)):
+        d = _distancia_objeto(lat, lon, objeto)
+        if d <= metros:
+            resultado.append((d, objeto))
+    resultado.sort(key=lambda par: par[0])
+    return resultado
+
+
+def mas_cercanos(modelo, lat, lon, k=1, radio_inicial=1000, radio_maximo=RADIO_TIERRA * math.pi):
+    """
+    Los k objetos más cercanos: se duplica el radio de búsqueda hasta que
+    haya k candidatos dentro de él (los de fuera no pueden estar más cerca).
+    """
+    total = modelo.objects.filter(min_lat__isnull=False).count()
+    objetivo = min(k, total)
+    radio = radio_inicial
+    while True:
+        encontrados = en_radio(modelo, lat, lon, radio)
+        if len(encontrados) >= objetivo or radio >= radio_maximo:
+            return encontrados[:k]
+        radio *= 2
+
+
+#####################################
+# IMPORTACIÓN GEOJSON
+#####################################
+
+def leer_features(archivo, tamano_bloque=1 << 16):
+    """
+    Recorre las Feature de un FeatureCollection o de una secuencia GeoJSON
+    (una Feature por línea) leyendo el archivo por bloques, sin cargarlo
+    entero en memoria.
+    """
+    decodificador = json.JSONDecoder()
+    buffer = archivo.read(tamano_bloque)
+    fin_archivo = not buffer
+    posicion = 0
+
+    def rellenar():
+        nonlocal buffer, posicion, fin_archivo
+        bloque = archivo.read(tamano_bloque)
+        fin_archivo = not bloque
+        buffer = buffer[posicion:] + bloque
+        posicion = 0
+
+    # Secuencia GeoJSON si la primera línea es una Feature completa
+    primera = buffer.lstrip('\ufeff\x1e \t\r\n').split('\n', 1)[0]
+    try:
+        secuencia = json.loads(primera).get('type') == 'Feature'
+    except (ValueError, AttributeError):
+        secuencia = False
+
+    if not secuencia:
+        while '"features"' not in buffer:
+            if fin_archivo:
+                return
+            bloque = archivo.read(tamano_bloque)
+            fin_archivo = not bloque
+            buffer += bloque
+        posicion = buffer.index('"features"') + len('"features"')
+        while '[' not in buffer[posicion:]:
+            rellenar()
+        posicion = buffer.index('[', posicion) + 1
+
+    separadores = '\ufeff\x1e \t\r\n,'
+    while True:
+        while True:
+            while posicion < len(buffer) and buffer[posicion] in separadores:
+                posicion += 1
+            if posicion < len(buffer) or fin_archivo:
+                break
+            rellenar()
+        if posicion >= len(buffer) or (not secuencia and buffer[posicion] == ']'):
+            return
+        while True:
+            try:
+                feature, posicion = decodificador.raw_decode(buffer, posicion)
+                break
+            except json.JSONDecodeError:
+                if fin_archivo:
+                    raise
+                rellenar()
+        yield feature
@@ -0,0 +1,357 @@
+"""
+Generación de informes financieros a partir de InformeFinanciero.
+
+Cada informe se compone de secciones (costos, ventas, pagos y presupuesto)
+que se calculan de forma independiente sobre el periodo
+fecha_inicio..fecha_fin. Las secciones se agregan en la base de datos y se
+leen como flujos de values_list, por lo que cada proceso de trabajo sólo
+recorre filas ya agrupadas. Los resultados se guardan en la caché
+'informes' (en la base de datos, compartida por los procesos web y los
+comandos) para que volver a generar el mismo periodo no repita las
+consultas. La clave incluye la versión de las fuentes de la sección
+(VersionInforme, que las señales incrementan al confirmarse un cambio en
+costos, ventas, pagos o presupuestos), así que leerla cuesta una consulta
+por informe y cualquier cambio invalida la sección sin esperar al
+vencimiento.
+
+Las secciones se calculan en el proceso que llama; sólo el comando
+generar_informe las reparte entre procesos de trabajo.
+"""
+
+import csv
+import datetime
+import io
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+# Agrupación temporal de las series según el tipo de informe
+AGRUPACION_POR_TIPO = {
+    'mensual': TruncDay,
+    'trimestral': TruncWeek,
+    'anual': TruncMonth,
+    'especial': TruncMonth,
+}
+
+FORMATOS = ('csv', 'html')
+
+# Tamaño de lote al leer los flujos de values_list
+TAMANO_LOTE = 2000
+
+
+def _periodo(valor):
+    """Normaliza la fecha truncada devuelta por la base de datos a texto ISO."""
+    if isinstance(valor, datetime.datetime):
+        valor = valor.date()
+    return valor.isoformat() if valor else ''
+
+
+def _costos(fecha_inicio, fecha_fin):
+    from .models import CostoOperativo
+
+    return CostoOperativo.objects.filter(fecha__range=(fecha_inicio, fecha_fin))
+
+
+def _detalles_vendidos(fecha_inicio, fecha_fin):
+    from .models import DetallePedido
+
+    return (
+        DetallePedido.objects
+        .filter(pedido__fecha_pedido__range=(fecha_inicio, fecha_fin))
+        .exclude(pedido__estado='cancelado')
+    )
+
+
+def _pagos(fecha_inicio, fecha_fin):
+    from .models import Pago
+
+    return Pago.objects.filter(fecha__range=(fecha_inicio, fecha_fin))
+
+
+def _lineas_presupuesto(fecha_inicio, fecha_fin):
+    from .models import LineaPresupuesto
+
+    return LineaPresupuesto.objects.filter(
+        presupuesto__fecha_inicio__lte=fecha_fin, presupuesto__fecha_fin__gte=fecha_inicio,
+    )
+
+
+def seccion_costos(fecha_inicio, fecha_fin, tipo):
+    """Costos operativos por periodo y categoría de costo."""
+    truncar = AGRUPACION_POR_TIPO[tipo]
+    filas = (
+        _costos(fecha_inicio, fecha_fin)
+        .annotate(periodo=truncar('fecha'))
+        .values_list('periodo', 'tipo__categoria')
+        .annotate(total=Sum('monto'), registros=Count('id'))
+        .order_by('periodo', 'tipo__categoria')
+    )
+    resultado = []
+    total = Decimal('0')
+    for periodo, categoria, monto, registros in filas.iterator(chunk_size=TAMANO_LOTE):
+        resultado.append([_periodo(periodo), categoria, monto, registros])
+        total += monto or 0
+    return {
+        'titulo': 'Costos operativos',
+        'columnas': ['Periodo', 'Categoría', 'Monto', 'Registros'],
+        'filas': resultado,
+        'totales': {'Monto total': total},
+    }
+
+
+def seccion_ventas(fecha_inicio, fecha_fin, tipo):
+    """Ventas netas (subtotal menos descuento) de pedidos no cancelados."""
+    truncar = AGRUPACION_POR_TIPO[tipo]
+    neto = ExpressionWrapper(
+        F('subtotal') - F('descuento'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    filas = (
+        _detalles_vendidos(fecha_inicio, fecha_fin)
+        .annotate(periodo=truncar('pedido__fecha_pedido'))
+        .values_list('periodo')
+        .annotate(
+            venta_neta=Sum(neto),
+            cantidad=Sum('cantidad'),
+            pedidos=Count('pedido', distinct=True),
+        )
+        .order_by('periodo')
+    )
+    resultado = []
+    total = Decimal('0')
+    for periodo, venta_neta, cantidad, pedidos in filas.iterator(chunk_size=TAMANO_LOTE):
+        resultado.append([_periodo(periodo), venta_neta, cantidad, pedidos])
+        total += venta_neta or 0
+    return {
+        'titulo': 'Ventas',
+        'columnas': ['Periodo', 'Venta neta', 'Cantidad', 'Pedidos'],
+        'filas': resultado,
+        'totales': {'Venta neta total': total},
+    }
+
+
+def seccion_pagos(fecha_inicio, fecha_fin, tipo):
+    """Pagos recibidos por periodo y método de pago."""
+    truncar = AGRUPACION_POR_TIPO[tipo]
+    filas = (
+        _pagos(fecha_inicio, fecha_fin)
+        .annotate(periodo=truncar('fecha'))
+        .values_list('periodo', 'metodo_pago')
+        .annotate(total=Sum('monto'), pagos=Count('id'))
+        .order_by('periodo', 'metodo_pago')
+    )
+    resultado = []
+    total = Decimal('0')
+    for periodo, metodo, monto, pagos in filas.iterator(chunk_size=TAMANO_LOTE):
+        resultado.append([_periodo(periodo), metodo, monto, pagos])
+        total += monto or 0
+    return {
+        'titulo': 'Pagos recibidos',
+        'columnas': ['Periodo', 'Método', 'Monto', 'Pagos'],
+        'filas': resultado,
+        'totales': {'Cobrado total': total},
+    }
+
+
+def seccion_presupuesto(fecha_inicio, fecha_fin, tipo):
+    """Monto presupuestado frente a costo ejecutado por categoría de costo."""
+    presupuestado = dict(
+        _lineas_presupuesto(fecha_inicio, fecha_fin)
+        .values_list('tipo_costo__categoria')
+        .annotate(total=Sum('monto_presupuestado'))
+        .iterator(chunk_size=TAMANO_LOTE)
+    )
+    ejecutado = dict(
+        _costos(fecha_inicio, fecha_fin)
+        .values_list('tipo__categoria')
+        .annotate(total=Sum('monto'))
+        .iterator(chunk_size=TAMANO_LOTE)
+    )
+    resultado = []
+    for categoria in sorted(set(presupuestado) | set(ejecutado)):
+        previsto = presupuestado.get(categoria) or Decimal('0')
+        real = ejecutado.get(categoria) or Decimal('0')
+        resultado.append([categoria, previsto, real, previsto - real])
+    total_previsto = sum((fila[1] for fila in resultado), Decimal('0'))
+    total_real = sum((fila[2] for fila in resultado), Decimal('0'))
+    return {
+        'titulo': 'Ejecución presupuestaria',
+        'columnas': ['Categoría', 'Presupuestado', 'Ejecutado', 'Diferencia'],
+        'filas': resultado,
+        'totales': {
+            'Presupuestado': total_previsto,
+            'Ejecutado': total_real,
+            'Diferencia': total_previsto - total_real,
+        },
+    }
+
+
+SECCIONES = {
+    'costos': seccion_costos,
+    'ventas': seccion_ventas,
+    'pagos': seccion_pagos,
+    'presupuesto': seccion_presupuesto,
+}
+
+
+# Fuentes (contadores de VersionInforme) de las que depende cada sección
+FUENTES = {
+    'costos': ('costos',),
+    'ventas': ('ventas',),
+    'pagos': ('pagos',),
+    'presupuesto': ('presupuesto', 'costos'),
+}
+
+
+def invalidar(fuentes):
+    """
+    Marca como obsoletas las secciones que leen de las fuentes indicadas. El
+    contador se incrementa al confirmarse la transacción: así no se bloquea
+    su fila mientras dura la de quien modifica los datos, y una sección
+    calculada antes de ver el cambio queda guardada con la versión anterior.
+    """
+    fuentes = set(fuentes)
+    if fuentes:
+        transaction.on_commit(lambda: _incrementar(fuentes))
+
+
+def _incrementar(fuentes):
+    from .models import VersionInforme
+
+    VersionInforme.objects.bulk_create(
+        [VersionInforme(fuente=fuente) for fuente in fuentes], ignore_conflicts=True,
+    )
+    VersionInforme.objects.filter(fuente__in=fuentes).update(version=F('version') + 1)
+
+
+def _versiones():
+    from .models import VersionInforme
+
+    return dict(VersionInforme.objects.values_list('fuente', 'version'))
+
+
+def _clave_cache(nombre, fecha_inicio, fecha_fin, tipo, versiones):
+    marca = '.'.join(str(versiones.get(fuente, 0)) for fuente in FUENTES[nombre])
+    return f"informe:{nombre}:{tipo}:{fecha_inicio.isoformat()}:{fecha_fin.isoformat()}:{marca}"
+
+
+def _cache():
+    # Sin una caché 'informes' configurada se usa la del proceso
+    return caches['informes' if 'informes' in settings.CACHES else 'default']
+
+
+def _inicializar_worker():
+    """Prepara Django en cada proceso de trabajo con conexiones propias."""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _calcular_en_worker(nombre, fecha_inicio, fecha_fin, tipo):
+    try:
+        return nombre, SECCIONES[nombre](fecha_inicio, fecha_fin, tipo)
+    finally:
+        connections.close_all()
+
+
+def calcular_secciones(fecha_inicio, fecha_fin, tipo, secciones=None, paralelo=False, forzar=False):
+    """
+    Calcula las secciones pedidas y devuelve un diccionario nombre -> sección.
+
+    Las secciones ya presentes en caché con las mismas versiones de datos se
+    reutilizan salvo que se indique forzar=True. Las restantes se reparten
+    entre procesos de trabajo cuando paralelo=True y hay más de una
+    pendiente; paralelo sólo debe usarse fuera de una petición web (el
+    comando generar_informe), porque cierra las conexiones del proceso.
+    """
+    nombres = list(secciones or SECCIONES)
+    timeout = getattr(settings, 'INFORMES_CACHE_TIMEOUT', 60 * 60)
+    versiones = _versiones()
+    claves = {nombre: _clave_cache(nombre, fecha_inicio, fecha_fin, tipo, versiones) for nombre in nombres}
+    guardadas = {} if forzar else _cache().get_many(claves.values())
+    resultado = {nombre: guardadas[clave] for nombre, clave in claves.items() if clave in guardadas}
+    pendientes = [nombre for nombre in nombres if nombre not in resultado]
+
+    if paralelo and len(pendientes) > 1:
+        # Las conexiones abiertas no deben heredarse en los procesos hijos
+        connections.close_all()
+        max_workers = getattr(settings, 'INFORMES_MAX_WORKERS', None) or len(pendientes)
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(pendientes)),
+                                 initializer=_inicializar_worker) as executor:
+            futuros = [
+                executor.submit(_calcular_en_worker, nombre, fecha_inicio, fecha_fin, tipo)
+                for nombre in pendientes
+            ]
+            calculadas = [futuro.result() for futuro in futuros]
+    else:
+        calculadas = [(nombre, SECCIONES[nombre](fecha_inicio, fecha_fin, tipo)) for nombre in pendientes]
+
+    resultado.update(calculadas)
+    if calculadas:
+        _cache().set_many({claves[nombre]: datos for nombre, datos in calculadas}, timeout)
+
+    return {nombre: resultado[nombre] for nombre in nombres}
+
+
+#####################################
+# RENDERIZADO
+#####################################
+
+def renderizar_csv(informe, secciones):
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow([informe.codigo, informe.titulo])
+    escritor.writerow(['Periodo', informe.fecha_inicio.isoformat(), informe.fecha_fin.isoformat()])
+    for seccion in secciones.values():
+        escritor.writerow([])
+        escritor.writerow([seccion['titulo']])
+        escritor.writerow(seccion['columnas'])
+        escritor.writerows(seccion['filas'])
+        for etiqueta, valor in seccion['totales'].items():
+            escritor.writerow([etiqueta, valor])
+    return salida.getvalue().encode('utf-8')
+
+
+def renderizar_html(informe, secciones):
+    contexto = {'informe': informe, 'secciones': secciones.values()}
+    return render_to_string('agro_management/informe_financiero.html', contexto).encode('utf-8')
+
+
+RENDERIZADORES = {
+    'csv': renderizar_csv,
+    'html': renderizar_html,
+}
+
+
+def generar_informe(informe, formato='csv', paralelo=False, forzar=False):
+    """
+    Genera el archivo del informe, lo escribe en INFORMES_DIR y actualiza
+    informe.archivo y informe.fecha_generacion. Devuelve la ruta escrita.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+    secciones = calcular_secciones(
+        informe.fecha_inicio, informe.fecha_fin, informe.tipo,
+        paralelo=paralelo, forzar=forzar,
+    )
+    contenido = RENDERIZADORES[formato](informe, secciones)
+
+    directorio = Path(getattr(settings, 'INFORMES_DIR', settings.BASE_DIR / 'informes'))
+    directorio.mkdir(parents=True, exist_ok=True)
+    ruta = directorio / get_valid_filename(f"{informe.codigo}.{formato}")
+    ruta.write_bytes(contenido)
+
+    informe.archivo = str(ruta)
+    informe.fecha_generacion = timezone.localdate()
+    informe.save(update_fields=['archivo', 'fecha_generacion'])
+    return ruta
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from agro_management.proveedores import actualizar_indicadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las ventanas móviles y la puntuación compuesta de todos los proveedores'
+
+    def handle(self, *args, **options):
+        total = actualizar_indicadores()
+        self.stdout.write(self.style.SUCCESS(f"{total} indicadores de proveedor actualizados"))
@@ -0,0 +1,36 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from agro_management.cobranzas import aplicar_remesa, leer_remesa
+
+
+class Command(BaseCommand):
+    help = 'Aplica los pagos de una remesa (CSV con columnas factura,monto[,referencia]) por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--metodo', required=True, help='Método de pago de la remesa')
+        parser.add_argument('--fecha', type=datetime.date.fromisoformat, help='Fecha de los pagos (AAAA-MM-DD, hoy por omisión)')
+        parser.add_argument('--referencia', default='', help='Referencia para las filas que no traen una')
+        parser.add_argument('--lote', type=int, default=500, help='Pagos por lote de escritura')
+
+    def handle(self, *args, **options):
+        try:
+            archivo = open(options['archivo'], encoding='utf-8-sig', newline='')
+        except OSError as error:
+            raise CommandError(str(error))
+        with archivo:
+            resultado = aplicar_remesa(
+                leer_remesa(archivo),
+                options['fecha'] or timezone.localdate(),
+                options['metodo'],
+                referencia=options['referencia'],
+                batch_size=options['lote'],
+            )
+        for error in resultado['errores']:
+            self.stderr.write(f"Línea {error['linea']} ({error['factura']}): {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['aplicados']} pagos aplicados por {resultado['monto']}, {len(resultado['errores'])} filas rechazadas"
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from agro_management.models import PeriodoNomina
+from agro_management.nomina import calcular_nomina
+
+
+class Command(BaseCommand):
+    help = 'Calcula la nómina de un periodo y los costos de mano de obra por cultivo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('codigo', help='Código del PeriodoNomina')
+
+    def handle(self, *args, **options):
+        try:
+            periodo = PeriodoNomina.objects.get(codigo=options['codigo'])
+        except PeriodoNomina.DoesNotExist:
+            raise CommandError(f"No existe el periodo {options['codigo']}")
+        try:
+            lineas = calcular_nomina(periodo)
+        except ValueError as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f"{periodo.codigo}: {lineas} líneas calculadas"))
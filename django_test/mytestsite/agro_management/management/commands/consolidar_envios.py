@@ -0,0 +1,31 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from agro_management.envios import consolidar, planificar
+
+
+class Command(BaseCommand):
+    help = 'Agrupa los pedidos pendientes por fecha y ruta y los asigna a envíos según la capacidad de los vehículos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', type=datetime.date.fromisoformat, help='Primera fecha de entrega (AAAA-MM-DD, hoy por omisión)')
+        parser.add_argument('--hasta', type=datetime.date.fromisoformat, help='Última fecha de entrega (por omisión, la misma)')
+        parser.add_argument('--simular', action='store_true', help='Muestra el plan sin crear los envíos')
+
+    def handle(self, *args, **options):
+        desde = options['fecha'] or timezone.localdate()
+        hasta = options['hasta'] or desde
+        plan = planificar(desde, hasta) if options['simular'] else consolidar(desde, hasta)
+        for envio in plan['envios']:
+            self.stdout.write(
+                f"{envio.get('codigo', '-')} {envio['fecha']} ruta {envio['ruta']} vehículo {envio['vehiculo']}: "
+                f"{len(envio['pedidos'])} pedidos, {envio['peso']}/{envio['capacidad']} kg"
+            )
+        for pedido in plan['sin_asignar']:
+            self.stderr.write(f"Pedido {pedido['pedido']} ({pedido['fecha']}, ruta {pedido['ruta']}) sin vehículo con capacidad")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(plan['envios'])} envíos {'propuestos' if options['simular'] else 'creados'}, "
+            f"{len(plan['sin_asignar'])} pedidos sin asignar"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from agro_management.sensores import depurar
+
+
+class Command(BaseCommand):
+    help = 'Borra los bloques de lecturas de sensores y los agregados por hora que superan su retención'
+
+    def handle(self, *args, **options):
+        bloques, agregados = depurar()
+        self.stdout.write(self.style.SUCCESS(f"{bloques} bloques de lecturas y {agregados} agregados por hora borrados"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from agro_management.telemetria import depurar
+
+
+class Command(BaseCommand):
+    help = 'Borra por lotes las lecturas de telemetría y los resúmenes por minuto que superan su retención'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=10000, help='Filas borradas por transacción')
+
+    def handle(self, *args, **options):
+        lecturas, resumenes = depurar(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{lecturas} lecturas y {resumenes} resúmenes por minuto borrados"))
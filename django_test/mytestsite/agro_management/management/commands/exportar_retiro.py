@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from agro_management.models import LoteInsumo
+from agro_management.trazabilidad import exportar_lista_retiro
+
+
+class Command(BaseCommand):
+    help = 'Exporta en CSV los clientes, pedidos y envíos alcanzados por uno o varios lotes de insumo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('codigos', nargs='+', help='Códigos de LoteInsumo')
+        parser.add_argument('--salida', help='Archivo de destino (por defecto, salida estándar)')
+
+    def handle(self, *args, **options):
+        lotes = LoteInsumo.objects.filter(codigo_lote__in=options['codigos'])
+        faltantes = set(options['codigos']) - set(lotes.values_list('codigo_lote', flat=True))
+        if faltantes:
+            raise CommandError(f"No existen los lotes {', '.join(sorted(faltantes))}")
+        contenido = exportar_lista_retiro(lotes)
+        if options['salida']:
+            with open(options['salida'], 'wb') as archivo:
+                archivo.write(contenido)
+            self.stdout.write(self.style.SUCCESS(f"Lista de retiro en {options['salida']}"))
+        else:
+            self.stdout.write(contenido.decode('utf-8'), ending='')
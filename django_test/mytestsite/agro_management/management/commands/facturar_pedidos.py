@@ -0,0 +1,27 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agro_management.facturacion import facturar
+
+
+class Command(BaseCommand):
+    help = 'Emite en lote las facturas de los pedidos entregados que aún no tienen factura'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Fecha de emisión (AAAA-MM-DD); por omisión hoy')
+
+    def handle(self, *args, **options):
+        try:
+            fecha = datetime.date.fromisoformat(options['fecha']) if options['fecha'] else None
+        except ValueError:
+            raise CommandError('La fecha debe tener formato AAAA-MM-DD')
+        resultado = facturar(fecha=fecha)
+        if not resultado['facturadas']:
+            self.stdout.write('No hay pedidos entregados por facturar')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['facturadas']} facturas emitidas ({resultado['desde']} a {resultado['hasta']})"
+        ))
+        if resultado['omitidos']:
+            self.stdout.write(self.style.WARNING(f"{resultado['omitidos']} pedidos ya facturados por otra corrida"))
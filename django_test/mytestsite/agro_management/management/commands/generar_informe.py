@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from agro_management.informes import FORMATOS, generar_informe
+from agro_management.models import InformeFinanciero
+
+
+class Command(BaseCommand):
+    help = 'Genera el archivo de uno o varios informes financieros'
+
+    def add_arguments(self, parser):
+        parser.add_argument('codigos', nargs='+', help='Códigos de InformeFinanciero')
+        parser.add_argument('--formato', choices=FORMATOS, default='csv')
+        parser.add_argument('--secuencial', action='store_true', help='Calcular las secciones en un solo proceso')
+        parser.add_argument('--forzar', action='store_true', help='Ignorar las secciones en caché')
+
+    def handle(self, *args, **options):
+        for codigo in options['codigos']:
+            try:
+                informe = InformeFinanciero.objects.get(codigo=codigo)
+            except InformeFinanciero.DoesNotExist:
+                raise CommandError(f"No existe el informe {codigo}")
+            ruta = generar_informe(
+                informe,
+                formato=options['formato'],
+                paralelo=not options['secuencial'],
+                forzar=options['forzar'],
+            )
+            self.stdout.write(self.style.SUCCESS(f"{codigo}: {ruta}"))
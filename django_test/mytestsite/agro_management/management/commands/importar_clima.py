@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from agro_management.fenologia import actualizar, guardar_clima, leer_clima
+
+
+class Command(BaseCommand):
+    help = (
+        'Carga registros diarios de la estación (CSV fecha,temperatura_minima,temperatura_maxima[,precipitacion]) '
+        'y recalcula las etapas fenológicas previstas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--sin-prediccion', action='store_true', help='Sólo carga los datos, sin recalcular las predicciones')
+
+    def handle(self, *args, **options):
+        try:
+            archivo = open(options['archivo'], encoding='utf-8-sig', newline='')
+        except OSError as error:
+            raise CommandError(str(error))
+        with archivo:
+            registros, errores = leer_clima(archivo)
+        for error in errores:
+            self.stderr.write(f"Línea {error['linea']}: {error['error']}")
+        guardados = guardar_clima(registros)
+        self.stdout.write(self.style.SUCCESS(f"{guardados} días cargados, {len(errores)} filas rechazadas"))
+        if not options['sin_prediccion']:
+            cultivos, cambios = actualizar()
+            self.stdout.write(self.style.SUCCESS(
+                f"{cultivos} cultivos recalculados, {cambios} fechas de cosecha estimadas actualizadas"
+            ))
@@ -0,0 +1,91 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from agro_management.geometria import completar, leer_features
+from agro_management.models import FuenteAgua, Parcela
+
+# Modelo, campo único con el que se identifica cada objeto y propiedad de la
+# Feature que lo contiene por omisión. Las fuentes de agua no tienen código y
+# su nombre se repite, así que se identifican por id
+DESTINOS = {
+    'parcelas': (Parcela, 'codigo', 'codigo'),
+    'fuentes-agua': (FuenteAgua, 'pk', 'id'),
+}
+
+CAMPOS = ['geometria', 'latitud', 'longitud', 'min_lon', 'min_lat', 'max_lon', 'max_lat']
+
+
+class Command(BaseCommand):
+    help = 'Importa geometrías GeoJSON (FeatureCollection o secuencia de Features) sin cargar el archivo en memoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--tipo', choices=DESTINOS, default='parcelas')
+        parser.add_argument('--propiedad', help='Propiedad de la Feature que identifica el objeto')
+        parser.add_argument(
+            '--por-nombre', action='store_true',
+            help='Identifica las fuentes de agua por nombre; los nombres repetidos se informan como error',
+        )
+        parser.add_argument('--lote', type=int, default=500, help='Features por transacción')
+
+    def handle(self, *args, **options):
+        modelo, campo, propiedad = DESTINOS[options['tipo']]
+        if options['por_nombre']:
+            if modelo is not FuenteAgua:
+                raise CommandError('--por-nombre sólo se admite con --tipo fuentes-agua')
+            campo = propiedad = 'nombre'
+        propiedad = options['propiedad'] or propiedad
+        actualizados = sin_coincidencia = ambiguas = 0
+        try:
+            archivo = open(options['archivo'], encoding='utf-8')
+        except OSError as error:
+            raise CommandError(str(error))
+        with archivo:
+            pendientes = {}
+            for feature in leer_features(archivo):
+                clave = (feature.get('properties') or {}).get(propiedad)
+                if campo == 'pk':
+                    clave = str(clave) if str(clave).isdigit() else None
+                if clave is None or not feature.get('geometry'):
+                    sin_coincidencia += 1
+                    continue
+                pendientes[str(clave)] = feature['geometry']
+                if len(pendientes) >= options['lote']:
+                    n, repetidas = self.guardar(modelo, campo, pendientes)
+                    actualizados += n
+                    ambiguas += repetidas
+                    sin_coincidencia += len(pendientes) - n - repetidas
+                    pendientes = {}
+            n, repetidas = self.guardar(modelo, campo, pendientes)
+            actualizados += n
+            ambiguas += repetidas
+            sin_coincidencia += len(pendientes) - n - repetidas
+        self.stdout.write(self.style.SUCCESS(
+            f"{actualizados} geometrías importadas, {sin_coincidencia} features sin objeto correspondiente"
+        ))
+        if ambiguas:
+            raise CommandError(f"{ambiguas} features no se importaron por coincidir con varios objetos")
+
+    @transaction.atomic
+    def guardar(self, modelo, campo, geometrias):
+        """Actualiza los objetos de un lote; devuelve (actualizados, claves ambiguas)."""
+        por_clave = defaultdict(list)
+        for objeto in modelo.objects.filter(**{f'{campo}__in': geometrias}).only('pk', campo):
+            por_clave[str(getattr(objeto, campo))].append(objeto)
+        objetos, ambiguas = [], 0
+        for clave, coincidencias in por_clave.items():
+            if len(coincidencias) > 1:
+                ambiguas += 1
+                self.stderr.write(self.style.ERROR(
+                    f"'{clave}' coincide con {len(coincidencias)} objetos "
+                    f"(ids {', '.join(str(objeto.pk) for objeto in coincidencias)}); se omite"
+                ))
+                continue
+            objeto = coincidencias[0]
+            objeto.geometria = geometrias[clave]
+            completar(objeto)
+            objetos.append(objeto)
+        modelo.objects.bulk_update(objetos, CAMPOS, batch_size=500)
+        return len(objetos), ambiguas
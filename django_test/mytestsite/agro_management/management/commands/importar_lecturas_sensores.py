@@ -0,0 +1,36 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agro_management.sensores import leer_lecturas, registrar_lecturas
+
+
+class Command(BaseCommand):
+    help = 'Importa lecturas de sensores de campo (CSV con columnas sensor,momento,valor) por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--lote', type=int, default=50000, help='Lecturas por transacción')
+
+    def handle(self, *args, **options):
+        try:
+            archivo = open(options['archivo'], encoding='utf-8-sig', newline='')
+        except OSError as error:
+            raise CommandError(str(error))
+        registradas = rechazadas = 0
+        with archivo:
+            lote = []
+            for linea, fila in enumerate(csv.DictReader(archivo), start=2):
+                lote.append({**fila, 'linea': linea})
+                if len(lote) >= options['lote']:
+                    registradas, rechazadas = self._registrar(lote, registradas, rechazadas)
+                    lote = []
+            if lote:
+                registradas, rechazadas = self._registrar(lote, registradas, rechazadas)
+        self.stdout.write(self.style.SUCCESS(f"{registradas} lecturas registradas, {rechazadas} filas rechazadas"))
+
+    def _registrar(self, lote, registradas, rechazadas):
+        ternas, errores = leer_lecturas(lote)
+        for error in errores:
+            self.stderr.write(f"Línea {error['linea']} ({error['sensor']}): {error['error']}")
+        return registradas + registrar_lecturas(ternas), rechazadas + len(errores)
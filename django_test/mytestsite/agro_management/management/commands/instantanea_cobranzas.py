@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from agro_management.cobranzas import guardar_instantanea
+
+
+class Command(BaseCommand):
+    help = 'Guarda la antigüedad de saldos de cada cliente en SaldoClienteHistorico (ejecutar cada noche)'
+
+    def handle(self, *args, **options):
+        total = guardar_instantanea()
+        self.stdout.write(self.style.SUCCESS(f"{total} saldos de clientes guardados"))
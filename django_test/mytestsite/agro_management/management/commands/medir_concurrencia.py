@@ -0,0 +1,132 @@
+import asyncio
+import statistics
+import time
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+RUTAS = ['/agro/api/dashboard/', '/agro/api/parcelas/', '/agro/api/cultivos/']
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide peticiones por segundo y latencias de la API de lectura con muchas conexiones concurrentes '
+        'contra un servidor en marcha, por ejemplo "gunicorn mytestsite.wsgi" (WSGI) frente a '
+        '"uvicorn mytestsite.asgi:application" (ASGI) sobre la misma base de datos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='URL base del servidor, p. ej. http://127.0.0.1:8000')
+        parser.add_argument('--usuario', required=True, help='Usuario con el que se abre la sesión de las peticiones')
+        parser.add_argument('--conexiones', type=int, default=500, help='Conexiones concurrentes')
+        parser.add_argument('--duracion', type=float, default=10, help='Segundos de medición')
+        parser.add_argument('--ruta', action='append', dest='rutas', help='Ruta a pedir (repetible); por omisión la API de lectura')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Indique una URL http://servidor[:puerto]')
+        try:
+            usuario = get_user_model()._default_manager.get_by_natural_key(options['usuario'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['usuario']}")
+
+        sesion = self._abrir_sesion(usuario)
+        try:
+            resultado = asyncio.run(self._medir(
+                url.hostname, url.port or 80, options['rutas'] or RUTAS, options['conexiones'],
+                options['duracion'], f"{settings.SESSION_COOKIE_NAME}={sesion.session_key}",
+            ))
+        finally:
+            sesion.delete()
+
+        latencias = sorted(resultado['latencias'])
+        self.stdout.write(f"{len(latencias)} respuestas en {options['duracion']} s con {options['conexiones']} conexiones")
+        if len(latencias) >= 2:
+            percentiles = statistics.quantiles(latencias, n=100)
+            self.stdout.write(
+                f"Latencia p50 {percentiles[49] * 1000:.1f} ms, p95 {percentiles[94] * 1000:.1f} ms, "
+                f"p99 {percentiles[98] * 1000:.1f} ms"
+            )
+        self.stdout.write(f"Respuestas distintas de 200: {resultado['no_200']}, errores de conexión: {resultado['errores']}")
+        self.stdout.write(self.style.SUCCESS(f"{len(latencias) / options['duracion']:.1f} peticiones por segundo"))
+
+    def _abrir_sesion(self, usuario):
+        # Sesión equivalente a un login, para no depender del formulario de acceso
+        sesion = import_module(settings.SESSION_ENGINE).SessionStore()
+        sesion[SESSION_KEY] = usuario._meta.pk.value_to_string(usuario)
+        sesion[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        sesion[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        sesion.save()
+        return sesion
+
+    async def _medir(self, host, puerto, rutas, conexiones, duracion, cookie):
+        resultado = {'latencias': [], 'no_200': 0, 'errores': 0}
+        peticiones = [
+            f"GET {ruta} HTTP/1.1\r\nHost: {host}:{puerto}\r\nCookie: {cookie}\r\nAccept: application/json\r\n\r\n".encode()
+            for ruta in rutas
+        ]
+        fin = time.perf_counter() + duracion
+        await asyncio.gather(*(
+            self._conexion(host, puerto, peticiones[numero % len(peticiones):] + peticiones[:numero % len(peticiones)],
+                           fin, resultado)
+            for numero in range(conexiones)
+        ))
+        return resultado
+
+    async def _conexion(self, host, puerto, peticiones, fin, resultado):
+        """Una conexión que repite peticiones (keep-alive si el servidor lo admite) hasta el final."""
+        lector = escritor = None
+        numero = 0
+        while time.perf_counter() < fin:
+            if escritor is None:
+                try:
+                    lector, escritor = await asyncio.open_connection(host, puerto)
+                except OSError:
+                    resultado['errores'] += 1
+                    await asyncio.sleep(0.05)
+                    continue
+            peticion = peticiones[numero % len(peticiones)]
+            numero += 1
+            inicio = time.perf_counter()
+            try:
+                escritor.write(peticion)
+                await escritor.drain()
+                estado, cerrar = await asyncio.wait_for(self._leer_respuesta(lector), timeout=30)
+            except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                resultado['errores'] += 1
+                escritor.close()
+                escritor = None
+                continue
+            if time.perf_counter() <= fin:
+                resultado['latencias'].append(time.perf_counter() - inicio)
+                resultado['no_200'] += estado != 200
+            if cerrar:
+                escritor.close()
+                escritor = None
+        if escritor is not None:
+            escritor.close()
+
+    async def _leer_respuesta(self, lector):
+        cabecera = (await lector.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        version, estado = cabecera[0].split(' ', 2)[:2]
+        cabeceras = {}
+        for linea in cabecera[1:]:
+            nombre, _, valor = linea.partition(':')
+            cabeceras[nombre.strip().lower()] = valor.strip().lower()
+        cerrar = version == 'HTTP/1.0' or cabeceras.get('connection') == 'close'
+        if 'content-length' in cabeceras:
+            await lector.readexactly(int(cabeceras['content-length']))
+        elif cabeceras.get('transfer-encoding') == 'chunked':
+            while True:
+                tamano = int((await lector.readuntil(b'\r\n')).split(b';')[0], 16)
+                await lector.readexactly(tamano + 2)
+                if tamano == 0:
+                    break
+        else:
+            await lector.read()
+            cerrar = True
+        return int(estado), cerrar
@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from agro_management.envios import ESTADOS_ENVIO_ACTIVOS
+from agro_management.models import Envio
+from agro_management.rutas import actualizar_rutas, planificar_envios
+
+
+class Command(BaseCommand):
+    help = 'Ordena las paradas de los envíos programados de una fecha y recalcula las llegadas estimadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', type=datetime.date.fromisoformat, help='Fecha de los envíos (AAAA-MM-DD, hoy por omisión)')
+        parser.add_argument('--rutas', action='store_true', help='Recalcula también los puntos intermedios y totales de las rutas')
+
+    def handle(self, *args, **options):
+        fecha = options['fecha'] or timezone.localdate()
+        envios = Envio.objects.filter(fecha_programada=fecha, estado__in=ESTADOS_ENVIO_ACTIVOS).values_list('pk', flat=True)
+        try:
+            if options['rutas']:
+                rutas, puntos = actualizar_rutas()
+                self.stdout.write(f"{rutas} rutas y {puntos} puntos intermedios recalculados")
+            paradas = planificar_envios(list(envios))
+        except ImproperlyConfigured as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f"{len(paradas)} paradas planificadas para {fecha}"))
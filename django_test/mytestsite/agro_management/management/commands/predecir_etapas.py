@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from agro_management.fenologia import actualizar
+
+
+class Command(BaseCommand):
+    help = 'Recalcula por grados-día las etapas fenológicas previstas y la fecha de cosecha estimada de los cultivos abiertos'
+
+    def handle(self, *args, **options):
+        cultivos, cambios, conflictos = actualizar()
+        self.stdout.write(self.style.SUCCESS(
+            f"{cultivos} cultivos recalculados, {cambios} fechas de cosecha estimadas actualizadas"
+        ))
+        for cultivo_id, mensaje in sorted(conflictos.items()):
+            self.stdout.write(self.style.WARNING(f"Cultivo {cultivo_id}: {mensaje}"))
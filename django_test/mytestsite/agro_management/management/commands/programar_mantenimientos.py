@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from agro_management.maquinaria import programar_mantenimientos
+
+
+class Command(BaseCommand):
+    help = 'Evalúa las reglas de mantenimiento de toda la flota y programa los preventivos vencidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horizonte', type=int, default=0,
+            help='Incluir también los servicios que vencerán en los próximos N días según el uso reciente',
+        )
+
+    def handle(self, *args, **options):
+        creados = programar_mantenimientos(horizonte_dias=options['horizonte'])
+        for mantenimiento in creados:
+            self.stdout.write(f"{mantenimiento.codigo}: {mantenimiento.descripcion} ({mantenimiento.fecha_programada})")
+        self.stdout.write(self.style.SUCCESS(f"{len(creados)} mantenimientos programados"))
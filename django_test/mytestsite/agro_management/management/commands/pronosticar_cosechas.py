@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from agro_management.pronosticos import pronosticar
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los pronósticos de cosecha de los cultivos abiertos y la distribución de su error'
+
+    def handle(self, *args, **options):
+        total = pronosticar()
+        self.stdout.write(self.style.SUCCESS(f"{total} cultivos pronosticados"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from agro_management.totales import reconciliar_facturas, reconciliar_pedidos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula en bloque los totales de pedidos y los saldos de facturas desde sus líneas y pagos'
+
+    def handle(self, *args, **options):
+        pedidos = reconciliar_pedidos()
+        facturas = reconciliar_facturas()
+        self.stdout.write(self.style.SUCCESS(f"{pedidos} pedidos y {facturas} facturas reconciliados"))
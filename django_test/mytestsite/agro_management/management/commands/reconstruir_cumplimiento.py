@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from agro_management.cumplimiento import sincronizar
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la matriz de cumplimiento de capacitaciones de todos los trabajadores'
+
+    def handle(self, *args, **options):
+        total = sincronizar()
+        self.stdout.write(self.style.SUCCESS(f"{total} capacitaciones requeridas en la matriz"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from agro_management.ocupacion import reconstruir_ocupacion
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el calendario de ocupación de maquinaria y operadores desde UsoMaquinaria'
+
+    def handle(self, *args, **options):
+        total = reconstruir_ocupacion()
+        self.stdout.write(self.style.SUCCESS(f"{total} filas de ocupación reconstruidas"))
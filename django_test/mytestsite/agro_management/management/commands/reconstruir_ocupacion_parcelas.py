@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from agro_management.parcelas import reconstruir
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los segmentos de ocupación de todas las parcelas'
+
+    def handle(self, *args, **options):
+        total = reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"{total} segmentos de ocupación"))
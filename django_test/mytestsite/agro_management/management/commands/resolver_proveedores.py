@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from agro_management.proveedores import resolver_proveedores
+
+
+class Command(BaseCommand):
+    help = 'Relaciona el texto de proveedor de los lotes de insumo con los proveedores registrados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--revisar-todo', action='store_true',
+            help='Volver a puntuar las propuestas y los textos sin coincidencia',
+        )
+
+    def handle(self, *args, **options):
+        resultado = resolver_proveedores(revisar_todo=options['revisar_todo'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['textos']} textos procesados: {resultado['confirmadas']} confirmados, "
+            f"{resultado['propuestas']} propuestos, {resultado['lotes_vinculados']} lotes vinculados"
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from agro_management.secuencias import sincronizar
+
+
+class Command(BaseCommand):
+    help = 'Lleva las secuencias de códigos más allá del mayor código existente de cada formato'
+
+    def handle(self, *args, **options):
+        movidas = sincronizar()
+        if not movidas:
+            self.stdout.write('Las secuencias ya están al día')
+            return
+        for secuencia, siguiente in sorted(movidas.items()):
+            self.stdout.write(f"{secuencia}: siguiente {siguiente}")
+        self.stdout.write(self.style.SUCCESS(f"{len(movidas)} secuencias sincronizadas"))
@@ -0,0 +1,182 @@
+"""
+Horas de uso acumuladas y programación de mantenimiento preventivo.
+
+Maquinaria.horas_uso se mantiene con incrementos atómicos (F) cada vez que se
+registra, modifica o elimina un UsoMaquinaria. Las reglas de servicio por
+CategoriaMaquinaria se evalúan para toda la flota en una sola consulta, y los
+mantenimientos preventivos resultantes se crean con bulk_create.
+"""
+
+import datetime
+import math
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case, DecimalField, Exists, F, FilteredRelation, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import ocupacion, secuencias
+from .models import Maquinaria, MantenimientoMaquinaria, ReglaMantenimiento, UsoMaquinaria
+
+CERO = Decimal('0')
+
+# Estados de mantenimiento que bloquean programar otro para la misma regla
+ESTADOS_PENDIENTES = ('programado', 'en_proceso')
+
+
+def ajustar_horas(cambios):
+    """
+    Aplica incrementos de horas por máquina en una sola sentencia UPDATE.
+
+    cambios es un diccionario {maquinaria_id: delta_horas}; los deltas
+    negativos descuentan horas (usos eliminados o corregidos).
+    """
+    cambios = {pk: delta for pk, delta in cambios.items() if delta}
+    if not cambios:
+        return 0
+    delta = Case(
+        *[When(pk=pk, then=Value(valor)) for pk, valor in cambios.items()],
+        default=Value(CERO),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    return Maquinaria.objects.filter(pk__in=cambios).update(horas_uso=F('horas_uso') + delta)
+
+
+def cambios_por_uso(uso, anterior=None, signo=1):
+    """Devuelve los deltas de horas que produce guardar o eliminar un uso."""
+    cambios = defaultdict(lambda: CERO)
+    if anterior:
+        cambios[anterior['maquinaria_id']] -= anterior['horas_uso']
+    cambios[uso.maquinaria_id] += signo * Decimal(uso.horas_uso)
+    return cambios
+
+
+@transaction.atomic
+def registrar_usos(usos, batch_size=500):
+    """
+    Inserta usos de maquinaria en bloque, acumula sus horas por máquina y
+    actualiza el calendario de ocupación.
+    """
+    creados = UsoMaquinaria.objects.bulk_create(usos, batch_size=batch_size)
+    cambios = defaultdict(lambda: CERO)
+    ocupados = defaultdict(lambda: CERO)
+    for uso in creados:
+        cambios[uso.maquinaria_id] += Decimal(uso.horas_uso)
+        for clave, delta in ocupacion.cambios_por_uso(uso).items():
+            ocupados[clave] += delta
+    ajustar_horas(cambios)
+    ocupacion.aplicar_cambios(ocupados)
+    return creados
+
+
+def mantenimientos_pendientes_de_programar(hoy=None, horizonte_dias=0):
+    """
+    Evalúa las reglas activas contra toda la flota en una sola consulta.
+
+    Devuelve una lista de diccionarios con la máquina, la regla y la fecha
+    sugerida. Una regla vence cuando las horas desde el último servicio
+    alcanzan intervalo_horas o cuando han pasado intervalo_dias; con
+    horizonte_dias > 0 también se incluyen las que vencerán dentro de ese
+    plazo según el uso medio diario reciente.
+    """
+    hoy = hoy or timezone.localdate()
+    dias_promedio = getattr(settings, 'MANTENIMIENTO_DIAS_PROMEDIO_USO', 30)
+
+    ultimo = (
+        MantenimientoMaquinaria.objects
+        .filter(maquinaria=OuterRef('pk'), regla=OuterRef('regla_id'))
+        .exclude(estado='cancelado')
+        .order_by('-fecha_programada', '-pk')
+    )
+    pendiente = MantenimientoMaquinaria.objects.filter(
+        maquinaria=OuterRef('pk'), regla=OuterRef('regla_id'), estado__in=ESTADOS_PENDIENTES,
+    )
+    uso_reciente = (
+        UsoMaquinaria.objects
+        .filter(maquinaria=OuterRef('pk'), fecha_uso__gt=hoy - datetime.timedelta(days=dias_promedio))
+        .values('maquinaria')
+        .annotate(total=Sum('horas_uso'))
+        .values('total')
+    )
+    horas = DecimalField(max_digits=10, decimal_places=2)
+
+    filas = (
+        Maquinaria.objects
+        .annotate(regla=FilteredRelation(
+            'categoria__reglas_mantenimiento',
+            condition=Q(categoria__reglas_mantenimiento__activa=True),
+        ))
+        .filter(regla__isnull=False)
+        .annotate(
+            regla_id=F('regla__id'),
+            intervalo_horas=F('regla__intervalo_horas'),
+            intervalo_dias=F('regla__intervalo_dias'),
+            horas_ultimo=Coalesce(Subquery(ultimo.values('horas_maquina')[:1]), Value(CERO), output_field=horas),
+            fecha_ultimo=Subquery(ultimo.values('fecha_programada')[:1]),
+            uso_reciente=Coalesce(Subquery(uso_reciente), Value(CERO), output_field=horas),
+            tiene_pendiente=Exists(pendiente),
+        )
+        .filter(tiene_pendiente=False)
+        .exclude(estado__iexact='fuera de servicio')
+        .values(
+            'pk', 'codigo', 'horas_uso', 'fecha_adquisicion', 'regla_id', 'intervalo_horas',
+            'intervalo_dias', 'horas_ultimo', 'fecha_ultimo', 'uso_reciente',
+        )
+    )
+
+    resultado = []
+    for fila in filas:
+        desde = fila['horas_uso'] - fila['horas_ultimo']
+        restantes = fila['intervalo_horas'] - desde
+        tasa_diaria = fila['uso_reciente'] / dias_promedio
+        fechas = []
+        if restantes <= 0:
+            fechas.append(hoy)
+        elif tasa_diaria > 0:
+            fechas.append(hoy + datetime.timedelta(days=math.ceil(restantes / tasa_diaria)))
+        if fila['intervalo_dias']:
+            referencia = fila['fecha_ultimo'] or fila['fecha_adquisicion']
+            fechas.append(max(hoy, referencia + datetime.timedelta(days=fila['intervalo_dias'])))
+        if not fechas:
+            continue
+        fecha = min(fechas)
+        if (fecha - hoy).days <= horizonte_dias:
+            resultado.append({
+                'maquinaria_id': fila['pk'],
+                'codigo': fila['codigo'],
+                'regla_id': fila['regla_id'],
+                'horas_uso': fila['horas_uso'],
+                'horas_desde_servicio': desde,
+                'fecha_programada': fecha,
+            })
+    return resultado
+
+
+@transaction.atomic
+def programar_mantenimientos(hoy=None, horizonte_dias=0):
+    """Crea en bloque los mantenimientos preventivos que indiquen las reglas."""
+    hoy = hoy or timezone.localdate()
+    propuestas = mantenimientos_pendientes_de_programar(hoy, horizonte_dias)
+    if not propuestas:
+        return []
+    reglas = ReglaMantenimiento.objects.in_bulk({p['regla_id'] for p in propuestas})
+    nuevos = secuencias.asignar([
+        MantenimientoMaquinaria(
+            maquinaria_id=propuesta['maquinaria_id'],
+            regla_id=propuesta['regla_id'],
+            tipo='preventivo',
+            descripcion=(
+                f"{reglas[propuesta['regla_id']].nombre}: "
+                f"{propuesta['horas_desde_servicio']} h desde el último servicio"
+            ),
+            fecha_programada=propuesta['fecha_programada'],
+            horas_maquina=propuesta['horas_uso'],
+        )
+        for propuesta in propuestas
+    ])
+    return MantenimientoMaquinaria.objects.bulk_create(nuevos, batch_size=500)
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mantenimientomaquinaria',
+            name='horas_maquina',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AlterField(
+            model_name='maquinaria',
+            name='horas_uso',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.CreateModel(
+            name='ReglaMantenimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('descripcion', models.TextField(blank=True)),
+                ('intervalo_horas', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('intervalo_dias', models.IntegerField(blank=True, null=True)),
+                ('activa', models.BooleanField(default=True)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reglas_mantenimiento', to='agro_management.categoriamaquinaria')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='mantenimientomaquinaria',
+            name='regla',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mantenimientos', to='agro_management.reglamantenimiento'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0002_mantenimiento_preventivo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacionRecurso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_recurso', models.CharField(choices=[('maquinaria', 'Maquinaria'), ('operador', 'Operador')], max_length=20)),
+                ('recurso_id', models.PositiveBigIntegerField()),
+                ('fecha', models.DateField()),
+                ('horas', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('conflicto', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tipo_recurso', 'fecha', 'horas'], name='ocupacion_fecha_horas_idx')],
+                'constraints': [models.UniqueConstraint(fields=('tipo_recurso', 'recurso_id', 'fecha'), name='ocupacion_recurso_dia_unica')],
+            },
+        ),
+    ]
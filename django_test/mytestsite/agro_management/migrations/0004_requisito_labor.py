@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0003_ocupacion_recurso'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequisitoLabor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nivel_minimo', models.CharField(choices=[('basico', 'Básico'), ('intermedio', 'Intermedio'), ('avanzado', 'Avanzado'), ('experto', 'Experto')], default='basico', max_length=20)),
+                ('habilidad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='agro_management.habilidad')),
+                ('tipo_labor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='requisitos', to='agro_management.tipolabor')),
+            ],
+        ),
+    ]
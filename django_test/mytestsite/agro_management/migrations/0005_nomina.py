@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0004_requisito_labor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodoNomina',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=50, unique=True)),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField()),
+                ('estado', models.CharField(choices=[('abierto', 'Abierto'), ('calculado', 'Calculado'), ('cerrado', 'Cerrado')], default='abierto', max_length=20)),
+                ('fecha_calculo', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LineaNomina',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('salario_base', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('horas_trabajadas', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('horas_extra', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('pago_horas_extra', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_bruto', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('contrato', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='agro_management.contrato')),
+                ('trabajador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas_nomina', to='agro_management.trabajador')),
+                ('periodo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='agro_management.periodonomina')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('periodo', 'trabajador'), name='linea_nomina_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0005_nomina'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequisitoCapacitacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vigencia_dias', models.IntegerField(blank=True, null=True)),
+                ('capacitacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='requisitos', to='agro_management.capacitacion')),
+                ('cargo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='capacitaciones_requeridas', to='agro_management.cargo')),
+                ('habilidad', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='capacitaciones_requeridas', to='agro_management.habilidad')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EstadoCapacitacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('programada', 'Programada'), ('en_curso', 'En Curso'), ('completada', 'Completada')], default='pendiente', max_length=20)),
+                ('fecha_completada', models.DateField(blank=True, null=True)),
+                ('fecha_vencimiento', models.DateField(blank=True, null=True)),
+                ('capacitacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estados', to='agro_management.capacitacion')),
+                ('trabajador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estado_capacitaciones', to='agro_management.trabajador')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'fecha_vencimiento'], name='estado_capacitacion_idx')],
+                'constraints': [models.UniqueConstraint(fields=('trabajador', 'capacitacion'), name='estado_capacitacion_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0006_cumplimiento_capacitaciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoincidenciaProveedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('texto', models.CharField(max_length=100, unique=True)),
+                ('texto_normalizado', models.CharField(db_index=True, max_length=100)),
+                ('puntuacion', models.DecimalField(decimal_places=3, default=0, max_digits=4)),
+                ('metodo', models.CharField(blank=True, choices=[('ruc', 'RUC'), ('exacto', 'Nombre exacto'), ('difuso', 'Nombre aproximado'), ('manual', 'Manual')], max_length=20)),
+                ('estado', models.CharField(choices=[('propuesta', 'Propuesta'), ('confirmada', 'Confirmada'), ('rechazada', 'Rechazada'), ('sin_coincidencia', 'Sin Coincidencia')], default='propuesta', max_length=20)),
+                ('fecha_revision', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='loteinsumo',
+            name='proveedor_registrado',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lotes', to='agro_management.proveedor'),
+        ),
+        migrations.AddIndex(
+            model_name='loteinsumo',
+            index=models.Index(fields=['proveedor_registrado', 'fecha_adquisicion'], name='lote_proveedor_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='coincidenciaproveedor',
+            name='proveedor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='coincidencias', to='agro_management.proveedor'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0007_resolucion_proveedores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicadorProveedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('evaluaciones_90', models.IntegerField(default=0)),
+                ('promedio_90', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('evaluaciones_365', models.IntegerField(default=0)),
+                ('promedio_365', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('lotes_365', models.IntegerField(default=0)),
+                ('tasa_caducidad', models.DecimalField(decimal_places=4, default=0, max_digits=5)),
+                ('tasa_consumo', models.DecimalField(decimal_places=4, default=0, max_digits=5)),
+                ('puntuacion', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('fecha_calculo', models.DateTimeField()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='evaluacionproveedor',
+            name='puntuacion_total',
+            field=models.IntegerField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='evaluacionproveedor',
+            index=models.Index(fields=['proveedor', 'fecha'], name='evaluacion_proveedor_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='indicadorproveedor',
+            name='proveedor',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='indicador', to='agro_management.proveedor'),
+        ),
+        migrations.AddIndex(
+            model_name='indicadorproveedor',
+            index=models.Index(fields=['-puntuacion'], name='indicador_proveedor_rank_idx'),
+        ),
+    ]
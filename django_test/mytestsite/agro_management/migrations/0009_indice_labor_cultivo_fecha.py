@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0008_indicador_proveedor'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='laboragricola',
+            index=models.Index(fields=['cultivo', 'fecha_realizacion'], name='labor_cultivo_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0009_indice_labor_cultivo_fecha'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ErrorPronostico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ambito', models.CharField(choices=[('global', 'Global'), ('variedad', 'Variedad'), ('parcela', 'Parcela')], max_length=20)),
+                ('observaciones', models.IntegerField()),
+                ('error_medio', models.DecimalField(decimal_places=4, max_digits=7)),
+                ('desviacion', models.DecimalField(decimal_places=4, max_digits=7)),
+                ('percentil_10', models.DecimalField(decimal_places=4, max_digits=7)),
+                ('percentil_90', models.DecimalField(decimal_places=4, max_digits=7)),
+                ('error_dias_medio', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('fecha_calculo', models.DateTimeField()),
+                ('parcela', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='errores_pronostico', to='agro_management.parcela')),
+                ('variedad', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='errores_pronostico', to='agro_management.variedad')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PronosticoCosecha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rendimiento_ha', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('produccion_kg', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('produccion_minima_kg', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('produccion_maxima_kg', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('fecha_cosecha', models.DateField()),
+                ('factor_variedad', models.DecimalField(decimal_places=3, max_digits=6)),
+                ('factor_parcela', models.DecimalField(decimal_places=3, max_digits=6)),
+                ('factor_suelo', models.DecimalField(decimal_places=3, max_digits=6)),
+                ('fecha_calculo', models.DateTimeField()),
+                ('cultivo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pronostico', to='agro_management.cultivo')),
+            ],
+        ),
+    ]
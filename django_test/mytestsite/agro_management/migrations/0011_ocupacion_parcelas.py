@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0010_pronostico_cosecha'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='parcela',
+            name='fecha_ultima_utilizacion',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='SegmentoOcupacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_inicio', models.DateField()),
+                ('fecha_fin', models.DateField()),
+                ('area_ocupada', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('parcela', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segmentos_ocupacion', to='agro_management.parcela')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['parcela', 'fecha_inicio'], name='segmento_parcela_inicio_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,142 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:52
+
+from django.db import DatabaseError, migrations, models
+
+# DDL congelado en la migración: geometria.py puede cambiar sin alterar lo que hace
+TABLAS_RTREE = {
+    'agro_management_parcela': 'agro_management_parcela_rtree',
+    'agro_management_fuenteagua': 'agro_management_fuenteagua_rtree',
+}
+
+
+def crear_rtree(apps, schema_editor):
+    # Índice R*Tree en SQLite; en otros motores basta el índice de la caja
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            for rtree in TABLAS_RTREE.values():
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {rtree} USING rtree(id, min_lon, max_lon, min_lat, max_lat)"
+                )
+        except DatabaseError:
+            # SQLite compilado sin R*Tree: las consultas usan el índice de la caja
+            return
+        for base, rtree in TABLAS_RTREE.items():
+            insertar = (
+                f"INSERT INTO {rtree} SELECT NEW.id, NEW.min_lon, NEW.max_lon, NEW.min_lat, NEW.max_lat "
+                f"WHERE NEW.min_lat IS NOT NULL;"
+            )
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {rtree}_ins AFTER INSERT ON {base} BEGIN {insertar} END")
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {rtree}_upd AFTER UPDATE OF min_lon, max_lon, min_lat, max_lat ON {base} "
+                f"BEGIN DELETE FROM {rtree} WHERE id = OLD.id; {insertar} END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {rtree}_del AFTER DELETE ON {base} "
+                f"BEGIN DELETE FROM {rtree} WHERE id = OLD.id; END"
+            )
+            cursor.execute(
+                f"INSERT INTO {rtree} SELECT id, min_lon, max_lon, min_lat, max_lat FROM {base} WHERE min_lat IS NOT NULL"
+            )
+
+
+def eliminar_rtree(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for rtree in TABLAS_RTREE.values():
+            for sufijo in ('ins', 'upd', 'del'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {rtree}_{sufijo}")
+            cursor.execute(f"DROP TABLE IF EXISTS {rtree}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0011_ocupacion_parcelas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fuenteagua',
+            name='geometria',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fuenteagua',
+            name='latitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fuenteagua',
+            name='longitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fuenteagua',
+            name='max_lat',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='fuenteagua',
+            name='max_lon',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='fuenteagua',
+            name='min_lat',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='fuenteagua',
+            name='min_lon',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='parcela',
+            name='geometria',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='parcela',
+            name='latitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='parcela',
+            name='longitud',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='parcela',
+            name='max_lat',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='parcela',
+            name='max_lon',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='parcela',
+            name='min_lat',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='parcela',
+            name='min_lon',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='fuenteagua',
+            index=models.Index(fields=['min_lon', 'min_lat'], name='fuente_agua_caja_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parcela',
+            index=models.Index(fields=['min_lon', 'min_lat'], name='parcela_caja_idx'),
+        ),
+        migrations.RunPython(crear_rtree, eliminar_rtree),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:56
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def calcular_totales(apps, schema_editor):
+    # Igual que totales.reconciliar_*, con los modelos históricos
+    Pedido = apps.get_model('agro_management', 'Pedido')
+    DetallePedido = apps.get_model('agro_management', 'DetallePedido')
+    Factura = apps.get_model('agro_management', 'Factura')
+    Pago = apps.get_model('agro_management', 'Pago')
+    importe = DecimalField(max_digits=12, decimal_places=2)
+    detalles = DetallePedido.objects.filter(pedido=OuterRef('pk')).order_by().values('pedido')
+    Pedido.objects.update(
+        total=Coalesce(Subquery(detalles.annotate(neto=Sum(F('subtotal') - F('descuento'))).values('neto')),
+                       Value(0), output_field=importe),
+        lineas=Coalesce(Subquery(detalles.annotate(n=Count('pk')).values('n')), Value(0)),
+    )
+    pagos = Pago.objects.filter(factura=OuterRef('pk')).order_by().values('factura').annotate(suma=Sum('monto'))
+    pagado = Coalesce(Subquery(pagos.values('suma')), Value(0), output_field=importe)
+    Factura.objects.update(pagado=pagado, saldo=F('total') - pagado)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0012_geometria_parcelas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='pagado',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='factura',
+            name='saldo',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='lineas',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(calcular_totales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def marcar_pagadas(apps, schema_editor):
+    Factura = apps.get_model('agro_management', 'Factura')
+    Factura.objects.filter(estado='emitida', saldo__lte=0).update(estado='pagada')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0013_totales_pedido_factura'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoClienteHistorico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('facturas', models.IntegerField(default=0)),
+                ('por_vencer', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vencido_0_30', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vencido_31_60', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vencido_61_90', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vencido_90_mas', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('saldo_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['estado', 'fecha_vencimiento'], name='factura_estado_vencimiento_idx'),
+        ),
+        migrations.AddField(
+            model_name='saldoclientehistorico',
+            name='cliente',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_historicos', to='agro_management.cliente'),
+        ),
+        migrations.AddIndex(
+            model_name='saldoclientehistorico',
+            index=models.Index(fields=['fecha'], name='saldo_historico_fecha_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='saldoclientehistorico',
+            constraint=models.UniqueConstraint(fields=('cliente', 'fecha'), name='saldo_cliente_fecha_unico'),
+        ),
+        migrations.RunPython(marcar_pagadas, migrations.RunPython.noop),
+    ]
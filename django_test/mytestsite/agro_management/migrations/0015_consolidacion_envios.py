@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:00
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from agro_management.atp import kg_por_unidad
+
+
+def calcular_pesos(apps, schema_editor):
+    Pedido = apps.get_model('agro_management', 'Pedido')
+    DetallePedido = apps.get_model('agro_management', 'DetallePedido')
+    pesos = defaultdict(Decimal)
+    for pedido_id, cantidad, capacidad, unidad in DetallePedido.objects.values_list(
+            'pedido_id', 'cantidad', 'producto__presentacion__capacidad', 'producto__presentacion__unidad_medida'):
+        pesos[pedido_id] += cantidad * kg_por_unidad(capacidad, unidad)
+    Pedido.objects.bulk_update(
+        [Pedido(pk=pk, peso_total=peso) for pk, peso in pesos.items()], ['peso_total'], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0014_cobranzas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='peso_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='ruta',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pedidos', to='agro_management.rutaentrega'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['estado', 'fecha_entrega_solicitada'], name='pedido_estado_entrega_idx'),
+        ),
+        migrations.RunPython(calcular_pesos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0015_consolidacion_envios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParadaEnvio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orden', models.IntegerField()),
+                ('distancia_acumulada', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('minutos_llegada', models.IntegerField(blank=True, null=True)),
+                ('llegada_estimada', models.DateTimeField(blank=True, null=True)),
+                ('envio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='paradas', to='agro_management.envio')),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='paradas', to='agro_management.pedido')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['envio', 'orden'], name='parada_envio_orden_idx')],
+                'constraints': [models.UniqueConstraint(fields=('envio', 'pedido'), name='parada_envio_pedido_unica')],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0016_paradas_envio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DispositivoTelemetria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=50, unique=True)),
+                ('tipo', models.CharField(choices=[('gps', 'GPS'), ('horometro', 'Horómetro')], max_length=20)),
+                ('token', models.CharField(editable=False, max_length=64, unique=True)),
+                ('activo', models.BooleanField(default=True)),
+                ('maquinaria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='dispositivos', to='agro_management.maquinaria')),
+                ('vehiculo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='dispositivos', to='agro_management.vehiculo')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EstadoDispositivo',
+            fields=[
+                ('dispositivo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estado', serialize=False, to='agro_management.dispositivotelemetria')),
+                ('momento', models.DateTimeField()),
+                ('latitud', models.FloatField(blank=True, null=True)),
+                ('longitud', models.FloatField(blank=True, null=True)),
+                ('velocidad', models.FloatField(blank=True, null=True)),
+                ('horas_motor', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LecturaTelemetria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('momento', models.DateTimeField()),
+                ('latitud', models.FloatField(blank=True, null=True)),
+                ('longitud', models.FloatField(blank=True, null=True)),
+                ('velocidad', models.FloatField(blank=True, null=True)),
+                ('horas_motor', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('dispositivo', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='lecturas', to='agro_management.dispositivotelemetria')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dispositivo', 'momento'], name='lectura_disp_momento_idx'), models.Index(fields=['momento'], name='lectura_momento_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenTelemetria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularidad', models.CharField(choices=[('minuto', 'Minuto'), ('hora', 'Hora')], max_length=10)),
+                ('inicio', models.DateTimeField()),
+                ('lecturas', models.IntegerField(default=0)),
+                ('suma_velocidad', models.FloatField(default=0)),
+                ('lecturas_velocidad', models.IntegerField(default=0)),
+                ('velocidad_maxima', models.FloatField(blank=True, null=True)),
+                ('horas_motor_min', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('horas_motor_max', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('ultimo_momento', models.DateTimeField()),
+                ('latitud', models.FloatField(blank=True, null=True)),
+                ('longitud', models.FloatField(blank=True, null=True)),
+                ('dispositivo', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='agro_management.dispositivotelemetria')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularidad', 'inicio'], name='resumen_gran_inicio_idx')],
+                'constraints': [models.UniqueConstraint(fields=('dispositivo', 'granularidad', 'inicio'), name='resumen_telemetria_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0017_telemetria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sensor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=50, unique=True)),
+                ('tipo', models.CharField(choices=[('humedad_suelo', 'Humedad del suelo'), ('temperatura', 'Temperatura'), ('precipitacion', 'Precipitación'), ('humedad_relativa', 'Humedad relativa')], max_length=20)),
+                ('activo', models.BooleanField(default=True)),
+                ('parcela', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sensores', to='agro_management.parcela')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BloqueLecturas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('lecturas', models.IntegerField(default=0)),
+                ('segundos', models.BinaryField()),
+                ('valores', models.BinaryField()),
+                ('sensor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='bloques', to='agro_management.sensor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha'], name='bloque_lecturas_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('sensor', 'fecha'), name='bloque_lecturas_sensor_fecha')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AgregadoSensor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularidad', models.CharField(choices=[('hora', 'Hora'), ('dia', 'Día')], max_length=10)),
+                ('inicio', models.DateTimeField()),
+                ('lecturas', models.IntegerField()),
+                ('minimo', models.FloatField()),
+                ('maximo', models.FloatField()),
+                ('suma', models.FloatField()),
+                ('sensor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='agregados', to='agro_management.sensor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularidad', 'inicio'], name='agregado_gran_inicio_idx')],
+                'constraints': [models.UniqueConstraint(fields=('sensor', 'granularidad', 'inicio'), name='agregado_sensor_unico')],
+            },
+        ),
+    ]
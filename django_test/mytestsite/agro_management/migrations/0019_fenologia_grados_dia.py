@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0018_sensores_campo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClimaDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('temperatura_minima', models.DecimalField(decimal_places=1, max_digits=4)),
+                ('temperatura_maxima', models.DecimalField(decimal_places=1, max_digits=4)),
+                ('precipitacion', models.DecimalField(blank=True, decimal_places=1, max_digits=6, null=True)),
+            ],
+            options={
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.AddField(
+            model_name='variedad',
+            name='temperatura_base',
+            field=models.DecimalField(decimal_places=1, default=10, max_digits=4),
+        ),
+        migrations.AddField(
+            model_name='variedad',
+            name='temperatura_maxima',
+            field=models.DecimalField(decimal_places=1, default=30, max_digits=4),
+        ),
+        migrations.CreateModel(
+            name='UmbralFenologico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('etapa', models.CharField(max_length=100)),
+                ('grados_dia', models.DecimalField(decimal_places=1, max_digits=7)),
+                ('es_cosecha', models.BooleanField(default=False)),
+                ('variedad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='umbrales_fenologicos', to='agro_management.variedad')),
+            ],
+            options={
+                'ordering': ['variedad', 'grados_dia'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PrediccionEtapa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_estimada', models.DateField(blank=True, null=True)),
+                ('fecha_observada', models.DateField(blank=True, null=True)),
+                ('grados_dia_acumulados', models.DecimalField(decimal_places=1, max_digits=7)),
+                ('fecha_calculo', models.DateTimeField()),
+                ('cultivo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='predicciones_etapa', to='agro_management.cultivo')),
+                ('umbral', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='predicciones', to='agro_management.umbralfenologico')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='umbralfenologico',
+            constraint=models.UniqueConstraint(fields=('variedad', 'etapa'), name='umbral_fenologico_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='prediccionetapa',
+            constraint=models.UniqueConstraint(fields=('cultivo', 'umbral'), name='prediccion_etapa_unica'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0019_fenologia_grados_dia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoEstado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('pedido', 'Pedido'), ('envio', 'Envío'), ('factura', 'Factura'), ('mantenimiento', 'Mantenimiento de maquinaria')], max_length=20)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('estado_anterior', models.CharField(max_length=20)),
+                ('estado_nuevo', models.CharField(max_length=20)),
+                ('fecha', models.DateTimeField()),
+                ('motivo', models.CharField(blank=True, max_length=255)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='eventos_estado', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['modelo', 'objeto_id'], name='evento_estado_objeto_idx'), models.Index(fields=['fecha'], name='evento_estado_fecha_idx')],
+            },
+        ),
+    ]
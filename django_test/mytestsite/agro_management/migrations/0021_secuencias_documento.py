@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0020_transiciones_estado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaDocumento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('siguiente', models.PositiveBigIntegerField(default=1)),
+            ],
+        ),
+    ]
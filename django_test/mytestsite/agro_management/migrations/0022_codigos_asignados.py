@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0021_secuencias_documento'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contrato',
+            name='codigo',
+            field=models.CharField(blank=True, max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='costooperativo',
+            name='codigo',
+            field=models.CharField(blank=True, max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='envio',
+            name='codigo',
+            field=models.CharField(blank=True, max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='factura',
+            name='numero',
+            field=models.CharField(blank=True, max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='mantenimientomaquinaria',
+            name='codigo',
+            field=models.CharField(blank=True, max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='pedido',
+            name='codigo',
+            field=models.CharField(blank=True, max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='productoterminado',
+            name='codigo',
+            field=models.CharField(blank=True, max_length=50, unique=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:05
+
+import secrets
+
+from django.db import migrations, models
+
+
+def generar_tokens(apps, schema_editor):
+    Sensor = apps.get_model('agro_management', 'Sensor')
+    sensores = list(Sensor.objects.filter(token__isnull=True))
+    for sensor in sensores:
+        sensor.token = secrets.token_hex(32)
+    Sensor.objects.bulk_update(sensores, ['token'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0022_codigos_asignados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensor',
+            name='token',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(generar_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='sensor',
+            name='token',
+            field=models.CharField(editable=False, max_length=64, unique=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0023_token_sensores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionATP',
+            fields=[
+                ('variedad', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='version_atp', serialize=False, to='agro_management.variedad')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
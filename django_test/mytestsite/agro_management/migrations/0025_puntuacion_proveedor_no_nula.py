@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0024_version_atp'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='indicadorproveedor',
+            name='puntuacion',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+    ]
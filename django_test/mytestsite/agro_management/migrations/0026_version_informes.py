@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 21:40
+
+from django.core.management import call_command
+from django.db import migrations, models
+
+
+def crear_tabla_cache(apps, schema_editor):
+    # Tabla de la caché 'informes' (DatabaseCache); no hace nada si ya existe
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0025_puntuacion_proveedor_no_nula'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionInforme',
+            fields=[
+                ('fuente', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(crear_tabla_cache, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agro_management', '0026_version_informes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='parcela',
+            name='fecha_ultima_utilizacion',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+import secrets
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 
 # Contexto Delimitado: Cultivo
 class Parcela(models.Model):
@@ -6,8 +10,25 @@ class Parcela(models.Model):
     nombre = models.CharField(max_length=100)
     superficie = models.DecimalField(max_digits=10, decimal_places=2)  # en hectáreas
     ubicacion = models.CharField(max_length=255)
-    fecha_ultima_utilizacion = models.DateField(null=True, blank=True)
+    fecha_ultima_utilizacion = models.DateField(null=True, blank=True)  # Registro manual; la efectiva la deriva parcelas.py
     potencial_productivo = models.CharField(max_length=50)
+    latitud = models.FloatField(null=True, blank=True)  # WGS84; centroide si hay geometría
+    longitud = models.FloatField(null=True, blank=True)
+    geometria = models.JSONField(null=True, blank=True)  # Geometría GeoJSON, coordenadas [lon, lat]
+    min_lon = models.FloatField(null=True, blank=True, editable=False)  # Caja envolvente derivada de la geometría
+    min_lat = models.FloatField(null=True, blank=True, editable=False)
+    max_lon = models.FloatField(null=True, blank=True, editable=False)
+    max_lat = models.FloatField(null=True, blank=True, editable=False)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['min_lon', 'min_lat'], name='parcela_caja_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        from .geometria import completar
+        completar(self)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
@@ -41,6 +62,9 @@ class Variedad(models.Model):
     tiempo_maduracion = models.IntegerField()  # en días
     resistencia_enfermedades = models.CharField(max_length=50)
     rendimiento_esperado = models.DecimalField(max_digits=8, decimal_places=2)  # por hectárea
+    # Umbrales de temperatura (°C) para los grados-día de crecimiento
+    temperatura_base = models.DecimalField(max_digits=4, decimal_places=1, default=10)
+    temperatura_maxima = models.DecimalField(max_digits=4, decimal_places=1, default=30)
     
     def __str__(self):
         return f"{self.tipo_cultivo} - {self.nombre}"
@@ -55,9 +79,66 @@ class Cultivo(models.Model):
     rendimiento_obtenido = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     observaciones = models.TextField(blank=True)
     
+    def clean(self):
+        # Rechazar cultivos que superen la superficie libre de la parcela en su periodo
+        from .parcelas import conflicto_de_area
+        errores = conflicto_de_area(self)
+        if errores:
+            raise ValidationError(errores)
+    
     def __str__(self):
         return f"{self.variedad} en {self.parcela} ({self.fecha_siembra})"
 
+class SegmentoOcupacion(models.Model):
+    parcela = models.ForeignKey(Parcela, on_delete=models.CASCADE, related_name='segmentos_ocupacion')
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField()  # exclusiva
+    area_ocupada = models.DecimalField(max_digits=10, decimal_places=2)  # en hectáreas
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['parcela', 'fecha_inicio'], name='segmento_parcela_inicio_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.parcela}: {self.area_ocupada} ha del {self.fecha_inicio} al {self.fecha_fin}"
+
+class PronosticoCosecha(models.Model):
+    cultivo = models.OneToOneField(Cultivo, on_delete=models.CASCADE, related_name='pronostico')
+    rendimiento_ha = models.DecimalField(max_digits=10, decimal_places=2)  # kg por hectárea
+    produccion_kg = models.DecimalField(max_digits=12, decimal_places=2)
+    produccion_minima_kg = models.DecimalField(max_digits=12, decimal_places=2)  # percentil 10 del error histórico
+    produccion_maxima_kg = models.DecimalField(max_digits=12, decimal_places=2)  # percentil 90 del error histórico
+    fecha_cosecha = models.DateField()
+    factor_variedad = models.DecimalField(max_digits=6, decimal_places=3)
+    factor_parcela = models.DecimalField(max_digits=6, decimal_places=3)
+    factor_suelo = models.DecimalField(max_digits=6, decimal_places=3)
+    fecha_calculo = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Pronóstico de {self.cultivo}: {self.produccion_kg} kg el {self.fecha_cosecha}"
+
+class ErrorPronostico(models.Model):
+    AMBITO_CHOICES = [
+        ('global', 'Global'),
+        ('variedad', 'Variedad'),
+        ('parcela', 'Parcela'),
+    ]
+    
+    ambito = models.CharField(max_length=20, choices=AMBITO_CHOICES)
+    variedad = models.ForeignKey(Variedad, on_delete=models.CASCADE, null=True, blank=True, related_name='errores_pronostico')
+    parcela = models.ForeignKey(Parcela, on_delete=models.CASCADE, null=True, blank=True, related_name='errores_pronostico')
+    observaciones = models.IntegerField()
+    error_medio = models.DecimalField(max_digits=7, decimal_places=4)  # (real - pronóstico) / pronóstico
+    desviacion = models.DecimalField(max_digits=7, decimal_places=4)
+    percentil_10 = models.DecimalField(max_digits=7, decimal_places=4)
+    percentil_90 = models.DecimalField(max_digits=7, decimal_places=4)
+    error_dias_medio = models.DecimalField(max_digits=7, decimal_places=2)  # días de la cosecha real respecto a la pronosticada
+    fecha_calculo = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Error de pronóstico ({self.ambito}): {self.error_medio}"
+
 class SistemaRiego(models.Model):
     nombre = models.CharField(max_length=100)
     tipo = models.CharField(max_length=50)  # Aspersión, Goteo, Gravedad, etc.
@@ -71,6 +152,23 @@ class FuenteAgua(models.Model):
     tipo = models.CharField(max_length=50)  # Pozo, Río, Reservorio, etc.
     ubicacion = models.CharField(max_length=255)
     capacidad = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)  # en m³
+    latitud = models.FloatField(null=True, blank=True)  # WGS84; centroide si hay geometría
+    longitud = models.FloatField(null=True, blank=True)
+    geometria = models.JSONField(null=True, blank=True)  # Geometría GeoJSON, coordenadas [lon, lat]
+    min_lon = models.FloatField(null=True, blank=True, editable=False)  # Caja envolvente derivada de la geometría
+    min_lat = models.FloatField(null=True, blank=True, editable=False)
+    max_lon = models.FloatField(null=True, blank=True, editable=False)
+    max_lat = models.FloatField(null=True, blank=True, editable=False)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['min_lon', 'min_lat'], name='fuente_agua_caja_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        from .geometria import completar
+        completar(self)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return self.nombre
@@ -87,6 +185,89 @@ class PlanRiego(models.Model):
     def __str__(self):
         return f"Plan de riego para {self.cultivo}"
 
+class Sensor(models.Model):
+    TIPO_CHOICES = [
+        ('humedad_suelo', 'Humedad del suelo'),  # % volumétrico
+        ('temperatura', 'Temperatura'),  # °C
+        ('precipitacion', 'Precipitación'),  # mm por lectura
+        ('humedad_relativa', 'Humedad relativa'),  # %
+    ]
+    
+    parcela = models.ForeignKey(Parcela, on_delete=models.CASCADE, related_name='sensores')
+    codigo = models.CharField(max_length=50, unique=True)
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    activo = models.BooleanField(default=True)
+    token = models.CharField(max_length=64, unique=True, editable=False)  # Credencial con la que el sensor envía lecturas
+    
+    def save(self, *args, **kwargs):
+        if not self.token:
+            self.token = secrets.token_hex(32)
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.codigo} ({self.get_tipo_display()}) en {self.parcela}"
+
+class BloqueLecturas(models.Model):
+    # Lecturas de un sensor en un día local, como columnas binarias paralelas
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='bloques', db_index=False)
+    fecha = models.DateField()
+    lecturas = models.IntegerField(default=0)
+    segundos = models.BinaryField()  # array('i'): segundos desde la medianoche local, ordenados
+    valores = models.BinaryField()  # array('d') alineado con segundos
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sensor', 'fecha'], name='bloque_lecturas_sensor_fecha'),
+        ]
+        indexes = [
+            models.Index(fields=['fecha'], name='bloque_lecturas_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.lecturas} lecturas de {self.sensor} el {self.fecha}"
+
+class AgregadoSensor(models.Model):
+    GRANULARIDAD_CHOICES = [
+        ('hora', 'Hora'),
+        ('dia', 'Día'),
+    ]
+    
+    sensor = models.ForeignKey(Sensor, on_delete=models.CASCADE, related_name='agregados', db_index=False)
+    granularidad = models.CharField(max_length=10, choices=GRANULARIDAD_CHOICES)
+    inicio = models.DateTimeField()
+    lecturas = models.IntegerField()
+    minimo = models.FloatField()
+    maximo = models.FloatField()
+    suma = models.FloatField()  # Con lecturas da la media
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sensor', 'granularidad', 'inicio'], name='agregado_sensor_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['granularidad', 'inicio'], name='agregado_gran_inicio_idx'),
+        ]
+    
+    @property
+    def media(self):
+        return self.suma / self.lecturas if self.lecturas else None
+    
+    def __str__(self):
+        return f"{self.sensor} {self.granularidad} {self.inicio}"
+
+class ClimaDiario(models.Model):
+    # Registro diario de la estación meteorológica de la finca
+    fecha = models.DateField(unique=True)
+    temperatura_minima = models.DecimalField(max_digits=4, decimal_places=1)  # °C
+    temperatura_maxima = models.DecimalField(max_digits=4, decimal_places=1)  # °C
+    precipitacion = models.DecimalField(max_digits=6, decimal_places=1, null=True, blank=True)  # mm
+    
+    class Meta:
+        ordering = ['-fecha']
+    
+    def __str__(self):
+        return f"Clima del {self.fecha}: {self.temperatura_minima}-{self.temperatura_maxima} °C"
+
 class PlanFertilizacion(models.Model):
     cultivo = models.ForeignKey(Cultivo, on_delete=models.CASCADE, related_name='planes_fertilizacion')
     nombre = models.CharField(max_length=100)
@@ -170,6 +351,38 @@ class EtapaFenologica(models.Model):
     def __str__(self):
         return f"{self.nombre} de {self.cultivo}"
 
+class UmbralFenologico(models.Model):
+    # Grados-día acumulados desde la siembra con los que la variedad alcanza una etapa
+    variedad = models.ForeignKey(Variedad, on_delete=models.CASCADE, related_name='umbrales_fenologicos')
+    etapa = models.CharField(max_length=100)  # Mismo nombre que EtapaFenologica
+    grados_dia = models.DecimalField(max_digits=7, decimal_places=1)
+    es_cosecha = models.BooleanField(default=False)  # Su fecha pasa a Cultivo.fecha_cosecha_estimada
+    
+    class Meta:
+        ordering = ['variedad', 'grados_dia']
+        constraints = [
+            models.UniqueConstraint(fields=['variedad', 'etapa'], name='umbral_fenologico_unico'),
+        ]
+    
+    def __str__(self):
+        return f"{self.etapa} de {self.variedad}: {self.grados_dia} GDD"
+
+class PrediccionEtapa(models.Model):
+    cultivo = models.ForeignKey(Cultivo, on_delete=models.CASCADE, related_name='predicciones_etapa')
+    umbral = models.ForeignKey(UmbralFenologico, on_delete=models.CASCADE, related_name='predicciones')
+    fecha_estimada = models.DateField(null=True, blank=True)  # Vacía si no se alcanza en el horizonte
+    fecha_observada = models.DateField(null=True, blank=True)  # fecha_inicio de la EtapaFenologica registrada
+    grados_dia_acumulados = models.DecimalField(max_digits=7, decimal_places=1)  # Hasta la fecha del cálculo
+    fecha_calculo = models.DateTimeField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cultivo', 'umbral'], name='prediccion_etapa_unica'),
+        ]
+    
+    def __str__(self):
+        return f"{self.umbral.etapa} de {self.cultivo}: {self.fecha_estimada}"
+
 class TipoLabor(models.Model):
     nombre = models.CharField(max_length=100)  # Arado, Siembra, Cosecha, etc.
     descripcion = models.TextField(blank=True)
@@ -185,6 +398,11 @@ class LaborAgricola(models.Model):
     personal_asignado = models.IntegerField()  # Número de trabajadores
     observaciones = models.TextField(blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['cultivo', 'fecha_realizacion'], name='labor_cultivo_fecha_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.tipo_labor} en {self.cultivo} el {self.fecha_realizacion}"
 
@@ -214,9 +432,15 @@ class LoteInsumo(models.Model):
     cantidad_inicial = models.DecimalField(max_digits=10, decimal_places=2)
     cantidad_actual = models.DecimalField(max_digits=10, decimal_places=2)
     costo_unitario = models.DecimalField(max_digits=10, decimal_places=2)
-    proveedor = models.CharField(max_length=100)  # Simplificado, podría ser una relación
+    proveedor = models.CharField(max_length=100)  # Nombre tal como figura en el documento del lote
+    proveedor_registrado = models.ForeignKey('Proveedor', on_delete=models.SET_NULL, null=True, blank=True, related_name='lotes')  # Resuelto desde el texto
     observaciones = models.TextField(blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['proveedor_registrado', 'fecha_adquisicion'], name='lote_proveedor_fecha_idx'),
+        ]
+    
     def __str__(self):
         return f"Lote {self.codigo_lote} de {self.insumo}"
 
@@ -300,7 +524,7 @@ class Presentacion(models.Model):
 
 class ProductoTerminado(models.Model):
     cultivo = models.ForeignKey(Cultivo, on_delete=models.CASCADE, related_name='productos')
-    codigo = models.CharField(max_length=50, unique=True)
+    codigo = models.CharField(max_length=50, unique=True, blank=True)  # Vacío: lo asigna secuencias.py al guardar
     lote_produccion = models.CharField(max_length=50)
     fecha_procesamiento = models.DateField()
     categoria_calidad = models.ForeignKey(CategoriaCalidad, on_delete=models.CASCADE)
@@ -322,6 +546,18 @@ class InventarioProducto(models.Model):
     def __str__(self):
         return f"Inventario de {self.producto}"
 
+class VersionATP(models.Model):
+    # Contador que atp.invalidar() incrementa; compartido por todos los procesos.
+    # Sin restricción de clave foránea: las señales de un borrado en cascada
+    # de la variedad aún lo incrementan, y una fila huérfana no estorba
+    variedad = models.OneToOneField(
+        Variedad, on_delete=models.DO_NOTHING, db_constraint=False, primary_key=True, related_name='version_atp',
+    )
+    version = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"ATP de {self.variedad_id} (versión {self.version})"
+
 class Pedido(models.Model):
     ESTADO_CHOICES = [
         ('pendiente', 'Pendiente'),
@@ -332,13 +568,28 @@ class Pedido(models.Model):
     ]
     
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='pedidos')
-    codigo = models.CharField(max_length=50, unique=True)
+    codigo = models.CharField(max_length=50, unique=True, blank=True)  # Vacío: lo asigna secuencias.py al guardar
     fecha_pedido = models.DateField()
     fecha_entrega_solicitada = models.DateField()
     direccion_entrega = models.CharField(max_length=255)
     canal_distribucion = models.ForeignKey(CanalDistribucion, on_delete=models.CASCADE)
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
     notas = models.TextField(blank=True)
+    ruta = models.ForeignKey('RutaEntrega', on_delete=models.SET_NULL, null=True, blank=True, related_name='pedidos')
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)  # Neto de sus líneas, mantenido por totales.py
+    lineas = models.IntegerField(default=0, editable=False)
+    peso_total = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)  # kg de sus líneas
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'fecha_entrega_solicitada'], name='pedido_estado_entrega_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            from .totales import CAMPOS_PEDIDO, campos_actualizables
+            kwargs['update_fields'] = campos_actualizables(self, CAMPOS_PEDIDO)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"Pedido {self.codigo} de {self.cliente}"
@@ -351,6 +602,11 @@ class DetallePedido(models.Model):
     subtotal = models.DecimalField(max_digits=12, decimal_places=2)
     descuento = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     
+    def save(self, *args, **kwargs):
+        # La señal post_save ajusta Pedido.total en la misma transacción
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"Detalle: {self.producto} en {self.pedido}"
 
@@ -397,7 +653,7 @@ class Envio(models.Model):
     ]
     
     pedidos = models.ManyToManyField(Pedido, related_name='envios')
-    codigo = models.CharField(max_length=50, unique=True)
+    codigo = models.CharField(max_length=50, unique=True, blank=True)  # Vacío: lo asigna secuencias.py al guardar
     vehiculo = models.ForeignKey(Vehiculo, on_delete=models.CASCADE)
     ruta = models.ForeignKey(RutaEntrega, on_delete=models.CASCADE)
     fecha_programada = models.DateField()
@@ -409,6 +665,25 @@ class Envio(models.Model):
     def __str__(self):
         return f"Envío {self.codigo} del {self.fecha_programada}"
 
+class ParadaEnvio(models.Model):
+    envio = models.ForeignKey(Envio, on_delete=models.CASCADE, related_name='paradas')
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='paradas')
+    orden = models.IntegerField()
+    distancia_acumulada = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)  # km desde el punto de partida
+    minutos_llegada = models.IntegerField(null=True, blank=True)  # minutos desde la salida; vacío si la dirección no está en la matriz
+    llegada_estimada = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['envio', 'pedido'], name='parada_envio_pedido_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['envio', 'orden'], name='parada_envio_orden_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Parada {self.orden} de {self.envio}: {self.pedido}"
+
 class DocumentoEnvio(models.Model):
     TIPO_CHOICES = [
         ('guia_remision', 'Guía de Remisión'),
@@ -433,13 +708,34 @@ class Factura(models.Model):
     ]
     
     pedido = models.OneToOneField(Pedido, on_delete=models.CASCADE, related_name='factura')
-    numero = models.CharField(max_length=50, unique=True)
+    numero = models.CharField(max_length=50, unique=True, blank=True)  # Vacío: lo asigna secuencias.py al guardar
     fecha_emision = models.DateField()
     fecha_vencimiento = models.DateField()
     subtotal = models.DecimalField(max_digits=12, decimal_places=2)
     impuestos = models.DecimalField(max_digits=12, decimal_places=2)
     total = models.DecimalField(max_digits=12, decimal_places=2)
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='emitida')
+    pagado = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)  # Suma de sus pagos, mantenida por totales.py
+    saldo = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)  # total - pagado
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'fecha_vencimiento'], name='factura_estado_vencimiento_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.saldo = self.total - self.pagado
+            return super().save(*args, **kwargs)
+        from .totales import CAMPOS_FACTURA, campos_actualizables
+        if kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = campos_actualizables(self, CAMPOS_FACTURA)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if 'total' in kwargs['update_fields']:
+                from .totales import actualizar_estados
+                Factura.objects.filter(pk=self.pk).update(saldo=models.F('total') - models.F('pagado'))
+                actualizar_estados([self.pk])
     
     def __str__(self):
         return f"Factura {self.numero} ({self.estado})"
@@ -452,9 +748,36 @@ class Pago(models.Model):
     referencia = models.CharField(max_length=100, blank=True)  # Nº de transferencia, cheque, etc.
     notas = models.TextField(blank=True)
     
+    def save(self, *args, **kwargs):
+        # La señal post_save ajusta Factura.pagado en la misma transacción
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"Pago de {self.monto} a {self.factura}"
 
+class SaldoClienteHistorico(models.Model):
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='saldos_historicos')
+    fecha = models.DateField()
+    facturas = models.IntegerField(default=0)  # Facturas con saldo pendiente
+    por_vencer = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    vencido_0_30 = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # Días desde fecha_vencimiento
+    vencido_31_60 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    vencido_61_90 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    vencido_90_mas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    saldo_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cliente', 'fecha'], name='saldo_cliente_fecha_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['fecha'], name='saldo_historico_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Saldo de {self.cliente} al {self.fecha}: {self.saldo_total}"
+
 class Devolucion(models.Model):
     MOTIVO_CHOICES = [
         ('calidad', 'Problemas de Calidad'),
@@ -491,6 +814,38 @@ class DetalleDevolucion(models.Model):
     def __str__(self):
         return f"Detalle devolución: {self.cantidad} de {self.detalle_pedido.producto}"
 
+class EventoEstado(models.Model):
+    MODELO_CHOICES = [
+        ('pedido', 'Pedido'),
+        ('envio', 'Envío'),
+        ('factura', 'Factura'),
+        ('mantenimiento', 'Mantenimiento de maquinaria'),
+    ]
+    
+    modelo = models.CharField(max_length=20, choices=MODELO_CHOICES)
+    objeto_id = models.PositiveBigIntegerField()
+    estado_anterior = models.CharField(max_length=20)
+    estado_nuevo = models.CharField(max_length=20)
+    fecha = models.DateTimeField()
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='eventos_estado')
+    motivo = models.CharField(max_length=255, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['modelo', 'objeto_id'], name='evento_estado_objeto_idx'),
+            models.Index(fields=['fecha'], name='evento_estado_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_modelo_display()} {self.objeto_id}: {self.estado_anterior} → {self.estado_nuevo}"
+
+class SecuenciaDocumento(models.Model):
+    nombre = models.CharField(max_length=50, unique=True)  # p. ej. 'factura'
+    siguiente = models.PositiveBigIntegerField(default=1)  # Primer número aún no reservado
+    
+    def __str__(self):
+        return f"Secuencia {self.nombre} (siguiente {self.siguiente})"
+
 # Contexto Delimitado: Gestión de Recursos
 class Cargo(models.Model):
     nombre = models.CharField(max_length=100)
@@ -568,6 +923,44 @@ class CapacitacionTrabajador(models.Model):
     def __str__(self):
         return f"{self.trabajador} - {self.capacitacion}"
 
+class RequisitoCapacitacion(models.Model):
+    capacitacion = models.ForeignKey(Capacitacion, on_delete=models.CASCADE, related_name='requisitos')
+    cargo = models.ForeignKey(Cargo, on_delete=models.CASCADE, null=True, blank=True, related_name='capacitaciones_requeridas')
+    habilidad = models.ForeignKey(Habilidad, on_delete=models.CASCADE, null=True, blank=True, related_name='capacitaciones_requeridas')
+    vigencia_dias = models.IntegerField(null=True, blank=True)  # validez tras completarla; vacío = no vence
+    
+    def clean(self):
+        if (self.cargo_id is None) == (self.habilidad_id is None):
+            raise ValidationError("Indique un cargo o una habilidad, pero no ambos.")
+    
+    def __str__(self):
+        return f"{self.capacitacion} requerida para {self.cargo or self.habilidad}"
+
+class EstadoCapacitacion(models.Model):
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('programada', 'Programada'),
+        ('en_curso', 'En Curso'),
+        ('completada', 'Completada'),
+    ]
+    
+    trabajador = models.ForeignKey(Trabajador, on_delete=models.CASCADE, related_name='estado_capacitaciones')
+    capacitacion = models.ForeignKey(Capacitacion, on_delete=models.CASCADE, related_name='estados')
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    fecha_completada = models.DateField(null=True, blank=True)
+    fecha_vencimiento = models.DateField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['trabajador', 'capacitacion'], name='estado_capacitacion_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'fecha_vencimiento'], name='estado_capacitacion_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.trabajador} - {self.capacitacion}: {self.get_estado_display()}"
+
 class Contrato(models.Model):
     TIPO_CHOICES = [
         ('indefinido', 'Indefinido'),
@@ -577,7 +970,7 @@ class Contrato(models.Model):
     ]
     
     trabajador = models.ForeignKey(Trabajador, on_delete=models.CASCADE, related_name='contratos')
-    codigo = models.CharField(max_length=50, unique=True)
+    codigo = models.CharField(max_length=50, unique=True, blank=True)  # Vacío: lo asigna secuencias.py al guardar
     tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
     fecha_inicio = models.DateField()
     fecha_fin = models.DateField(null=True, blank=True)
@@ -589,6 +982,14 @@ class Contrato(models.Model):
     def __str__(self):
         return f"Contrato {self.codigo} de {self.trabajador}"
 
+class RequisitoLabor(models.Model):
+    tipo_labor = models.ForeignKey(TipoLabor, on_delete=models.CASCADE, related_name='requisitos')
+    habilidad = models.ForeignKey(Habilidad, on_delete=models.CASCADE)
+    nivel_minimo = models.CharField(max_length=20, choices=HabilidadTrabajador.NIVEL_CHOICES, default='basico')
+    
+    def __str__(self):
+        return f"{self.tipo_labor} requiere {self.habilidad} ({self.nivel_minimo})"
+
 class AsignacionLabor(models.Model):
     trabajador = models.ForeignKey(Trabajador, on_delete=models.CASCADE, related_name='asignaciones')
     labor = models.ForeignKey(LaborAgricola, on_delete=models.CASCADE, related_name='asignaciones')
@@ -598,6 +999,40 @@ class AsignacionLabor(models.Model):
     def __str__(self):
         return f"{self.trabajador} asignado a {self.labor}"
 
+class PeriodoNomina(models.Model):
+    ESTADO_CHOICES = [
+        ('abierto', 'Abierto'),
+        ('calculado', 'Calculado'),
+        ('cerrado', 'Cerrado'),
+    ]
+    
+    codigo = models.CharField(max_length=50, unique=True)
+    fecha_inicio = models.DateField()
+    fecha_fin = models.DateField()
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='abierto')
+    fecha_calculo = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Nómina {self.codigo} ({self.fecha_inicio} a {self.fecha_fin})"
+
+class LineaNomina(models.Model):
+    periodo = models.ForeignKey(PeriodoNomina, on_delete=models.CASCADE, related_name='lineas')
+    trabajador = models.ForeignKey(Trabajador, on_delete=models.CASCADE, related_name='lineas_nomina')
+    contrato = models.ForeignKey(Contrato, on_delete=models.SET_NULL, null=True, blank=True)
+    salario_base = models.DecimalField(max_digits=12, decimal_places=2)  # prorrateado al periodo
+    horas_trabajadas = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    horas_extra = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    pago_horas_extra = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_bruto = models.DecimalField(max_digits=12, decimal_places=2)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['periodo', 'trabajador'], name='linea_nomina_unica'),
+        ]
+    
+    def __str__(self):
+        return f"{self.trabajador} en {self.periodo}: {self.total_bruto}"
+
 class CategoriaMaquinaria(models.Model):
     nombre = models.CharField(max_length=100)  # Tractor, Cosechadora, Sistema de Riego, etc.
     descripcion = models.TextField(blank=True)
@@ -614,7 +1049,7 @@ class Maquinaria(models.Model):
     año_fabricacion = models.IntegerField()
     capacidad = models.CharField(max_length=100)
     potencia = models.CharField(max_length=50, blank=True)
-    horas_uso = models.IntegerField(default=0)
+    horas_uso = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # acumuladas desde UsoMaquinaria
     estado = models.CharField(max_length=50)  # Operativa, Mantenimiento, Fuera de servicio
     ubicacion_actual = models.CharField(max_length=255)
     valor_adquisicion = models.DecimalField(max_digits=12, decimal_places=2)
@@ -623,6 +1058,17 @@ class Maquinaria(models.Model):
     def __str__(self):
         return f"{self.codigo} - {self.marca} {self.modelo}"
 
+class ReglaMantenimiento(models.Model):
+    categoria = models.ForeignKey(CategoriaMaquinaria, on_delete=models.CASCADE, related_name='reglas_mantenimiento')
+    nombre = models.CharField(max_length=100)  # Cambio de aceite, Revisión general, etc.
+    descripcion = models.TextField(blank=True)
+    intervalo_horas = models.DecimalField(max_digits=8, decimal_places=2)  # horas de uso entre servicios
+    intervalo_dias = models.IntegerField(null=True, blank=True)  # días máximos entre servicios
+    activa = models.BooleanField(default=True)
+    
+    def __str__(self):
+        return f"{self.nombre} ({self.categoria}) cada {self.intervalo_horas} h"
+
 class MantenimientoMaquinaria(models.Model):
     TIPO_CHOICES = [
         ('preventivo', 'Preventivo'),
@@ -637,7 +1083,7 @@ class MantenimientoMaquinaria(models.Model):
     ]
     
     maquinaria = models.ForeignKey(Maquinaria, on_delete=models.CASCADE, related_name='mantenimientos')
-    codigo = models.CharField(max_length=50, unique=True)
+    codigo = models.CharField(max_length=50, unique=True, blank=True)  # Vacío: lo asigna secuencias.py al guardar
     tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
     descripcion = models.TextField()
     fecha_programada = models.DateField()
@@ -649,6 +1095,8 @@ class MantenimientoMaquinaria(models.Model):
     responsable = models.ForeignKey(Trabajador, on_delete=models.SET_NULL, null=True, blank=True)
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='programado')
     observaciones = models.TextField(blank=True)
+    regla = models.ForeignKey(ReglaMantenimiento, on_delete=models.SET_NULL, null=True, blank=True, related_name='mantenimientos')
+    horas_maquina = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # horómetro al programar
     
     def __str__(self):
         return f"{self.tipo} {self.codigo} para {self.maquinaria}"
@@ -662,9 +1110,127 @@ class UsoMaquinaria(models.Model):
     combustible_consumido = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)  # en litros
     observaciones = models.TextField(blank=True)
     
+    def clean(self):
+        # Rechazar reservas que excedan las horas diarias de la máquina o del operador
+        from .ocupacion import conflictos_de_uso
+        errores = conflictos_de_uso(self)
+        if errores:
+            raise ValidationError(errores)
+    
     def __str__(self):
         return f"{self.maquinaria} en {self.labor}"
 
+class OcupacionRecurso(models.Model):
+    TIPO_CHOICES = [
+        ('maquinaria', 'Maquinaria'),
+        ('operador', 'Operador'),
+    ]
+    
+    tipo_recurso = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    recurso_id = models.PositiveBigIntegerField()  # id de Maquinaria o Trabajador
+    fecha = models.DateField()
+    horas = models.DecimalField(max_digits=6, decimal_places=2, default=0)  # horas reservadas ese día
+    conflicto = models.BooleanField(default=False)  # supera el máximo de horas diarias
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tipo_recurso', 'recurso_id', 'fecha'], name='ocupacion_recurso_dia_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['tipo_recurso', 'fecha', 'horas'], name='ocupacion_fecha_horas_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_tipo_recurso_display()} {self.recurso_id} el {self.fecha}: {self.horas} h"
+
+class DispositivoTelemetria(models.Model):
+    TIPO_CHOICES = [
+        ('gps', 'GPS'),
+        ('horometro', 'Horómetro'),
+    ]
+    
+    codigo = models.CharField(max_length=50, unique=True)
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    vehiculo = models.ForeignKey(Vehiculo, on_delete=models.CASCADE, null=True, blank=True, related_name='dispositivos')
+    maquinaria = models.ForeignKey(Maquinaria, on_delete=models.CASCADE, null=True, blank=True, related_name='dispositivos')
+    token = models.CharField(max_length=64, unique=True, editable=False)  # Credencial con la que el equipo envía lecturas
+    activo = models.BooleanField(default=True)
+    
+    def clean(self):
+        if bool(self.vehiculo_id) == bool(self.maquinaria_id):
+            raise ValidationError("Indique un vehículo o una máquina, no ambos")
+    
+    def save(self, *args, **kwargs):
+        if not self.token:
+            self.token = secrets.token_hex(32)
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"{self.codigo} ({self.get_tipo_display()})"
+
+class LecturaTelemetria(models.Model):
+    # Solo se insertan; la retención borra por momento
+    dispositivo = models.ForeignKey(DispositivoTelemetria, on_delete=models.CASCADE, related_name='lecturas', db_index=False)
+    momento = models.DateTimeField()
+    latitud = models.FloatField(null=True, blank=True)
+    longitud = models.FloatField(null=True, blank=True)
+    velocidad = models.FloatField(null=True, blank=True)  # km/h
+    horas_motor = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # lectura del horómetro
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['dispositivo', 'momento'], name='lectura_disp_momento_idx'),
+            models.Index(fields=['momento'], name='lectura_momento_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Lectura de {self.dispositivo} el {self.momento}"
+
+class ResumenTelemetria(models.Model):
+    GRANULARIDAD_CHOICES = [
+        ('minuto', 'Minuto'),
+        ('hora', 'Hora'),
+    ]
+    
+    dispositivo = models.ForeignKey(DispositivoTelemetria, on_delete=models.CASCADE, related_name='resumenes', db_index=False)
+    granularidad = models.CharField(max_length=10, choices=GRANULARIDAD_CHOICES)
+    inicio = models.DateTimeField()
+    lecturas = models.IntegerField(default=0)
+    suma_velocidad = models.FloatField(default=0)  # Con lecturas da la velocidad media
+    lecturas_velocidad = models.IntegerField(default=0)
+    velocidad_maxima = models.FloatField(null=True, blank=True)
+    horas_motor_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    horas_motor_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    ultimo_momento = models.DateTimeField()
+    latitud = models.FloatField(null=True, blank=True)  # Última posición del intervalo
+    longitud = models.FloatField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dispositivo', 'granularidad', 'inicio'], name='resumen_telemetria_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['granularidad', 'inicio'], name='resumen_gran_inicio_idx'),
+        ]
+    
+    @property
+    def velocidad_media(self):
+        return self.suma_velocidad / self.lecturas_velocidad if self.lecturas_velocidad else None
+    
+    def __str__(self):
+        return f"{self.dispositivo} {self.granularidad} {self.inicio}"
+
+class EstadoDispositivo(models.Model):
+    dispositivo = models.OneToOneField(DispositivoTelemetria, on_delete=models.CASCADE, primary_key=True, related_name='estado')
+    momento = models.DateTimeField()
+    latitud = models.FloatField(null=True, blank=True)
+    longitud = models.FloatField(null=True, blank=True)
+    velocidad = models.FloatField(null=True, blank=True)
+    horas_motor = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    
+    def __str__(self):
+        return f"Estado de {self.dispositivo} al {self.momento}"
+
 class TipoCosto(models.Model):
     nombre = models.CharField(max_length=100)
     categoria = models.CharField(max_length=50)  # Insumo, Mano de Obra, Maquinaria, Otros
@@ -674,7 +1240,7 @@ class TipoCosto(models.Model):
         return f"{self.nombre} ({self.categoria})"
 
 class CostoOperativo(models.Model):
-    codigo = models.CharField(max_length=50, unique=True)
+    codigo = models.CharField(max_length=50, unique=True, blank=True)  # Vacío: lo asigna secuencias.py al guardar
     tipo = models.ForeignKey(TipoCosto, on_delete=models.CASCADE)
     descripcion = models.TextField()
     fecha = models.DateField()
@@ -728,6 +1294,15 @@ class InformeFinanciero(models.Model):
     def __str__(self):
         return f"{self.codigo} - {self.titulo}"
 
+class VersionInforme(models.Model):
+    # Contador que informes.invalidar() incrementa por fuente de datos (costos,
+    # ventas, pagos, presupuesto); forma parte de la clave de caché de las secciones
+    fuente = models.CharField(max_length=20, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Informes de {self.fuente} (versión {self.version})"
+
 class AnalisisRentabilidad(models.Model):
     cultivo = models.ForeignKey(Cultivo, on_delete=models.CASCADE, related_name='analisis_rentabilidad')
     fecha_analisis = models.DateField()
@@ -756,6 +1331,32 @@ class Proveedor(models.Model):
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
 
+class CoincidenciaProveedor(models.Model):
+    METODO_CHOICES = [
+        ('ruc', 'RUC'),
+        ('exacto', 'Nombre exacto'),
+        ('difuso', 'Nombre aproximado'),
+        ('manual', 'Manual'),
+    ]
+    
+    ESTADO_CHOICES = [
+        ('propuesta', 'Propuesta'),
+        ('confirmada', 'Confirmada'),
+        ('rechazada', 'Rechazada'),
+        ('sin_coincidencia', 'Sin Coincidencia'),
+    ]
+    
+    texto = models.CharField(max_length=100, unique=True)  # Valor de LoteInsumo.proveedor
+    texto_normalizado = models.CharField(max_length=100, db_index=True)
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE, null=True, blank=True, related_name='coincidencias')
+    puntuacion = models.DecimalField(max_digits=4, decimal_places=3, default=0)  # De 0 a 1
+    metodo = models.CharField(max_length=20, choices=METODO_CHOICES, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='propuesta')
+    fecha_revision = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"'{self.texto}' -> {self.proveedor or 'sin proveedor'} ({self.get_estado_display()})"
+
 class ContactoProveedor(models.Model):
     proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE, related_name='contactos')
     nombre = models.CharField(max_length=100)
@@ -793,9 +1394,39 @@ class EvaluacionProveedor(models.Model):
     puntualidad_entregas = models.IntegerField()  # De 1 a 10
     precio_competitividad = models.IntegerField()  # De 1 a 10
     servicio_atencion = models.IntegerField()  # De 1 a 10
-    puntuacion_total = models.IntegerField()
+    puntuacion_total = models.IntegerField(editable=False)  # Media ponderada de 0 a 100, calculada al guardar
     comentarios = models.TextField(blank=True)
     evaluador = models.CharField(max_length=100)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['proveedor', 'fecha'], name='evaluacion_proveedor_fecha_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        from .proveedores import puntuacion_ponderada
+        self.puntuacion_total = puntuacion_ponderada(self)
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"Evaluación de {self.proveedor} el {self.fecha}"
+
+class IndicadorProveedor(models.Model):
+    proveedor = models.OneToOneField(Proveedor, on_delete=models.CASCADE, related_name='indicador')
+    evaluaciones_90 = models.IntegerField(default=0)
+    promedio_90 = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # de 0 a 100
+    evaluaciones_365 = models.IntegerField(default=0)
+    promedio_365 = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # de 0 a 100
+    lotes_365 = models.IntegerField(default=0)
+    tasa_caducidad = models.DecimalField(max_digits=5, decimal_places=4, default=0)  # lotes caducados con saldo / lotes
+    tasa_consumo = models.DecimalField(max_digits=5, decimal_places=4, default=0)  # cantidad consumida / comprada
+    puntuacion = models.DecimalField(max_digits=5, decimal_places=2, default=0)  # compuesta, de 0 a 100; 0 sin evaluaciones
+    fecha_calculo = models.DateTimeField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-puntuacion'], name='indicador_proveedor_rank_idx'),
+        ]
+    
     def __str__(self):
-        return f"Evaluación de {self.proveedor} el {self.fecha}"
\ No newline at end of file
+        return f"Indicador de {self.proveedor}: {self.puntuacion}"
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+Cálculo de nómina por periodo a partir de Contrato y AsignacionLabor.
+
+Los datos se leen en pocas consultas masivas (contratos vigentes, horas por
+trabajador y horas por trabajador y cultivo) y se cargan en columnas
+alineadas por índice de trabajador. El bruto, las horas extra y el costo de
+mano de obra por cultivo se calculan columna a columna sobre esas listas, sin
+consultas por trabajador, y el resultado se escribe con bulk_create.
+"""
+
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from . import informes
+from .models import (
+    AsignacionLabor, Contrato, CostoOperativo, LineaNomina, TipoCosto, Trabajador,
+)
+
+CERO = Decimal('0')
+CENTIMO = Decimal('0.01')
+
+# Días de un mes comercial para prorratear salarios mensuales
+DIAS_MES = 30
+
+
+def _redondear(valor):
+    return valor.quantize(CENTIMO, rounding=ROUND_HALF_UP)
+
+
+def prefijo_costos(periodo):
+    """Prefijo de los códigos de CostoOperativo generados por un periodo."""
+    return f"NOM-{periodo.codigo}-"
+
+
+def _dias_solapados(inicio, fin, desde, hasta):
+    return max((min(fin, hasta or fin) - max(inicio, desde)).days + 1, 0)
+
+
+@transaction.atomic
+def calcular_nomina(periodo, batch_size=1000):
+    """
+    Calcula las líneas de nómina del periodo y los costos de mano de obra
+    por cultivo. Sustituye cualquier cálculo anterior del mismo periodo.
+    Devuelve el número de líneas creadas.
+    """
+    if periodo.estado == 'cerrado':
+        raise ValueError(f"El periodo {periodo.codigo} está cerrado y no puede recalcularse")
+
+    horas_mes = Decimal(getattr(settings, 'NOMINA_HORAS_MES', 240))
+    horas_semana = Decimal(getattr(settings, 'NOMINA_HORAS_ORDINARIAS_SEMANA', 48))
+    factor_extra = Decimal(str(getattr(settings, 'NOMINA_FACTOR_HORA_EXTRA', '1.25')))
+
+    inicio, fin = periodo.fecha_inicio, periodo.fecha_fin
+    dias_periodo = (fin - inicio).days + 1
+    horas_ordinarias = horas_semana * dias_periodo / 7
+
+    # Trabajadores activos y salario base de su cargo
+    ids = []
+    salario_cargo = []
+    for trabajador_id, salario_base in (
+            Trabajador.objects.filter(estado__iexact='activo')
+            .values_list('pk', 'cargo__salario_base').order_by('pk')):
+        ids.append(trabajador_id)
+        salario_cargo.append(salario_base)
+    indice = {trabajador_id: i for i, trabajador_id in enumerate(ids)}
+    n = len(ids)
+
+    # Salario prorrateado según los contratos vigentes en el periodo y salario
+    # mensual del último de ellos (o del cargo, sin contrato)
+    salario = [None] * n
+    mensual = list(salario_cargo)
+    contrato = [None] * n
+    for trabajador_id, contrato_id, monto, desde, hasta in (
+            Contrato.objects
+            .filter(trabajador_id__in=indice, fecha_inicio__lte=fin)
+            .filter(Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=inicio))
+            .values_list('trabajador_id', 'pk', 'salario', 'fecha_inicio', 'fecha_fin')
+            .order_by('fecha_inicio')):
+        i = indice[trabajador_id]
+        dias = _dias_solapados(inicio, fin, desde, hasta)
+        if dias_periodo <= 31:
+            dias = min(dias, DIAS_MES)
+        salario[i] = (salario[i] or CERO) + monto * dias / DIAS_MES
+        mensual[i] = monto
+        contrato[i] = contrato_id
+    dias_base = min(dias_periodo, DIAS_MES) if dias_periodo <= 31 else dias_periodo
+    salario = [
+        s if s is not None else base * dias_base / DIAS_MES
+        for s, base in zip(salario, salario_cargo)
+    ]
+    # La tarifa horaria sale del salario mensual, no del prorrateado: quien
+    # entra o sale a mitad del periodo cobra sus horas extra a la misma tarifa
+    tarifa = [(m or CERO) / horas_mes for m in mensual]
+
+    # Horas trabajadas por trabajador y por trabajador y cultivo
+    asignaciones = AsignacionLabor.objects.filter(
+        trabajador_id__in=indice, labor__fecha_realizacion__range=(inicio, fin),
+    )
+    horas = [CERO] * n
+    for trabajador_id, total in asignaciones.values_list('trabajador_id').annotate(
+            total=Sum('horas_asignadas')).order_by():
+        horas[indice[trabajador_id]] = total
+    horas_cultivo = defaultdict(list)
+    for trabajador_id, cultivo_id, total in asignaciones.values_list(
+            'trabajador_id', 'labor__cultivo_id').annotate(total=Sum('horas_asignadas')).order_by():
+        horas_cultivo[cultivo_id].append((indice[trabajador_id], total))
+
+    extra = [max(h - horas_ordinarias, CERO) for h in horas]
+    pago_extra = [_redondear(e * t * factor_extra) for e, t in zip(extra, tarifa)]
+    bruto = [_redondear(s) + p for s, p in zip(salario, pago_extra)]
+
+    LineaNomina.objects.filter(periodo=periodo).delete()
+    LineaNomina.objects.bulk_create([
+        LineaNomina(
+            periodo=periodo,
+            trabajador_id=ids[i],
+            contrato_id=contrato[i],
+            salario_base=_redondear(salario[i]),
+            horas_trabajadas=horas[i],
+            horas_extra=_redondear(extra[i]),
+            pago_horas_extra=pago_extra[i],
+            total_bruto=bruto[i],
+        )
+        for i in range(n)
+    ], batch_size=batch_size)
+
+    # El bruto de cada trabajador se reparte entre cultivos según sus horas
+    tipo_costo, _ = TipoCosto.objects.get_or_create(
+        nombre='Nómina', categoria='Mano de Obra',
+        defaults={'descripcion': 'Costo de mano de obra calculado desde la nómina'},
+    )
+    prefijo = prefijo_costos(periodo)
+    CostoOperativo.objects.filter(codigo__startswith=prefijo).delete()
+    costos = []
+    for cultivo_id, filas in horas_cultivo.items():
+        monto = sum((bruto[i] * h / horas[i] for i, h in filas if horas[i]), CERO)
+        costos.append(CostoOperativo(
+            codigo=f"{prefijo}{cultivo_id}",
+            tipo=tipo_costo,
+            descripcion=f"Mano de obra de la nómina {periodo.codigo}",
+            fecha=fin,
+            monto=_redondear(monto),
+            cultivo_id=cultivo_id,
+        ))
+    CostoOperativo.objects.bulk_create(costos, batch_size=batch_size)
+    informes.invalidar(['costos'])
+
+    periodo.estado = 'calculado'
+    periodo.fecha_calculo = timezone.now()
+    periodo.save(update_fields=['estado', 'fecha_calculo'])
+    return n
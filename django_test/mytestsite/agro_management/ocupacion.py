@@ -0,0 +1,152 @@
+"""
+Calendario de ocupación de maquinaria y operadores.
+
+OcupacionRecurso guarda una fila por recurso y día con las horas reservadas
+en UsoMaquinaria. La fila se mantiene al escribir los usos, y la restricción
+única (tipo_recurso, recurso_id, fecha) sirve de índice: comprobar un
+conflicto o la disponibilidad de un recurso es una búsqueda indexada en lugar
+de recorrer todos los usos del día.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Sum, Value, When
+
+from .models import Maquinaria, OcupacionRecurso, UsoMaquinaria
+
+CERO = Decimal('0')
+
+
+def horas_maximas():
+    return Decimal(getattr(settings, 'OCUPACION_HORAS_MAXIMAS_DIA', 24))
+
+
+def _claves_de_uso(maquinaria_id, operador_id, fecha):
+    claves = [('maquinaria', maquinaria_id, fecha)]
+    if operador_id:
+        claves.append(('operador', operador_id, fecha))
+    return claves
+
+
+def cambios_por_uso(uso, anterior=None, signo=1):
+    """Deltas de horas por (tipo_recurso, recurso_id, fecha) de un uso."""
+    cambios = defaultdict(lambda: CERO)
+    if anterior:
+        for clave in _claves_de_uso(anterior['maquinaria_id'], anterior['operador_id'], anterior['fecha_uso']):
+            cambios[clave] -= anterior['horas_uso']
+    for clave in _claves_de_uso(uso.maquinaria_id, uso.operador_id, uso.fecha_uso):
+        cambios[clave] += signo * Decimal(uso.horas_uso)
+    return cambios
+
+
+def aplicar_cambios(cambios):
+    """
+    Suma los deltas a las filas de ocupación, creando las que falten.
+
+    El incremento y la marca de conflicto se calculan en la misma sentencia
+    UPDATE a partir del valor previo, de modo que dos escrituras simultáneas
+    no se pisan.
+    """
+    limite = horas_maximas()
+    for (tipo, recurso_id, fecha), delta in cambios.items():
+        if not delta:
+            continue
+        filtro = OcupacionRecurso.objects.filter(tipo_recurso=tipo, recurso_id=recurso_id, fecha=fecha)
+        valores = {
+            'horas': F('horas') + delta,
+            'conflicto': Case(When(horas__gt=limite - delta, then=Value(True)), default=Value(False)),
+        }
+        if filtro.update(**valores) or delta < 0:
+            continue
+        try:
+            with transaction.atomic():
+                OcupacionRecurso.objects.create(
+                    tipo_recurso=tipo, recurso_id=recurso_id, fecha=fecha,
+                    horas=delta, conflicto=delta > limite,
+                )
+        except IntegrityError:
+            # Otra escritura creó la fila entre el UPDATE y el INSERT
+            filtro.update(**valores)
+
+
+def horas_ocupadas(tipo, recurso_id, fecha):
+    """Horas ya reservadas de un recurso en un día (búsqueda por índice único)."""
+    return (
+        OcupacionRecurso.objects
+        .filter(tipo_recurso=tipo, recurso_id=recurso_id, fecha=fecha)
+        .values_list('horas', flat=True)
+        .first()
+    ) or CERO
+
+
+def conflictos_de_uso(uso):
+    """
+    Devuelve un diccionario campo -> mensaje si el uso excede las horas
+    diarias de su máquina o de su operador; vacío si no hay conflicto.
+    """
+    if uso.fecha_uso is None or uso.horas_uso is None or uso.maquinaria_id is None:
+        return {}
+    anterior = None
+    if uso.pk:
+        anterior = (
+            UsoMaquinaria.objects
+            .filter(pk=uso.pk)
+            .values('maquinaria_id', 'operador_id', 'fecha_uso', 'horas_uso')
+            .first()
+        )
+    limite = horas_maximas()
+    errores = {}
+    for tipo, recurso_id, fecha in _claves_de_uso(uso.maquinaria_id, uso.operador_id, uso.fecha_uso):
+        ocupadas = horas_ocupadas(tipo, recurso_id, fecha)
+        if anterior and (tipo, recurso_id, fecha) in _claves_de_uso(
+                anterior['maquinaria_id'], anterior['operador_id'], anterior['fecha_uso']):
+            ocupadas -= anterior['horas_uso']
+        if ocupadas + Decimal(uso.horas_uso) > limite:
+            campo = 'maquinaria' if tipo == 'maquinaria' else 'operador'
+            errores[campo] = (
+                f"Ya tiene {ocupadas} h reservadas el {fecha}; "
+                f"con {uso.horas_uso} h más supera el máximo de {limite} h."
+            )
+    return errores
+
+
+def maquinas_libres(fecha, horas):
+    """Máquinas de la flota con al menos `horas` libres en la fecha indicada."""
+    ocupadas = OcupacionRecurso.objects.filter(
+        tipo_recurso='maquinaria', fecha=fecha, horas__gt=horas_maximas() - Decimal(horas),
+    ).values('recurso_id')
+    return (
+        Maquinaria.objects
+        .exclude(pk__in=ocupadas)
+        .exclude(estado__iexact='fuera de servicio')
+    )
+
+
+def conflictos(fecha_inicio, fecha_fin, tipo=None):
+    """Filas de ocupación marcadas como conflicto en el rango de fechas."""
+    filas = OcupacionRecurso.objects.filter(conflicto=True, fecha__range=(fecha_inicio, fecha_fin))
+    if tipo:
+        filas = filas.filter(tipo_recurso=tipo)
+    return filas.order_by('fecha', 'tipo_recurso', 'recurso_id')
+
+
+@transaction.atomic
+def reconstruir_ocupacion(batch_size=1000):
+    """Reconstruye toda la tabla de ocupación a partir de UsoMaquinaria."""
+    limite = horas_maximas()
+    OcupacionRecurso.objects.all().delete()
+    grupos = [
+        ('maquinaria', UsoMaquinaria.objects.values_list('maquinaria_id', 'fecha_uso')),
+        ('operador', UsoMaquinaria.objects.filter(operador__isnull=False).values_list('operador_id', 'fecha_uso')),
+    ]
+    filas = []
+    for tipo, consulta in grupos:
+        for recurso_id, fecha, horas in consulta.annotate(total=Sum('horas_uso')).order_by().iterator():
+            filas.append(OcupacionRecurso(
+                tipo_recurso=tipo, recurso_id=recurso_id, fecha=fecha,
+                horas=horas, conflicto=horas > limite,
+            ))
+    return len(OcupacionRecurso.objects.bulk_create(filas, batch_size=batch_size))
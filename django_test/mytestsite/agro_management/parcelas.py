@@ -0,0 +1,304 @@
+"""
+Ocupación de parcelas en el tiempo y planificación de rotaciones.
+
+Cada Cultivo ocupa area_sembrada de su parcela desde fecha_siembra hasta su
+cosecha (real o estimada). SegmentoOcupacion guarda, por parcela, la función
+escalonada del área ocupada como intervalos [fecha_inicio, fecha_fin) sin
+solapes. Con el índice (parcela, fecha_inicio) validar un cultivo nuevo
+sólo lee los segmentos que cruzan su intervalo, y la consulta de área libre
+de toda la finca es una agregación agrupada por parcela.
+
+Al guardar o borrar un cultivo sólo se reescriben los segmentos que cruzan
+su intervalo anterior y el nuevo (ajustar); reconstruir() recalcula una
+parcela entera con un barrido de sus cultivos, para los cambios en bloque y
+para fusionar los límites que dejan los cultivos retirados.
+
+La última utilización de una parcela se deriva de sus segmentos al leerla
+(con_ultima_utilizacion), así que no envejece mientras un cultivo sigue en
+el terreno; Parcela.fecha_ultima_utilizacion queda como el registro manual
+de usos anteriores a los cultivos registrados.
+"""
+
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DecimalField, F, Max, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Cultivo, Parcela, SegmentoOcupacion, TipoCultivo
+
+CERO = Decimal('0')
+UN_DIA = datetime.timedelta(days=1)
+
+
+def intervalo(cultivo):
+    """Intervalo [inicio, fin) que ocupa un cultivo (dict o instancia)."""
+    valor = cultivo.get if isinstance(cultivo, dict) else lambda campo: getattr(cultivo, campo)
+    fin = valor('fecha_cosecha_real') or valor('fecha_cosecha_estimada')
+    return valor('fecha_siembra'), max(fin, valor('fecha_siembra')) + UN_DIA
+
+
+def _segmentos(parcela_id, cultivos):
+    """Barrido de los intervalos de los cultivos de una parcela."""
+    cambios = defaultdict(lambda: CERO)
+    for inicio, fin, area in cultivos:
+        cambios[inicio] += area
+        cambios[fin] -= area
+    segmentos = []
+    area = CERO
+    fechas = sorted(cambios)
+    for inicio, fin in zip(fechas, fechas[1:]):
+        area += cambios[inicio]
+        # Los segmentos contiguos de igual área no se fusionan: así cada
+        # límite de un cultivo es límite de segmento
+        if area:
+            segmentos.append(SegmentoOcupacion(parcela_id=parcela_id, fecha_inicio=inicio, fecha_fin=fin, area_ocupada=area))
+    return segmentos
+
+
+@transaction.atomic
+def reconstruir(parcela_ids=None, batch_size=1000):
+    """
+    Recalcula los segmentos de las parcelas indicadas (o de todas). Devuelve
+    el número de segmentos creados.
+    """
+    cultivos = Cultivo.objects.all()
+    parcelas = Parcela.objects.all()
+    if parcela_ids is not None:
+        cultivos = cultivos.filter(parcela_id__in=parcela_ids)
+        parcelas = parcelas.filter(pk__in=parcela_ids)
+
+    por_parcela = defaultdict(list)
+    for fila in cultivos.values('parcela_id', 'fecha_siembra', 'fecha_cosecha_estimada', 'fecha_cosecha_real', 'area_sembrada'):
+        por_parcela[fila['parcela_id']].append((*intervalo(fila), fila['area_sembrada']))
+
+    segmentos = []
+    for parcela_id, intervalos in por_parcela.items():
+        segmentos.extend(_segmentos(parcela_id, intervalos))
+
+    SegmentoOcupacion.objects.filter(parcela__in=parcelas).delete()
+    SegmentoOcupacion.objects.bulk_create(segmentos, batch_size=batch_size)
+    return len(segmentos)
+
+
+def cambios_por_cultivo(cultivo, anterior=None, signo=1):
+    """
+    Intervalos (parcela_id, inicio, fin, area) que un alta, cambio o baja de
+    un cultivo suma (area positiva) o resta a la ocupación. anterior son los
+    valores guardados antes del cambio; signo=-1 para un borrado.
+    """
+    campos = ('parcela_id', 'fecha_siembra', 'fecha_cosecha_estimada', 'fecha_cosecha_real', 'area_sembrada')
+    nuevo = {campo: getattr(cultivo, campo) for campo in campos}
+    anterior = {campo: anterior[campo] for campo in campos} if anterior else None
+    if anterior == nuevo:
+        return []
+    cambios = [(nuevo['parcela_id'], *intervalo(nuevo), signo * nuevo['area_sembrada'])]
+    if anterior:
+        cambios.append((anterior['parcela_id'], *intervalo(anterior), -anterior['area_sembrada']))
+    return cambios
+
+
+@transaction.atomic
+def ajustar(cambios, batch_size=1000):
+    """
+    Suma o resta el área de cada intervalo (parcela_id, inicio, fin, area) a
+    los segmentos de su parcela. Sólo se leen y reescriben los segmentos que
+    cruzan el intervalo: los que lo sobrepasan se parten en sus extremos y
+    los huecos dentro de él se rellenan. Las parcelas se bloquean para que
+    dos ajustes simultáneos no partan los mismos segmentos.
+    """
+    cambios = [cambio for cambio in cambios if cambio[3]]
+    if not cambios:
+        return
+    list(
+        Parcela.objects.select_for_update()
+        .filter(pk__in={parcela_id for parcela_id, *_ in cambios}).order_by('pk').values_list('pk', flat=True)
+    )
+    for parcela_id, inicio, fin, delta in cambios:
+        segmentos = list(
+            SegmentoOcupacion.objects
+            .filter(parcela_id=parcela_id, fecha_inicio__lt=fin, fecha_fin__gt=inicio)
+            .order_by('fecha_inicio')
+        )
+        piezas = []
+        cursor = inicio
+        for segmento in segmentos:
+            if segmento.fecha_inicio < inicio:
+                piezas.append((segmento.fecha_inicio, inicio, segmento.area_ocupada))
+            if cursor < segmento.fecha_inicio:
+                piezas.append((cursor, segmento.fecha_inicio, delta))
+            piezas.append((
+                max(segmento.fecha_inicio, inicio), min(segmento.fecha_fin, fin), segmento.area_ocupada + delta,
+            ))
+            if segmento.fecha_fin > fin:
+                piezas.append((fin, segmento.fecha_fin, segmento.area_ocupada))
+            cursor = segmento.fecha_fin
+        if cursor < fin:
+            piezas.append((cursor, fin, delta))
+        SegmentoOcupacion.objects.filter(pk__in=[segmento.pk for segmento in segmentos]).delete()
+        SegmentoOcupacion.objects.bulk_create([
+            SegmentoOcupacion(parcela_id=parcela_id, fecha_inicio=desde, fecha_fin=hasta, area_ocupada=area)
+            for desde, hasta, area in piezas
+            if area > 0
+        ], batch_size=batch_size)
+
+
+def con_ultima_utilizacion(parcelas, hoy=None):
+    """
+    Anota en una consulta de parcelas fin_ocupacion, el fin del último
+    segmento iniciado hasta hoy, del que ultima_utilizacion() deriva la fecha.
+    """
+    hoy = hoy or timezone.localdate()
+    return parcelas.annotate(fin_ocupacion=Max(
+        'segmentos_ocupacion__fecha_fin', filter=Q(segmentos_ocupacion__fecha_inicio__lte=hoy),
+    ))
+
+
+def ultima_utilizacion(registrada, fin_ocupacion, hoy=None):
+    """
+    Último día hasta hoy en que la parcela estuvo ocupada por un cultivo o,
+    si es posterior, la fecha registrada a mano.
+    """
+    hoy = hoy or timezone.localdate()
+    derivada = min(fin_ocupacion - UN_DIA, hoy) if fin_ocupacion else None
+    return max((fecha for fecha in (registrada, derivada) if fecha), default=None)
+
+
+def area_maxima_ocupada(parcela_id, inicio, fin, excluir=None):
+    """
+    Mayor área ocupada de una parcela en [inicio, fin). Con excluir se
+    descuenta un cultivo ya guardado (al editarlo).
+    """
+    descontar = None
+    if excluir is not None and excluir.pk:
+        anterior = Cultivo.objects.filter(pk=excluir.pk).values(
+            'parcela_id', 'fecha_siembra', 'fecha_cosecha_estimada', 'fecha_cosecha_real', 'area_sembrada',
+        ).first()
+        if anterior and anterior['parcela_id'] == parcela_id:
+            descontar = (*intervalo(anterior), anterior['area_sembrada'])
+    maximo = CERO
+    for desde, hasta, area in (
+            SegmentoOcupacion.objects
+            .filter(parcela_id=parcela_id, fecha_inicio__lt=fin, fecha_fin__gt=inicio)
+            .values_list('fecha_inicio', 'fecha_fin', 'area_ocupada')):
+        if descontar and desde >= descontar[0] and hasta <= descontar[1]:
+            area -= descontar[2]
+        maximo = max(maximo, area)
+    return maximo
+
+
+def conflicto_de_area(cultivo):
+    """Errores de validación si el cultivo excede la superficie libre de su parcela."""
+    if not (cultivo.parcela_id and cultivo.fecha_siembra and cultivo.fecha_cosecha_estimada and cultivo.area_sembrada):
+        return {}
+    inicio, fin = intervalo(cultivo)
+    ocupada = area_maxima_ocupada(cultivo.parcela_id, inicio, fin, excluir=cultivo)
+    superficie = cultivo.parcela.superficie
+    if ocupada + cultivo.area_sembrada > superficie:
+        return {'area_sembrada': (
+            f"La parcela tiene {superficie} ha y ya hay {ocupada} ha ocupadas en ese periodo; "
+            f"quedan {max(superficie - ocupada, CERO)} ha libres"
+        )}
+    return {}
+
+
+def conflictos_de_area(cultivo_ids):
+    """
+    Versión en bloque de conflicto_de_area para cultivos ya guardados cuyas
+    parcelas acaban de reconstruirse (p. ej. tras un bulk_update de fechas):
+    {cultivo_id: mensaje} de los que cruzan un segmento que supera la
+    superficie de la parcela. Una consulta para los cultivos y otra para los
+    segmentos excedidos.
+    """
+    cultivos = list(
+        Cultivo.objects.filter(pk__in=cultivo_ids).values(
+            'pk', 'parcela_id', 'parcela__superficie', 'fecha_siembra', 'fecha_cosecha_estimada',
+            'fecha_cosecha_real', 'area_sembrada',
+        )
+    )
+    excedidos = defaultdict(list)
+    for parcela_id, desde, hasta, area in (
+            SegmentoOcupacion.objects
+            .filter(parcela_id__in={cultivo['parcela_id'] for cultivo in cultivos},
+                    area_ocupada__gt=F('parcela__superficie'))
+            .values_list('parcela_id', 'fecha_inicio', 'fecha_fin', 'area_ocupada')):
+        excedidos[parcela_id].append((desde, hasta, area))
+    conflictos = {}
+    for cultivo in cultivos:
+        if not (cultivo['fecha_siembra'] and cultivo['fecha_cosecha_estimada']):
+            continue
+        inicio, fin = intervalo(cultivo)
+        maximo = max(
+            (area for desde, hasta, area in excedidos[cultivo['parcela_id']] if desde < fin and hasta > inicio),
+            default=None,
+        )
+        if maximo is not None:
+            conflictos[cultivo['pk']] = (
+                f"La parcela tiene {cultivo['parcela__superficie']} ha y en ese periodo llega a "
+                f"{maximo} ha ocupadas"
+            )
+    return conflictos
+
+
+def parcelas_libres(area, fecha_inicio, fecha_fin):
+    """
+    Parcelas con al menos `area` ha libres durante todo [fecha_inicio,
+    fecha_fin], con su área libre, su secuencia de rotación y los tipos de
+    cultivo recomendados. Una consulta agregada para el área y otra para el
+    historial de todas las parcelas resultantes.
+    """
+    area = Decimal(area)
+    fin = fecha_fin + UN_DIA
+    solape = Q(segmentos_ocupacion__fecha_inicio__lt=fin, segmentos_ocupacion__fecha_fin__gt=fecha_inicio)
+    parcelas = list(
+        con_ultima_utilizacion(Parcela.objects)
+        .annotate(ocupada=Coalesce(
+            Max('segmentos_ocupacion__area_ocupada', filter=solape), Value(CERO),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))
+        .annotate(libre=F('superficie') - F('ocupada'))
+        .filter(libre__gte=area)
+        .values('pk', 'codigo', 'nombre', 'superficie', 'libre', 'fecha_ultima_utilizacion', 'fin_ocupacion')
+        .order_by('-libre', 'codigo')
+    )
+
+    historial = defaultdict(list)
+    for parcela_id, tipo_id, tipo, variedad, siembra in (
+            Cultivo.objects
+            .filter(parcela__in=[parcela['pk'] for parcela in parcelas], fecha_siembra__lte=fecha_inicio)
+            .values_list('parcela_id', 'variedad__tipo_cultivo_id', 'variedad__tipo_cultivo__nombre',
+                         'variedad__nombre', 'fecha_siembra')
+            .order_by('parcela_id', 'fecha_siembra')):
+        historial[parcela_id].append((tipo_id, tipo, variedad, siembra))
+
+    tipos = list(TipoCultivo.objects.values_list('pk', 'nombre').order_by('nombre'))
+    for parcela in parcelas:
+        parcela['fecha_ultima_utilizacion'] = ultima_utilizacion(
+            parcela['fecha_ultima_utilizacion'], parcela.pop('fin_ocupacion'),
+        )
+        secuencia = historial[parcela['pk']]
+        parcela['rotacion'] = [
+            {'tipo_cultivo': tipo, 'variedad': variedad, 'fecha_siembra': siembra}
+            for _, tipo, variedad, siembra in secuencia
+        ]
+        parcela['recomendados'] = recomendar_rotacion([tipo_id for tipo_id, _, _, _ in secuencia], tipos)
+    return parcelas
+
+
+def recomendar_rotacion(secuencia, tipos):
+    """
+    Tipos de cultivo (familias) recomendados tras una secuencia de siembras.
+
+    Se excluyen los de las últimas ROTACION_CICLOS_SIN_REPETIR siembras y el
+    resto se ordena por antigüedad de su última siembra (primero los nunca
+    sembrados en la parcela).
+    """
+    ciclos = getattr(settings, 'ROTACION_CICLOS_SIN_REPETIR', 2)
+    recientes = set(secuencia[-ciclos:]) if ciclos else set()
+    ultima_vez = {tipo_id: posicion for posicion, tipo_id in enumerate(secuencia)}
+    candidatos = [(ultima_vez.get(tipo_id, -1), nombre) for tipo_id, nombre in tipos if tipo_id not in recientes]
+    return [nombre for _, nombre in sorted(candidatos)]
@@ -0,0 +1,259 @@
+"""
+Pronóstico de rendimiento y fecha de cosecha de los cultivos abiertos.
+
+Todos los cultivos se cargan en columnas (listas alineadas por índice) con
+una consulta y el cálculo se hace columna a columna, sin consultas por
+cultivo. El rendimiento por hectárea se pronostica como
+
+    rendimiento_esperado × factor_variedad × factor_parcela × factor_suelo
+
+donde los factores de variedad y parcela son la razón media real/esperado de
+su historial, contraída hacia 1 con PRONOSTICO_PESO_PREVIO observaciones
+ficticias, y el factor de suelo sale de una regresión lineal del residuo
+sobre el pH y la materia orgánica del último análisis de la parcela. La
+fecha de cosecha usa la duración media del ciclo de la variedad.
+
+El error se mide dejando fuera cada cultivo cosechado al calcular sus propios
+factores y se resume por variedad, por parcela y global en ErrorPronostico;
+sus percentiles dan la banda de PronosticoCosecha.
+"""
+
+import datetime
+import statistics
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from . import atp
+from .models import AnalisisSuelo, Cultivo, ErrorPronostico, PronosticoCosecha
+
+# pH de referencia para el factor de suelo
+PH_OPTIMO = 6.5
+
+# Límites del factor de suelo para no extrapolar con pocos análisis
+FACTOR_SUELO_MINIMO = 0.5
+FACTOR_SUELO_MAXIMO = 1.5
+
+# Observaciones mínimas para usar la distribución de error de una variedad
+MINIMO_OBSERVACIONES = 3
+
+
+def _decimal(valor, decimales='0.01'):
+    return Decimal(str(valor)).quantize(Decimal(decimales))
+
+
+def _percentil(ordenados, q):
+    if not ordenados:
+        return 0.0
+    posicion = (len(ordenados) - 1) * q
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicion - inferior)
+
+
+def _contraer(suma, n, peso):
+    """Media contraída hacia 1 con `peso` observaciones ficticias."""
+    if n + peso <= 0:
+        return 1.0
+    return (suma + peso) / (n + peso)
+
+
+def _regresion(x1, x2, y):
+    """Mínimos cuadrados de y ~ b1·x1 + b2·x2 sobre datos centrados."""
+    n = len(y)
+    if n < 2 * MINIMO_OBSERVACIONES:
+        return 0.0, 0.0, 0.0, 0.0
+    m1, m2, my = sum(x1) / n, sum(x2) / n, sum(y) / n
+    c1 = [v - m1 for v in x1]
+    c2 = [v - m2 for v in x2]
+    cy = [v - my for v in y]
+    s11 = sum(a * a for a in c1)
+    s22 = sum(b * b for b in c2)
+    s12 = sum(a * b for a, b in zip(c1, c2))
+    s1y = sum(a * c for a, c in zip(c1, cy))
+    s2y = sum(b * c for b, c in zip(c2, cy))
+    determinante = s11 * s22 - s12 * s12
+    if abs(determinante) < 1e-12:
+        return 0.0, 0.0, m1, m2
+    return (s22 * s1y - s12 * s2y) / determinante, (s11 * s2y - s12 * s1y) / determinante, m1, m2
+
+
+def _columnas():
+    """Carga todos los cultivos con su variedad y su último análisis de suelo."""
+    ultimo_analisis = AnalisisSuelo.objects.filter(parcela=OuterRef('parcela')).order_by('-fecha_analisis', '-pk')
+    filas = (
+        Cultivo.objects
+        .annotate(
+            ph=Subquery(ultimo_analisis.values('ph')[:1]),
+            materia_organica=Subquery(ultimo_analisis.values('materia_organica')[:1]),
+        )
+        .values_list(
+            'pk', 'variedad_id', 'parcela_id', 'fecha_siembra', 'fecha_cosecha_real', 'area_sembrada',
+            'rendimiento_obtenido', 'variedad__rendimiento_esperado', 'variedad__tiempo_maduracion',
+            'ph', 'materia_organica',
+        )
+        .order_by('pk')
+    )
+    nombres = (
+        'id', 'variedad', 'parcela', 'siembra', 'cosecha_real', 'area', 'obtenido', 'esperado',
+        'maduracion', 'ph', 'materia_organica',
+    )
+    columnas = {nombre: [] for nombre in nombres}
+    for fila in filas:
+        for nombre, valor in zip(nombres, fila):
+            columnas[nombre].append(valor)
+    return columnas
+
+
+def calcular():
+    """
+    Devuelve (pronosticos, errores): los PronosticoCosecha de los cultivos
+    abiertos y los ErrorPronostico del historial, sin guardarlos.
+    """
+    peso = getattr(settings, 'PRONOSTICO_PESO_PREVIO', 3)
+    c = _columnas()
+    n = len(c['id'])
+
+    area = [float(a) for a in c['area']]
+    esperado = [float(e) for e in c['esperado']]
+    cerrado = [
+        c['cosecha_real'][i] is not None and c['obtenido'][i] is not None and area[i] > 0 and esperado[i] > 0
+        for i in range(n)
+    ]
+    # Razón real/esperado por hectárea y duración real del ciclo de los cultivos cosechados
+    razon = [float(c['obtenido'][i]) / area[i] / esperado[i] if cerrado[i] else None for i in range(n)]
+    ciclo = [(c['cosecha_real'][i] - c['siembra'][i]).days if cerrado[i] else None for i in range(n)]
+
+    suma_variedad, n_variedad, ciclo_variedad = defaultdict(float), defaultdict(int), defaultdict(int)
+    for i in range(n):
+        if cerrado[i]:
+            suma_variedad[c['variedad'][i]] += razon[i]
+            n_variedad[c['variedad'][i]] += 1
+            ciclo_variedad[c['variedad'][i]] += ciclo[i]
+
+    def factor_variedad(i, excluir=False):
+        v = c['variedad'][i]
+        quitar = razon[i] if excluir else 0.0
+        return _contraer(suma_variedad[v] - quitar, n_variedad[v] - excluir, peso)
+
+    # Residuo por parcela una vez descontada la variedad
+    suma_parcela, n_parcela = defaultdict(float), defaultdict(int)
+    residuo_parcela = [None] * n
+    for i in range(n):
+        if cerrado[i]:
+            residuo_parcela[i] = razon[i] / factor_variedad(i, excluir=True)
+            suma_parcela[c['parcela'][i]] += residuo_parcela[i]
+            n_parcela[c['parcela'][i]] += 1
+
+    def factor_parcela(i, excluir=False):
+        p = c['parcela'][i]
+        quitar = residuo_parcela[i] if excluir else 0.0
+        return _contraer(suma_parcela[p] - quitar, n_parcela[p] - excluir, peso)
+
+    # Regresión del residuo restante sobre el suelo
+    con_suelo = [i for i in range(n) if cerrado[i] and c['ph'][i] is not None]
+    b_ph, b_mo, m_ph, m_mo = _regresion(
+        [abs(float(c['ph'][i]) - PH_OPTIMO) for i in con_suelo],
+        [float(c['materia_organica'][i]) for i in con_suelo],
+        [razon[i] / (factor_variedad(i, True) * factor_parcela(i, True)) - 1 for i in con_suelo],
+    )
+
+    def factor_suelo(i):
+        if c['ph'][i] is None:
+            return 1.0
+        valor = 1 + b_ph * (abs(float(c['ph'][i]) - PH_OPTIMO) - m_ph) + b_mo * (float(c['materia_organica'][i]) - m_mo)
+        return min(max(valor, FACTOR_SUELO_MINIMO), FACTOR_SUELO_MAXIMO)
+
+    def duracion(i, excluir=False):
+        v = c['variedad'][i]
+        suma = ciclo_variedad[v] - (ciclo[i] if excluir else 0)
+        cantidad = n_variedad[v] - excluir
+        if cantidad + peso <= 0:
+            return c['maduracion'][i]
+        return round((suma + peso * c['maduracion'][i]) / (cantidad + peso))
+
+    # Errores relativos fuera de muestra
+    error, error_dias = [None] * n, [None] * n
+    for i in range(n):
+        if cerrado[i]:
+            pronostico = factor_variedad(i, True) * factor_parcela(i, True) * factor_suelo(i)
+            error[i] = (razon[i] - pronostico) / pronostico
+            error_dias[i] = ciclo[i] - duracion(i, True)
+
+    ahora = timezone.now()
+    grupos = {('global', None): [i for i in range(n) if cerrado[i]]}
+    for i in range(n):
+        if cerrado[i]:
+            grupos.setdefault(('variedad', c['variedad'][i]), []).append(i)
+            grupos.setdefault(('parcela', c['parcela'][i]), []).append(i)
+    errores = []
+    bandas = {}
+    for (ambito, clave), indices in grupos.items():
+        if not indices:
+            continue
+        valores = sorted(error[i] for i in indices)
+        p10, p90 = _percentil(valores, 0.1), _percentil(valores, 0.9)
+        if ambito != 'parcela':
+            bandas[(ambito, clave)] = (p10, p90, len(indices))
+        errores.append(ErrorPronostico(
+            ambito=ambito,
+            variedad_id=clave if ambito == 'variedad' else None,
+            parcela_id=clave if ambito == 'parcela' else None,
+            observaciones=len(indices),
+            error_medio=_decimal(statistics.fmean(valores), '0.0001'),
+            desviacion=_decimal(statistics.pstdev(valores), '0.0001'),
+            percentil_10=_decimal(p10, '0.0001'),
+            percentil_90=_decimal(p90, '0.0001'),
+            error_dias_medio=_decimal(statistics.fmean(error_dias[i] for i in indices)),
+            fecha_calculo=ahora,
+        ))
+
+    pronosticos = []
+    banda_global = bandas.get(('global', None), (0.0, 0.0, 0))
+    for i in range(n):
+        if c['cosecha_real'][i] is not None:
+            continue
+        fv, fp, fs = factor_variedad(i), factor_parcela(i), factor_suelo(i)
+        rendimiento = esperado[i] * fv * fp * fs
+        produccion = rendimiento * area[i]
+        p10, p90, observaciones = bandas.get(('variedad', c['variedad'][i]), banda_global)
+        if observaciones < MINIMO_OBSERVACIONES:
+            p10, p90, _ = banda_global
+        pronosticos.append(PronosticoCosecha(
+            cultivo_id=c['id'][i],
+            rendimiento_ha=_decimal(rendimiento),
+            produccion_kg=_decimal(produccion),
+            produccion_minima_kg=_decimal(max(produccion * (1 + min(p10, 0.0)), 0.0)),
+            produccion_maxima_kg=_decimal(produccion * (1 + max(p90, 0.0))),
+            fecha_cosecha=c['siembra'][i] + datetime.timedelta(days=duracion(i)),
+            factor_variedad=_decimal(fv, '0.001'),
+            factor_parcela=_decimal(fp, '0.001'),
+            factor_suelo=_decimal(fs, '0.001'),
+            fecha_calculo=ahora,
+        ))
+    return pronosticos, errores
+
+
+@transaction.atomic
+def pronosticar(batch_size=1000):
+    """Recalcula y guarda en bloque los pronósticos y la distribución del error."""
+    pronosticos, errores = calcular()
+    PronosticoCosecha.objects.exclude(cultivo__in=[p.cultivo_id for p in pronosticos]).delete()
+    PronosticoCosecha.objects.bulk_create(
+        pronosticos,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['cultivo'],
+        update_fields=[
+            'rendimiento_ha', 'produccion_kg', 'produccion_minima_kg', 'produccion_maxima_kg', 'fecha_cosecha',
+            'factor_variedad', 'factor_parcela', 'factor_suelo', 'fecha_calculo',
+        ],
+    )
+    ErrorPronostico.objects.all().delete()
+    ErrorPronostico.objects.bulk_create(errores, batch_size=batch_size)
+    atp.invalidar(Cultivo.objects.values_list('variedad_id', flat=True).distinct())
+    return len(pronosticos)
@@ -0,0 +1,372 @@
+"""
+Resolución de proveedores y consultas de gasto y calidad por Proveedor.
+
+LoteInsumo.proveedor es texto libre. La resolución agrupa los textos
+distintos, los normaliza y los compara sólo con los proveedores que comparten
+alguna clave de bloqueo (RUC o palabra del nombre), evitando comparar todos
+contra todos. Cada texto queda en CoincidenciaProveedor para su revisión y
+las coincidencias confirmadas se vuelcan en LoteInsumo.proveedor_registrado.
+
+IndicadorProveedor resume por proveedor las evaluaciones de los últimos 90 y
+365 días y las señales de caducidad y consumo de sus lotes, con una
+puntuación compuesta indexada para ordenar el ranking sin recalcular.
+"""
+
+import datetime
+import re
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .models import CoincidenciaProveedor, LoteInsumo, Proveedor
+
+# Palabras que no distinguen a un proveedor de otro
+PALABRAS_VACIAS = {
+    'sa', 'sac', 'saa', 'srl', 'eirl', 'sas', 'ltda', 'cia', 'y', 'e', 'de', 'del', 'la', 'las',
+    'el', 'los', 'compania', 'empresa', 'corporacion', 'grupo',
+}
+
+PATRON_RUC = re.compile(r'\d{8,}')
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes, sin puntuación ni formas societarias."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    texto = re.sub(r'[^a-z0-9 ]+', ' ', texto.replace('.', ''))
+    return ' '.join(palabra for palabra in texto.split() if palabra not in PALABRAS_VACIAS)
+
+
+def _claves_bloqueo(normalizado):
+    """Palabras del nombre y sus prefijos de cuatro letras (toleran erratas al final)."""
+    claves = set()
+    for palabra in normalizado.split():
+        if len(palabra) >= 3:
+            claves.add(palabra)
+            claves.add(palabra[:4] + '*')
+    return claves
+
+
+def _similitud_palabras(a, b):
+    """Media de la mejor similitud de cada palabra de a con las palabras de b."""
+    palabras_a, palabras_b = a.split(), b.split()
+    if not palabras_a or not palabras_b:
+        return 0.0
+    return sum(
+        max(SequenceMatcher(None, palabra, otra).ratio() for otra in palabras_b)
+        for palabra in palabras_a
+    ) / len(palabras_a)
+
+
+def _puntuar(a, b):
+    simetrica = (_similitud_palabras(a, b) + _similitud_palabras(b, a)) / 2
+    return 0.5 * SequenceMatcher(None, a, b).ratio() + 0.5 * simetrica
+
+
+class IndiceProveedores:
+    """Índices en memoria de Proveedor por RUC, nombre normalizado y palabra."""
+
+    def __init__(self):
+        self.por_ruc = {}
+        self.por_nombre = {}
+        self.nombres = {}
+        self.bloques = defaultdict(set)
+        for pk, nombre, ruc in Proveedor.objects.values_list('pk', 'nombre', 'ruc'):
+            normalizado = normalizar(nombre)
+            self.nombres[pk] = normalizado
+            self.por_nombre.setdefault(normalizado, pk)
+            digitos = re.sub(r'\D', '', ruc or '')
+            if digitos:
+                self.por_ruc[digitos] = pk
+            for clave in _claves_bloqueo(normalizado):
+                self.bloques[clave].add(pk)
+
+    def resolver(self, texto):
+        """Devuelve (proveedor_id, puntuacion, metodo) para un texto libre."""
+        for digitos in PATRON_RUC.findall(texto or ''):
+            if digitos in self.por_ruc:
+                return self.por_ruc[digitos], 1.0, 'ruc'
+        normalizado = normalizar(texto)
+        if normalizado in self.por_nombre:
+            return self.por_nombre[normalizado], 1.0, 'exacto'
+        candidatos = set()
+        for clave in _claves_bloqueo(normalizado):
+            candidatos |= self.bloques.get(clave, set())
+        mejor = (None, 0.0, 'difuso')
+        for pk in candidatos:
+            puntuacion = _puntuar(normalizado, self.nombres[pk])
+            if puntuacion > mejor[1]:
+                mejor = (pk, puntuacion, 'difuso')
+        return mejor
+
+
+def _umbrales():
+    return (
+        getattr(settings, 'PROVEEDORES_UMBRAL_CONFIRMACION', 0.92),
+        getattr(settings, 'PROVEEDORES_UMBRAL_PROPUESTA', 0.75),
+    )
+
+
+@transaction.atomic
+def resolver_proveedores(revisar_todo=False, batch_size=1000):
+    """
+    Resuelve los textos de proveedor aún no revisados y vincula los lotes.
+
+    Por defecto sólo procesa textos nuevos (incremental). Con
+    revisar_todo=True vuelve a puntuar también las propuestas y los textos
+    sin coincidencia; las decisiones confirmadas o rechazadas se respetan.
+    Devuelve un diccionario con los contadores de la ejecución.
+    """
+    confirmar, proponer = _umbrales()
+    textos = set(
+        LoteInsumo.objects
+        .filter(proveedor_registrado__isnull=True)
+        .exclude(proveedor='')
+        .values_list('proveedor', flat=True)
+        .distinct()
+    )
+    existentes = CoincidenciaProveedor.objects.filter(texto__in=textos)
+    if revisar_todo:
+        existentes = existentes.filter(estado__in=('confirmada', 'rechazada'))
+    textos -= set(existentes.values_list('texto', flat=True))
+
+    indice = IndiceProveedores()
+    coincidencias = []
+    for texto in textos:
+        proveedor_id, puntuacion, metodo = indice.resolver(texto)
+        if proveedor_id is None or puntuacion < proponer:
+            proveedor_id, estado = None, 'sin_coincidencia'
+        elif puntuacion >= confirmar:
+            estado = 'confirmada'
+        else:
+            estado = 'propuesta'
+        coincidencias.append(CoincidenciaProveedor(
+            texto=texto,
+            texto_normalizado=normalizar(texto)[:100],
+            proveedor_id=proveedor_id,
+            puntuacion=Decimal(str(round(puntuacion, 3))),
+            metodo=metodo if proveedor_id else '',
+            estado=estado,
+            fecha_revision=timezone.now(),
+        ))
+    CoincidenciaProveedor.objects.bulk_create(
+        coincidencias,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['texto'],
+        update_fields=['texto_normalizado', 'proveedor', 'puntuacion', 'metodo', 'estado', 'fecha_revision'],
+    )
+    vinculados = vincular_lotes()
+    return {
+        'textos': len(coincidencias),
+        'confirmadas': sum(1 for c in coincidencias if c.estado == 'confirmada'),
+        'propuestas': sum(1 for c in coincidencias if c.estado == 'propuesta'),
+        'lotes_vinculados': vinculados,
+    }
+
+
+def vincular_lotes():
+    """Rellena proveedor_registrado de los lotes con coincidencia confirmada."""
+    confirmada = CoincidenciaProveedor.objects.filter(texto=OuterRef('proveedor'), estado='confirmada')
+    return (
+        LoteInsumo.objects
+        .filter(proveedor_registrado__isnull=True, proveedor__in=confirmada.values('texto'))
+        .update(proveedor_registrado=Subquery(confirmada.values('proveedor')[:1]))
+    )
+
+
+def proveedor_confirmado(texto):
+    """Proveedor confirmado para un texto (búsqueda por índice único)."""
+    return (
+        CoincidenciaProveedor.objects
+        .filter(texto=texto, estado='confirmada')
+        .values_list('proveedor_id', flat=True)
+        .first()
+    )
+
+
+@transaction.atomic
+def confirmar_coincidencias(coincidencias):
+    """Confirma coincidencias revisadas y vincula sus lotes."""
+    coincidencias.filter(proveedor__isnull=False).update(estado='confirmada', fecha_revision=timezone.now())
+    return vincular_lotes()
+
+
+@transaction.atomic
+def rechazar_coincidencias(coincidencias):
+    """Rechaza coincidencias y desvincula los lotes que se habían enlazado con ellas."""
+    for texto, proveedor_id in coincidencias.filter(estado='confirmada').values_list('texto', 'proveedor_id'):
+        LoteInsumo.objects.filter(proveedor=texto, proveedor_registrado_id=proveedor_id).update(proveedor_registrado=None)
+    return coincidencias.update(estado='rechazada', fecha_revision=timezone.now())
+
+
+#####################################
+# CONSULTAS POR PROVEEDOR
+#####################################
+
+def gasto_por_proveedor(fecha_inicio, fecha_fin, hoy=None):
+    """
+    Gasto, consumo y calidad de lotes por proveedor en un periodo, agrupado
+    sobre el índice (proveedor_registrado, fecha_adquisicion).
+    """
+    hoy = hoy or timezone.localdate()
+    importe = ExpressionWrapper(
+        F('cantidad_inicial') * F('costo_unitario'),
+        output_field=DecimalField(max_digits=20, decimal_places=4),
+    )
+    consumido = ExpressionWrapper(
+        F('cantidad_inicial') - F('cantidad_actual'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    return (
+        LoteInsumo.objects
+        .filter(proveedor_registrado__isnull=False, fecha_adquisicion__range=(fecha_inicio, fecha_fin))
+        .values('proveedor_registrado', 'proveedor_registrado__codigo', 'proveedor_registrado__nombre')
+        .annotate(
+            gasto=Sum(importe),
+            lotes=Count('id'),
+            cantidad_comprada=Sum('cantidad_inicial'),
+            cantidad_consumida=Sum(consumido),
+            lotes_caducados=Count('id', filter=Q(fecha_caducidad__lt=hoy, cantidad_actual__gt=0)),
+        )
+        .order_by('-gasto')
+    )
+
+
+#####################################
+# PUNTUACIÓN DE PROVEEDORES
+#####################################
+
+PESOS_EVALUACION = {
+    'calidad_productos': 0.4,
+    'puntualidad_entregas': 0.3,
+    'precio_competitividad': 0.2,
+    'servicio_atencion': 0.1,
+}
+
+PESOS_INDICADOR = {
+    'evaluacion': 0.7,
+    'caducidad': 0.15,
+    'consumo': 0.15,
+}
+
+
+def puntuacion_ponderada(evaluacion):
+    """Media ponderada de las cuatro subpuntuaciones (1 a 10) expresada de 0 a 100."""
+    pesos = getattr(settings, 'PROVEEDORES_PESOS_EVALUACION', PESOS_EVALUACION)
+    total = sum(pesos.values())
+    media = sum(getattr(evaluacion, campo) * peso for campo, peso in pesos.items()) / total
+    return round(media * 10)
+
+
+def _proporcion(parte, total):
+    if not total:
+        return Decimal('0')
+    return (Decimal(parte) / Decimal(total)).quantize(Decimal('0.0001'))
+
+
+@transaction.atomic
+def actualizar_indicadores(proveedor_ids=None, hoy=None, batch_size=500):
+    """
+    Recalcula las ventanas móviles de 90 y 365 días y la puntuación compuesta
+    de los proveedores indicados (o de todos). Cada fuente se agrega con una
+    consulta agrupada por proveedor sobre sus índices por fecha.
+    """
+    from .models import EvaluacionProveedor, IndicadorProveedor
+
+    hoy = hoy or timezone.localdate()
+    desde_90 = hoy - datetime.timedelta(days=90)
+    desde_365 = hoy - datetime.timedelta(days=365)
+    pesos = getattr(settings, 'PROVEEDORES_PESOS_INDICADOR', PESOS_INDICADOR)
+
+    proveedores = Proveedor.objects.all()
+    if proveedor_ids is not None:
+        proveedores = proveedores.filter(pk__in=proveedor_ids)
+    ids = list(proveedores.values_list('pk', flat=True))
+
+    evaluaciones = {
+        fila['proveedor']: fila
+        for fila in EvaluacionProveedor.objects
+        .filter(proveedor__in=ids, fecha__gt=desde_365, fecha__lte=hoy)
+        .values('proveedor')
+        .annotate(
+            n_90=Count('id', filter=Q(fecha__gt=desde_90)),
+            suma_90=Sum('puntuacion_total', filter=Q(fecha__gt=desde_90)),
+            n_365=Count('id'),
+            suma_365=Sum('puntuacion_total'),
+        )
+        .order_by()
+    }
+    lotes = {
+        fila['proveedor_registrado']: fila
+        for fila in LoteInsumo.objects
+        .filter(proveedor_registrado__in=ids, fecha_adquisicion__gt=desde_365)
+        .values('proveedor_registrado')
+        .annotate(
+            n=Count('id'),
+            caducados=Count('id', filter=Q(fecha_caducidad__lt=hoy, cantidad_actual__gt=0)),
+            comprado=Sum('cantidad_inicial'),
+            restante=Sum('cantidad_actual'),
+        )
+        .order_by()
+    }
+
+    ahora = timezone.now()
+    indicadores = []
+    for pk in ids:
+        evaluacion = evaluaciones.get(pk, {})
+        lote = lotes.get(pk, {})
+        promedio_90 = (Decimal(evaluacion['suma_90']) / evaluacion['n_90']).quantize(Decimal('0.01')) if evaluacion.get('n_90') else None
+        promedio_365 = (Decimal(evaluacion['suma_365']) / evaluacion['n_365']).quantize(Decimal('0.01')) if evaluacion.get('n_365') else None
+        tasa_caducidad = _proporcion(lote.get('caducados', 0), lote.get('n', 0))
+        tasa_consumo = _proporcion((lote.get('comprado') or 0) - (lote.get('restante') or 0), lote.get('comprado') or 0)
+        base = promedio_90 if promedio_90 is not None else promedio_365
+        # Sin evaluaciones la puntuación queda en 0: el ranking no necesita NULLS LAST
+        puntuacion = Decimal('0')
+        if base is not None:
+            puntuacion = (
+                Decimal(str(pesos['evaluacion'])) * base
+                + Decimal(str(pesos['caducidad'])) * (1 - tasa_caducidad) * 100
+                + Decimal(str(pesos['consumo'])) * tasa_consumo * 100
+            ).quantize(Decimal('0.01'))
+        indicadores.append(IndicadorProveedor(
+            proveedor_id=pk,
+            evaluaciones_90=evaluacion.get('n_90', 0),
+            promedio_90=promedio_90,
+            evaluaciones_365=evaluacion.get('n_365', 0),
+            promedio_365=promedio_365,
+            lotes_365=lote.get('n', 0),
+            tasa_caducidad=tasa_caducidad,
+            tasa_consumo=tasa_consumo,
+            puntuacion=puntuacion,
+            fecha_calculo=ahora,
+        ))
+    IndicadorProveedor.objects.bulk_create(
+        indicadores,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['proveedor'],
+        update_fields=[
+            'evaluaciones_90', 'promedio_90', 'evaluaciones_365', 'promedio_365', 'lotes_365',
+            'tasa_caducidad', 'tasa_consumo', 'puntuacion', 'fecha_calculo',
+        ],
+    )
+    return len(indicadores)
+
+
+def ranking_proveedores(limite=None):
+    """Proveedores ordenados por puntuación compuesta (una consulta indexada)."""
+    from .models import IndicadorProveedor
+
+    filas = (
+        IndicadorProveedor.objects
+        .select_related('proveedor')
+        .order_by('-puntuacion', 'proveedor__codigo')
+    )
+    return filas[:limite] if limite else filas
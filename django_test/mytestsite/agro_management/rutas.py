@@ -0,0 +1,261 @@
+"""
+Secuencia de paradas y tiempos estimados de llegada de los envíos.
+
+Las distancias y tiempos entre puntos conocidos (direcciones de entrega,
+puntos de partida y llegada de las rutas, puntos intermedios) se leen del CSV
+de RUTAS_MATRIZ_DISTANCIAS con columnas origen,destino,distancia_km,minutos.
+Un par sin su inverso se toma simétrico. La matriz se guarda en arrays planos
+de n×n dobles (array('d')) y se mantiene en memoria mientras el archivo no
+cambie, así que cada consulta es un acceso por índice.
+
+Las paradas de cada envío se ordenan con vecino más cercano desde el punto de
+partida de su ruta y se mejoran con 2-opt, terminando en el punto de llegada
+si está en la matriz. Los pedidos con la misma dirección comparten parada.
+"""
+
+import csv
+import datetime
+import math
+import os
+from array import array
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Envio, ParadaEnvio, PuntoIntermedio, RutaEntrega
+
+_matrices = {}
+
+
+def normalizar(nombre):
+    return ' '.join((nombre or '').split()).lower()
+
+
+class MatrizDistancias:
+    """Distancias (km) y tiempos (minutos) entre puntos con nombre en arrays planos n×n."""
+
+    def __init__(self, nombres):
+        self.indices = {}
+        for nombre in nombres:
+            self.indices.setdefault(normalizar(nombre), len(self.indices))
+        self.n = len(self.indices)
+        self.distancias = array('d', [math.inf]) * (self.n * self.n)
+        self.tiempos = array('d', [math.inf]) * (self.n * self.n)
+        for i in range(self.n):
+            self.distancias[i * self.n + i] = self.tiempos[i * self.n + i] = 0.0
+
+    @classmethod
+    def desde_csv(cls, archivo):
+        filas = [
+            (fila['origen'], fila['destino'], float(fila['distancia_km']), float(fila['minutos']))
+            for fila in csv.DictReader(archivo)
+        ]
+        matriz = cls(nombre for fila in filas for nombre in fila[:2])
+        explicitos = {}
+        for origen, destino, km, minutos in filas:
+            explicitos[matriz.indice(origen), matriz.indice(destino)] = (km, minutos)
+        for (i, j), (km, minutos) in explicitos.items():
+            matriz.fijar(i, j, km, minutos)
+            if (j, i) not in explicitos:
+                matriz.fijar(j, i, km, minutos)
+        return matriz
+
+    def indice(self, nombre):
+        return self.indices.get(normalizar(nombre))
+
+    def fijar(self, i, j, km, minutos):
+        self.distancias[i * self.n + j] = km
+        self.tiempos[i * self.n + j] = minutos
+
+    def distancia(self, i, j):
+        return self.distancias[i * self.n + j]
+
+    def tiempo(self, i, j):
+        return self.tiempos[i * self.n + j]
+
+
+def cargar_matriz(ruta=None):
+    """Matriz del archivo configurado (None si no existe), recargada sólo si el archivo cambió."""
+    ruta = os.fspath(ruta or getattr(settings, 'RUTAS_MATRIZ_DISTANCIAS', ''))
+    try:
+        modificado = os.stat(ruta).st_mtime_ns
+    except OSError:
+        return None
+    guardada = _matrices.get(ruta)
+    if guardada is None or guardada[0] != modificado:
+        with open(ruta, encoding='utf-8-sig', newline='') as archivo:
+            guardada = (modificado, MatrizDistancias.desde_csv(archivo))
+        _matrices[ruta] = guardada
+    return guardada[1]
+
+
+def _matriz_requerida(matriz):
+    matriz = matriz or cargar_matriz()
+    if matriz is None:
+        raise ImproperlyConfigured(
+            f"No se encuentra la matriz de distancias ({getattr(settings, 'RUTAS_MATRIZ_DISTANCIAS', None)})"
+        )
+    return matriz
+
+
+#####################################
+# ORDEN DE PARADAS
+#####################################
+
+def ordenar(costes, n, origen, paradas, destino=None):
+    """
+    Orden de los índices de `paradas` para un camino que parte de `origen`
+    y, si se indica, termina en `destino`: vecino más cercano y mejora 2-opt
+    sobre la matriz plana de costes n×n.
+    """
+    pendientes = set(paradas)
+    camino = []
+    actual = origen
+    while pendientes:
+        fila = actual * n
+        actual = min(pendientes, key=lambda j: costes[fila + j])
+        pendientes.remove(actual)
+        camino.append(actual)
+    return _dos_opt(costes, n, origen, camino, destino)
+
+
+def _dos_opt(costes, n, origen, camino, destino):
+    recorrido = [origen] + camino + ([destino] if destino is not None else [])
+    ultimo = len(camino)
+    mejora = True
+    while mejora:
+        mejora = False
+        # Costes acumulados en ambos sentidos: la matriz puede ser asimétrica
+        ida, vuelta = [0.0], [0.0]
+        for k in range(len(recorrido) - 1):
+            ida.append(ida[-1] + costes[recorrido[k] * n + recorrido[k + 1]])
+            vuelta.append(vuelta[-1] + costes[recorrido[k + 1] * n + recorrido[k]])
+        for i in range(1, ultimo):
+            a, b = recorrido[i - 1], recorrido[i]
+            for j in range(i + 1, ultimo + 1):
+                c = recorrido[j]
+                antes = costes[a * n + b] + ida[j] - ida[i]
+                despues = costes[a * n + c] + vuelta[j] - vuelta[i]
+                if j + 1 < len(recorrido):
+                    e = recorrido[j + 1]
+                    antes += costes[c * n + e]
+                    despues += costes[b * n + e]
+                if despues < antes - 1e-9:
+                    recorrido[i:j + 1] = recorrido[i:j + 1][::-1]
+                    mejora = True
+                    break
+            if mejora:
+                break
+    return recorrido[1:ultimo + 1]
+
+
+def _decimal(valor):
+    return Decimal(str(round(valor, 2))) if math.isfinite(valor) else None
+
+
+@transaction.atomic
+def planificar_envios(envio_ids, matriz=None, batch_size=1000):
+    """
+    Ordena las paradas de los envíos indicados y recalcula su hora estimada
+    de llegada, reemplazando sus ParadaEnvio. Los pedidos cuya dirección no
+    está en la matriz quedan al final sin estimación.
+    """
+    matriz = _matriz_requerida(matriz)
+    servicio = getattr(settings, 'RUTAS_MINUTOS_POR_PARADA', 10)
+    envios = list(
+        Envio.objects.filter(pk__in=envio_ids)
+        .values_list('pk', 'fecha_programada', 'hora_salida', 'ruta__punto_partida', 'ruta__punto_llegada')
+    )
+    pedidos = defaultdict(list)
+    for envio_id, pedido_id, direccion in (
+            Envio.pedidos.through.objects
+            .filter(envio_id__in=[envio[0] for envio in envios])
+            .values_list('envio_id', 'pedido_id', 'pedido__direccion_entrega')
+            .order_by('envio_id', 'pedido_id')):
+        pedidos[envio_id].append((pedido_id, matriz.indice(direccion)))
+
+    paradas = []
+    for envio_id, fecha, hora, partida, llegada in envios:
+        origen, destino = matriz.indice(partida), matriz.indice(llegada)
+        por_punto = defaultdict(list)
+        sin_punto = []
+        for pedido_id, indice in pedidos[envio_id]:
+            if indice is None or origen is None:
+                sin_punto.append(pedido_id)
+            else:
+                por_punto[indice].append(pedido_id)
+        salida = datetime.datetime.combine(fecha, hora)
+        if settings.USE_TZ:
+            salida = timezone.make_aware(salida)
+
+        orden = 0
+        minutos = km = 0.0
+        anterior = origen
+        for indice in ordenar(matriz.tiempos, matriz.n, origen, por_punto, destino) if por_punto else []:
+            minutos += matriz.tiempo(anterior, indice)
+            km += matriz.distancia(anterior, indice)
+            conocido = math.isfinite(minutos)
+            for pedido_id in por_punto[indice]:
+                orden += 1
+                paradas.append(ParadaEnvio(
+                    envio_id=envio_id,
+                    pedido_id=pedido_id,
+                    orden=orden,
+                    distancia_acumulada=_decimal(km),
+                    minutos_llegada=round(minutos) if conocido else None,
+                    llegada_estimada=salida + datetime.timedelta(minutes=minutos) if conocido else None,
+                ))
+            minutos += servicio
+            anterior = indice
+        for pedido_id in sin_punto:
+            orden += 1
+            paradas.append(ParadaEnvio(envio_id=envio_id, pedido_id=pedido_id, orden=orden))
+
+    ParadaEnvio.objects.filter(envio_id__in=[envio[0] for envio in envios]).delete()
+    return ParadaEnvio.objects.bulk_create(paradas, batch_size=batch_size)
+
+
+@transaction.atomic
+def actualizar_rutas(ruta_ids=None, matriz=None):
+    """
+    Recalcula tiempo_estimado_llegada de los puntos intermedios (en su orden)
+    y la distancia y el tiempo totales de las rutas. Los puntos que no están
+    en la matriz conservan sus valores.
+    """
+    matriz = _matriz_requerida(matriz)
+    rutas = RutaEntrega.objects.all() if ruta_ids is None else RutaEntrega.objects.filter(pk__in=ruta_ids)
+    rutas = list(rutas.only('pk', 'punto_partida', 'punto_llegada', 'distancia_total', 'tiempo_estimado'))
+    puntos = defaultdict(list)
+    for punto in PuntoIntermedio.objects.filter(ruta__in=rutas).order_by('ruta_id', 'orden'):
+        puntos[punto.ruta_id].append(punto)
+
+    cambios_puntos, cambios_rutas = [], []
+    for ruta in rutas:
+        anterior = matriz.indice(ruta.punto_partida)
+        if anterior is None:
+            continue
+        minutos = km = 0.0
+        for punto in puntos[ruta.pk]:
+            indice = matriz.indice(punto.ubicacion)
+            if indice is None:
+                continue
+            minutos += matriz.tiempo(anterior, indice)
+            km += matriz.distancia(anterior, indice)
+            anterior = indice
+            if math.isfinite(minutos):
+                punto.tiempo_estimado_llegada = round(minutos)
+                cambios_puntos.append(punto)
+        llegada = matriz.indice(ruta.punto_llegada)
+        if llegada is not None:
+            minutos += matriz.tiempo(anterior, llegada)
+            km += matriz.distancia(anterior, llegada)
+            if math.isfinite(minutos) and math.isfinite(km):
+                ruta.distancia_total, ruta.tiempo_estimado = _decimal(km), round(minutos)
+                cambios_rutas.append(ruta)
+    PuntoIntermedio.objects.bulk_update(cambios_puntos, ['tiempo_estimado_llegada'], batch_size=1000)
+    RutaEntrega.objects.bulk_update(cambios_rutas, ['distancia_total', 'tiempo_estimado'], batch_size=1000)
+    return len(cambios_rutas), len(cambios_puntos)
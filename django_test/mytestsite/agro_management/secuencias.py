@@ -0,0 +1,209 @@
+"""
+Numeración de documentos por bloques y códigos de negocio.
+
+SecuenciaDocumento guarda, por nombre, el primer número aún no reservado.
+reservar() toma n números consecutivos con una sola sentencia UPDATE
+(siguiente = siguiente + n) seguida de la lectura del nuevo valor, así que
+una corrida que emite 10.000 documentos toca la fila una vez y no una por
+documento. La fila queda bloqueada hasta el final de la transacción que la
+actualizó: dos corridas simultáneas reciben bloques disjuntos y nunca un
+número repetido. Llamada fuera de una transacción, la reserva se confirma
+al momento y no retiene la fila; si después el bloque no llega a usarse,
+queda un hueco en la numeración.
+
+Los códigos (Pedido.codigo, Factura.numero, ...) de los modelos de
+CODIGOS_FORMATOS se arman con su formato ({anio} y {numero}; con {anio} la
+secuencia es una por año). Cada proceso reserva CODIGOS_BLOQUE números de
+una vez y los va entregando desde memoria, de modo que la fila de la
+secuencia no se convierte en un punto caliente; por eso los códigos son
+únicos pero no estrictamente crecientes entre procesos. asignar() rellena
+los códigos vacíos de una lista de instancias (la usan las rutas de
+bulk_create) y la señal pre_save la aplica a cada save(); los números cuyo
+código ya existe (cargado a mano o por importación) se saltan.
+sincronizar() lleva cada secuencia más allá del mayor código existente con
+su formato; corre tras cada migrate y con el comando sincronizar_secuencias.
+"""
+
+import re
+import string
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.apps import apps
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import SecuenciaDocumento
+
+# Campo del código de cada modelo cuando no se llama 'codigo'
+CAMPOS = {
+    'agro_management.Factura': 'numero',
+}
+
+# Números reservados por este proceso y aún sin usar: {secuencia: [range, ...]}
+_bloques = defaultdict(list)
+_bloques_lock = threading.Lock()
+
+
+def reservar(nombre, cantidad):
+    """Reserva `cantidad` números consecutivos de la secuencia y los devuelve como range."""
+    if cantidad <= 0:
+        return range(0)
+    SecuenciaDocumento.objects.get_or_create(nombre=nombre)
+    with transaction.atomic():
+        SecuenciaDocumento.objects.filter(nombre=nombre).update(siguiente=F('siguiente') + cantidad)
+        siguiente = SecuenciaDocumento.objects.values_list('siguiente', flat=True).get(nombre=nombre)
+    return range(siguiente - cantidad, siguiente)
+
+
+#####################################
+# CÓDIGOS DE NEGOCIO
+#####################################
+
+def formato(modelo):
+    """Formato del código del modelo según CODIGOS_FORMATOS, o None si no se asigna."""
+    return getattr(settings, 'CODIGOS_FORMATOS', {}).get(modelo._meta.label)
+
+
+def campo(modelo):
+    return CAMPOS.get(modelo._meta.label, 'codigo')
+
+
+def _guardar(secuencia, bloque):
+    with _bloques_lock:
+        _bloques[secuencia].append(bloque)
+
+
+def numeros(secuencia, cantidad):
+    """
+    Toma `cantidad` números de la secuencia: primero de los bloques que este
+    proceso ya tiene y el resto de una reserva nueva de al menos CODIGOS_BLOQUE.
+    """
+    tomados = []
+    with _bloques_lock:
+        bloques = _bloques[secuencia]
+        while bloques and len(tomados) < cantidad:
+            bloque = bloques.pop(0)
+            parte = cantidad - len(tomados)
+            tomados.extend(bloque[:parte])
+            if len(bloque) > parte:
+                bloques.insert(0, bloque[parte:])
+    faltan = cantidad - len(tomados)
+    if faltan:
+        bloque = reservar(secuencia, max(faltan, getattr(settings, 'CODIGOS_BLOQUE', 100)))
+        tomados.extend(bloque[:faltan])
+        if len(bloque) > faltan:
+            # Si la transacción se revierte la reserva también: el sobrante sólo se guarda al confirmarse
+            transaction.on_commit(lambda: _guardar(secuencia, bloque[faltan:]))
+    return tomados
+
+
+def asignar(instancias, fecha=None):
+    """
+    Rellena el código vacío de instancias sin guardar de un mismo modelo
+    (p. ej. antes de bulk_create). Devuelve la lista de instancias.
+    """
+    instancias = list(instancias)
+    if not instancias:
+        return instancias
+    modelo = type(instancias[0])
+    patron = formato(modelo)
+    if patron is None:
+        return instancias
+    nombre = campo(modelo)
+    pendientes = [instancia for instancia in instancias if not getattr(instancia, nombre)]
+    if not pendientes:
+        return instancias
+    anio = (fecha or timezone.localdate()).year
+    secuencia = nombre_secuencia(modelo, patron, anio)
+    usados = {getattr(instancia, nombre) for instancia in instancias if getattr(instancia, nombre)}
+    while pendientes:
+        codigos = [patron.format(anio=anio, numero=numero) for numero in numeros(secuencia, len(pendientes))]
+        usados |= _existentes(modelo, nombre, codigos)
+        sin_codigo = []
+        for instancia, codigo in zip(pendientes, codigos):
+            if codigo in usados:
+                # Código cargado por otra vía: se salta el número y se pide otro
+                sin_codigo.append(instancia)
+            else:
+                setattr(instancia, nombre, codigo)
+                usados.add(codigo)
+        pendientes = sin_codigo
+    return instancias
+
+
+def nombre_secuencia(modelo, patron, anio):
+    return f"{modelo._meta.model_name}:{anio}" if '{anio' in patron else modelo._meta.model_name
+
+
+def _existentes(modelo, nombre, codigos, lote=500):
+    existentes = set()
+    for inicio in range(0, len(codigos), lote):
+        existentes.update(
+            modelo._default_manager.filter(**{f'{nombre}__in': codigos[inicio:inicio + lote]})
+            .values_list(nombre, flat=True)
+        )
+    return existentes
+
+
+#####################################
+# SINCRONIZACIÓN CON LOS CÓDIGOS EXISTENTES
+#####################################
+
+def _expresion(patron):
+    """Expresión regular que reconoce los códigos del formato y captura anio y numero."""
+    partes = []
+    for literal, campo_formato, _, _ in string.Formatter().parse(patron):
+        partes.append(re.escape(literal))
+        if campo_formato == 'anio':
+            partes.append(r'(?P<anio>\d{4})')
+        elif campo_formato == 'numero':
+            partes.append(r'(?P<numero>\d+)')
+    return re.compile(''.join(partes) + r'\Z')
+
+
+def sincronizar(using='default'):
+    """
+    Lleva cada secuencia de CODIGOS_FORMATOS (por modelo y, si el formato
+    tiene {anio}, por año) más allá del mayor código existente que siga su
+    formato. Nunca la hace retroceder. Devuelve {secuencia: siguiente} de las
+    que se movieron.
+    """
+    movidas = {}
+    for etiqueta, patron in getattr(settings, 'CODIGOS_FORMATOS', {}).items():
+        modelo = apps.get_model(etiqueta)
+        nombre = campo(modelo)
+        expresion = _expresion(patron)
+        prefijo = patron.split('{', 1)[0]
+        maximos = defaultdict(int)
+        codigos = (
+            modelo._default_manager.using(using)
+            .filter(**{f'{nombre}__startswith': prefijo})
+            .values_list(nombre, flat=True)
+        )
+        for codigo in codigos.iterator():
+            encontrado = expresion.match(codigo or '')
+            if encontrado:
+                anio = int(encontrado.group('anio')) if '{anio' in patron else None
+                secuencia = nombre_secuencia(modelo, patron, anio)
+                maximos[secuencia] = max(maximos[secuencia], int(encontrado.group('numero')))
+        for secuencia, maximo in maximos.items():
+            with transaction.atomic(using=using):
+                SecuenciaDocumento.objects.using(using).get_or_create(nombre=secuencia)
+                if SecuenciaDocumento.objects.using(using).filter(
+                    nombre=secuencia, siguiente__lte=maximo,
+                ).update(siguiente=maximo + 1):
+                    movidas[secuencia] = maximo + 1
+    return movidas
+
+
+def sincronizar_tras_migrar(using):
+    """sincronizar() si las tablas ya existen (migrate puede dejar la base en un estado anterior)."""
+    tablas = set(connections[using].introspection.table_names())
+    necesarias = {SecuenciaDocumento._meta.db_table} | {
+        apps.get_model(etiqueta)._meta.db_table for etiqueta in getattr(settings, 'CODIGOS_FORMATOS', {})
+    }
+    if necesarias <= tablas:
+        sincronizar(using)
@@ -0,0 +1,342 @@
+"""
+Lecturas de sensores de campo (humedad del suelo, temperatura, lluvia).
+
+Las lecturas no se guardan fila a fila: cada sensor tiene un BloqueLecturas
+por día local con dos columnas binarias paralelas, los segundos desde la
+medianoche (array('i')) y los valores (array('d')), ordenados por instante.
+Un lote nuevo se fusiona con los bloques de sus días (una lectura repetida
+en el mismo segundo reemplaza a la anterior) y se reescribe con un único
+bulk_create con update_conflicts.
+
+En la misma transacción se recalculan, a partir del bloque completo, los
+AgregadoSensor por hora y por día de esos días (mínimo, máximo, suma y
+número de lecturas), así que un dato tardío deja los agregados exactos. Las
+consultas por parcela y el balance de riego leen sólo los agregados
+diarios: un registro por sensor y día, sin decodificar bloques.
+
+La retención borra los bloques con más de SENSORES_DIAS_BLOQUES días y los
+agregados por hora con más de SENSORES_DIAS_AGREGADO_HORA; los diarios se
+conservan.
+"""
+
+import datetime
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.utils import timezone
+
+from . import telemetria
+from .models import AgregadoSensor, BloqueLecturas, PlanRiego, Sensor
+
+CAMPOS_AGREGADO = ['lecturas', 'minimo', 'maximo', 'suma']
+
+
+def inicio_dia(fecha):
+    """Medianoche local de una fecha como momento con zona horaria."""
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time()))
+
+
+def decodificar(bloque):
+    """Columnas (segundos, valores) de un BloqueLecturas."""
+    segundos, valores = array('i'), array('d')
+    segundos.frombytes(bytes(bloque.segundos))
+    valores.frombytes(bytes(bloque.valores))
+    return segundos, valores
+
+
+def _bloque(sensor_id, fecha, lecturas):
+    segundos = array('i', sorted(lecturas))
+    return BloqueLecturas(
+        sensor_id=sensor_id,
+        fecha=fecha,
+        lecturas=len(segundos),
+        segundos=segundos.tobytes(),
+        valores=array('d', (lecturas[segundo] for segundo in segundos)).tobytes(),
+    )
+
+
+def _agregados(sensor_id, fecha, segundos, valores):
+    """Agregados por hora y el del día de un bloque, recorriéndolo una sola vez."""
+    inicio = inicio_dia(fecha)
+    horas = {}
+    for segundo, valor in zip(segundos, valores):
+        hora = segundo // 3600
+        actual = horas.get(hora)
+        if actual is None:
+            horas[hora] = [1, valor, valor, valor]
+        else:
+            actual[0] += 1
+            actual[3] += valor
+            if valor < actual[1]:
+                actual[1] = valor
+            elif valor > actual[2]:
+                actual[2] = valor
+    agregados = [
+        AgregadoSensor(
+            sensor_id=sensor_id, granularidad='hora', inicio=inicio + datetime.timedelta(hours=hora),
+            lecturas=n, minimo=minimo, maximo=maximo, suma=suma,
+        )
+        for hora, (n, minimo, maximo, suma) in horas.items()
+    ]
+    agregados.append(AgregadoSensor(
+        sensor_id=sensor_id, granularidad='dia', inicio=inicio,
+        lecturas=len(valores), minimo=min(valores), maximo=max(valores), suma=sum(valores),
+    ))
+    return agregados
+
+
+def leer_lecturas(filas, sensor=None):
+    """
+    Convierte filas {sensor (código), momento, valor[, linea]} en ternas
+    (sensor_id, momento, valor) para registrar_lecturas, con una consulta
+    para todos los códigos. Devuelve (ternas, errores); los sensores
+    inactivos o desconocidos y los valores no numéricos son errores. Con
+    `sensor` (el autenticado por su token) las filas sin código son suyas y
+    las de cualquier otro sensor se rechazan.
+    """
+    filas = list(filas)
+    if sensor is not None:
+        sensores = {sensor.codigo: sensor.pk}
+    else:
+        sensores = dict(
+            Sensor.objects
+            .filter(codigo__in={str(fila.get('sensor', '')).strip() for fila in filas}, activo=True)
+            .values_list('codigo', 'pk')
+        )
+    ternas, errores = [], []
+    for posicion, fila in enumerate(filas):
+        codigo = str(fila.get('sensor') or (sensor.codigo if sensor is not None else '')).strip()
+        try:
+            if codigo not in sensores:
+                raise ValueError(
+                    f"El token no corresponde al sensor {codigo}" if sensor is not None
+                    else f"Sensor desconocido o inactivo: {codigo}"
+                )
+            valor = float(fila['valor'])
+            if valor != valor:
+                raise ValueError("Valor no numérico")
+            ternas.append((sensores[codigo], telemetria.leer_momento(fila['momento']), valor))
+        except (KeyError, TypeError, ValueError, OverflowError) as error:
+            errores.append({'linea': fila.get('linea', posicion), 'sensor': codigo, 'error': str(error)})
+    return ternas, errores
+
+
+@transaction.atomic
+def registrar_lecturas(lecturas, batch_size=500):
+    """
+    Añade un lote de ternas (sensor_id, momento, valor) a los bloques diarios
+    y recalcula los agregados de los días afectados. Devuelve cuántas lecturas
+    se recibieron.
+    """
+    nuevas = defaultdict(dict)
+    recibidas = 0
+    for sensor_id, momento, valor in lecturas:
+        local = timezone.localtime(momento)
+        medianoche = local.replace(hour=0, minute=0, second=0, microsecond=0)
+        nuevas[sensor_id, local.date()][int((local - medianoche).total_seconds())] = float(valor)
+        recibidas += 1
+    if not nuevas:
+        return 0
+
+    # Los lotes simultáneos de un mismo sensor se turnan: sin este bloqueo dos
+    # lotes podrían crear el mismo bloque diario y el segundo borraría las
+    # lecturas del primero al reescribirlo
+    list(
+        Sensor.objects.select_for_update()
+        .filter(pk__in={sensor_id for sensor_id, _ in nuevas})
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    fechas = [fecha for _, fecha in nuevas]
+    existentes = {
+        (bloque.sensor_id, bloque.fecha): bloque
+        for bloque in BloqueLecturas.objects.filter(
+            sensor_id__in={sensor_id for sensor_id, _ in nuevas},
+            fecha__range=(min(fechas), max(fechas)),
+        )
+        if (bloque.sensor_id, bloque.fecha) in nuevas
+    }
+    bloques, agregados = [], []
+    for (sensor_id, fecha), datos in nuevas.items():
+        existente = existentes.get((sensor_id, fecha))
+        if existente is not None:
+            datos = {**dict(zip(*decodificar(existente))), **datos}
+        bloque = _bloque(sensor_id, fecha, datos)
+        bloques.append(bloque)
+        agregados.extend(_agregados(sensor_id, fecha, *decodificar(bloque)))
+
+    BloqueLecturas.objects.bulk_create(
+        bloques,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['sensor', 'fecha'],
+        update_fields=['lecturas', 'segundos', 'valores'],
+    )
+    AgregadoSensor.objects.bulk_create(
+        agregados,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['sensor', 'granularidad', 'inicio'],
+        update_fields=CAMPOS_AGREGADO,
+    )
+    return recibidas
+
+
+def lecturas_crudas(sensor_id, desde, hasta):
+    """Lecturas crudas [(momento, valor)] de un sensor en [desde, hasta), leídas de sus bloques."""
+    puntos = []
+    bloques = BloqueLecturas.objects.filter(
+        sensor_id=sensor_id,
+        fecha__range=(timezone.localdate(desde), timezone.localdate(hasta)),
+    ).order_by('fecha')
+    for bloque in bloques:
+        inicio = inicio_dia(bloque.fecha)
+        for segundo, valor in zip(*decodificar(bloque)):
+            momento = inicio + datetime.timedelta(seconds=segundo)
+            if desde <= momento < hasta:
+                puntos.append((momento, valor))
+    return puntos
+
+
+def serie(sensor_id, desde, hasta, granularidad='hora'):
+    """Agregados (inicio, lecturas, mínimo, máximo, media) de un sensor en [desde, hasta)."""
+    puntos = list(
+        AgregadoSensor.objects
+        .filter(sensor_id=sensor_id, granularidad=granularidad, inicio__gte=desde, inicio__lt=hasta)
+        .order_by('inicio')
+        .values('inicio', 'lecturas', 'minimo', 'maximo', 'suma')
+    )
+    for punto in puntos:
+        punto['media'] = punto.pop('suma') / punto['lecturas']
+    return puntos
+
+
+def por_parcela(tipo, desde, hasta):
+    """
+    Mínimo, máximo, media y suma (por sensor) de cada parcela entre las
+    fechas desde y hasta (inclusive) para los sensores de un tipo, desde los
+    agregados diarios en una consulta agrupada. Devuelve {parcela_id: {...}}.
+    """
+    filas = (
+        AgregadoSensor.objects
+        .filter(
+            granularidad='dia',
+            sensor__tipo=tipo,
+            inicio__gte=inicio_dia(desde),
+            inicio__lt=inicio_dia(hasta + datetime.timedelta(days=1)),
+        )
+        .values('sensor__parcela_id')
+        .annotate(
+            total=Sum('suma'),
+            n=Sum('lecturas'),
+            minimo_parcela=Min('minimo'),
+            maximo_parcela=Max('maximo'),
+            sensores=Count('sensor', distinct=True),
+        )
+        .order_by()
+    )
+    return {
+        fila['sensor__parcela_id']: {
+            'media': fila['total'] / fila['n'],
+            'minimo': fila['minimo_parcela'],
+            'maximo': fila['maximo_parcela'],
+            # La lluvia del tramo es la suma media de los sensores de la parcela
+            'suma': fila['total'] / fila['sensores'],
+            'lecturas': fila['n'],
+            'sensores': fila['sensores'],
+        }
+        for fila in filas
+    }
+
+
+def humedad_por_parcela(dias=7, hoy=None):
+    """Humedad del suelo media, mínima y máxima de cada parcela en los últimos `dias` días."""
+    hoy = hoy or timezone.localdate()
+    return por_parcela('humedad_suelo', hoy - datetime.timedelta(days=dias - 1), hoy)
+
+
+def balance_riego(hoy=None):
+    """
+    Contrasta cada PlanRiego de cultivos sin cosechar con los sensores de su
+    parcela en los últimos frecuencia_dias días: si la humedad media del
+    suelo está por debajo de SENSORES_HUMEDAD_OBJETIVO se recomienda regar la
+    cantidad del plan menos la lluvia medida (1 mm = 10 m³/ha). Sin sensores
+    de humedad se sigue el plan. Tres consultas en total.
+    """
+    hoy = hoy or timezone.localdate()
+    objetivo = getattr(settings, 'SENSORES_HUMEDAD_OBJETIVO', 30)
+    planes = list(
+        PlanRiego.objects
+        .filter(cultivo__fecha_cosecha_real__isnull=True)
+        .values_list('pk', 'cultivo_id', 'cultivo__parcela_id', 'cultivo__area_sembrada', 'cantidad_agua',
+                     'frecuencia_dias')
+    )
+    ventana = max([frecuencia for *_, frecuencia in planes] or [1])
+    desde = hoy - datetime.timedelta(days=ventana - 1)
+    # Un dato por parcela y día: las ventanas de todos los planes salen de las mismas dos consultas
+    humedad, lluvia = _diarios('humedad_suelo', desde, hoy), _diarios('precipitacion', desde, hoy)
+
+    resultado = []
+    for plan_id, cultivo_id, parcela_id, area, cantidad, frecuencia in planes:
+        inicio = hoy - datetime.timedelta(days=max(frecuencia, 1) - 1)
+        dias_humedad = [valor for fecha, valor in humedad.get(parcela_id, ()) if fecha >= inicio]
+        lluvia_mm = sum((valor for fecha, valor in lluvia.get(parcela_id, ()) if fecha >= inicio), 0.0)
+        media = sum(total for total, _ in dias_humedad) / sum(n for _, n in dias_humedad) if dias_humedad else None
+        planificada = float(cantidad) * float(area)
+        necesaria = max(planificada - lluvia_mm * 10 * float(area), 0.0)
+        regar = media is None or media < objetivo
+        resultado.append({
+            'plan': plan_id,
+            'cultivo': cultivo_id,
+            'parcela': parcela_id,
+            'humedad_media': round(media, 2) if media is not None else None,
+            'lluvia_mm': round(lluvia_mm, 2),
+            'agua_planificada_m3': round(planificada, 2),
+            'regar': regar and necesaria > 0,
+            'agua_recomendada_m3': round(necesaria, 2) if regar else 0.0,
+        })
+    return resultado
+
+
+def _diarios(tipo, desde, hasta):
+    """
+    {parcela_id: [(fecha, dato)]} desde los agregados diarios: para la humedad
+    el dato es (suma, lecturas) y para la lluvia los mm medios de sus sensores.
+    """
+    filas = (
+        AgregadoSensor.objects
+        .filter(
+            granularidad='dia',
+            sensor__tipo=tipo,
+            inicio__gte=inicio_dia(desde),
+            inicio__lt=inicio_dia(hasta + datetime.timedelta(days=1)),
+        )
+        .values_list('sensor__parcela_id', 'inicio', 'suma', 'lecturas')
+    )
+    por_dia = defaultdict(lambda: [0.0, 0, 0])
+    for parcela_id, inicio, suma, n in filas:
+        actual = por_dia[parcela_id, timezone.localdate(inicio)]
+        actual[0] += suma
+        actual[1] += n
+        actual[2] += 1
+    diarios = defaultdict(list)
+    for (parcela_id, fecha), (suma, n, sensores) in por_dia.items():
+        diarios[parcela_id].append((fecha, (suma, n) if tipo == 'humedad_suelo' else suma / sensores))
+    return diarios
+
+
+def depurar(hoy=None):
+    """
+    Borra los bloques con más de SENSORES_DIAS_BLOQUES días y los agregados
+    por hora con más de SENSORES_DIAS_AGREGADO_HORA. Los agregados diarios se
+    conservan. Devuelve (bloques, agregados) borrados.
+    """
+    hoy = hoy or timezone.localdate()
+    limite_bloques = hoy - datetime.timedelta(days=getattr(settings, 'SENSORES_DIAS_BLOQUES', 90))
+    limite_horas = hoy - datetime.timedelta(days=getattr(settings, 'SENSORES_DIAS_AGREGADO_HORA', 400))
+    with transaction.atomic():
+        bloques = BloqueLecturas.objects.filter(fecha__lt=limite_bloques).delete()[0]
+        horas = AgregadoSensor.objects.filter(granularidad='hora', inicio__lt=inicio_dia(limite_horas)).delete()[0]
+    return bloques, horas
@@ -0,0 +1,362 @@
+"""
+Señales de la aplicación agro_management.
+
+Mantienen los datos derivados (horas de maquinaria, etc.) sincronizados con
+los registros que los originan. Los manejadores pre_save guardan en la
+instancia los valores anteriores para poder aplicar sólo la diferencia.
+"""
+
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+
+from . import (
+    atp, cumplimiento, eventos, geometria, informes, maquinaria, ocupacion, parcelas, proveedores, secuencias, totales,
+)
+from .models import (
+    Capacitacion, CapacitacionTrabajador, CostoOperativo, Cultivo, DetallePedido, Envio, EvaluacionProveedor,
+    HabilidadTrabajador, InventarioProducto, LineaPresupuesto, LoteInsumo, Pago, Pedido, Presupuesto,
+    ProductoTerminado, RequisitoCapacitacion, TipoCosto, Trabajador, UsoMaquinaria, Variedad,
+)
+
+
+def _valores_anteriores(sender, instance, campos):
+    """Lee de la base de datos los valores guardados antes de una modificación."""
+    if instance.pk is None:
+        return None
+    return sender.objects.filter(pk=instance.pk).values(*campos).first()
+
+
+#####################################
+# MAQUINARIA
+#####################################
+
+@receiver(pre_save, sender=UsoMaquinaria)
+def guardar_uso_anterior(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._anterior = _valores_anteriores(
+        sender, instance, ('maquinaria_id', 'operador_id', 'fecha_uso', 'horas_uso'),
+    )
+
+
+@receiver(post_save, sender=UsoMaquinaria)
+def acumular_horas_uso(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_anterior', None)
+    maquinaria.ajustar_horas(maquinaria.cambios_por_uso(instance, anterior))
+    ocupacion.aplicar_cambios(ocupacion.cambios_por_uso(instance, anterior))
+
+
+@receiver(post_delete, sender=UsoMaquinaria)
+def descontar_horas_uso(sender, instance, **kwargs):
+    maquinaria.ajustar_horas(maquinaria.cambios_por_uso(instance, signo=-1))
+    ocupacion.aplicar_cambios(ocupacion.cambios_por_uso(instance, signo=-1))
+
+
+#####################################
+# CUMPLIMIENTO DE CAPACITACIONES
+#####################################
+
+@receiver(post_save, sender=CapacitacionTrabajador)
+@receiver(post_delete, sender=CapacitacionTrabajador)
+@receiver(post_save, sender=HabilidadTrabajador)
+@receiver(post_delete, sender=HabilidadTrabajador)
+def sincronizar_capacitaciones_trabajador(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cumplimiento.sincronizar([instance.trabajador_id])
+
+
+@receiver(post_save, sender=Trabajador)
+def sincronizar_capacitaciones_por_cargo(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cumplimiento.sincronizar([instance.pk])
+
+
+@receiver(pre_save, sender=Capacitacion)
+def guardar_fin_capacitacion_anterior(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._anterior = _valores_anteriores(sender, instance, ('fecha_fin',))
+
+
+@receiver(post_save, sender=Capacitacion)
+def sincronizar_capacitaciones_por_fecha(sender, instance, raw=False, created=False, **kwargs):
+    # EstadoCapacitacion.fecha_completada (y su vencimiento) sale de Capacitacion.fecha_fin
+    anterior = getattr(instance, '_anterior', None)
+    if raw or created or not anterior or anterior['fecha_fin'] == instance.fecha_fin:
+        return
+    afectados = cumplimiento.trabajadores_de_capacitacion(instance.pk)
+    if afectados:
+        cumplimiento.sincronizar(afectados)
+
+
+@receiver(pre_save, sender=RequisitoCapacitacion)
+def guardar_requisito_anterior(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._anterior = _valores_anteriores(sender, instance, ('cargo_id', 'habilidad_id'))
+
+
+@receiver(post_save, sender=RequisitoCapacitacion)
+@receiver(post_delete, sender=RequisitoCapacitacion)
+def sincronizar_capacitaciones_por_requisito(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    afectados = set(cumplimiento.trabajadores_afectados_por_requisito(instance))
+    anterior = getattr(instance, '_anterior', None)
+    if anterior:
+        afectados.update(cumplimiento.trabajadores_afectados_por_requisito(
+            RequisitoCapacitacion(**anterior),
+        ))
+    if afectados:
+        cumplimiento.sincronizar(afectados)
+
+
+#####################################
+# PROVEEDORES
+#####################################
+
+@receiver(pre_save, sender=LoteInsumo)
+def vincular_proveedor_de_lote(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Los lotes nuevos, y los que cambian de texto sin que se elija a mano otro
+    # proveedor, toman el de una coincidencia ya confirmada (o ninguno)
+    if raw or (update_fields is not None and 'proveedor' not in update_fields):
+        return
+    anterior = _valores_anteriores(sender, instance, ('proveedor', 'proveedor_registrado_id'))
+    if anterior is None:
+        if not instance.proveedor_registrado_id and instance.proveedor:
+            instance.proveedor_registrado_id = proveedores.proveedor_confirmado(instance.proveedor)
+    elif (anterior['proveedor'] != instance.proveedor
+            and anterior['proveedor_registrado_id'] == instance.proveedor_registrado_id):
+        instance.proveedor_registrado_id = proveedores.proveedor_confirmado(instance.proveedor)
+
+
+@receiver(post_save, sender=EvaluacionProveedor)
+@receiver(post_delete, sender=EvaluacionProveedor)
+def actualizar_indicador_proveedor(sender, instance, raw=False, **kwargs):
+    # Sólo se recalcula el proveedor evaluado; las ventanas avanzan con la tarea nocturna
+    if raw:
+        return
+    proveedores.actualizar_indicadores([instance.proveedor_id])
+
+
+#####################################
+# DISPONIBLE PARA PROMETER
+#####################################
+
+@receiver(pre_save, sender=Cultivo)
+@receiver(pre_save, sender=ProductoTerminado)
+def guardar_variedad_anterior(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    campos = (
+        ('variedad_id', 'parcela_id', 'fecha_siembra', 'fecha_cosecha_estimada', 'fecha_cosecha_real', 'area_sembrada')
+        if sender is Cultivo else ('cultivo__variedad_id',)
+    )
+    instance._anterior = _valores_anteriores(sender, instance, campos)
+
+
+@receiver(post_save, sender=Cultivo)
+@receiver(post_delete, sender=Cultivo)
+def invalidar_atp_por_cultivo(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_anterior', None)
+    atp.invalidar([instance.variedad_id] + ([anterior['variedad_id']] if anterior else []))
+
+
+@receiver(post_save, sender=ProductoTerminado)
+@receiver(post_delete, sender=ProductoTerminado)
+def invalidar_atp_por_producto(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_anterior', None)
+    variedades = {instance.cultivo.variedad_id}
+    if anterior:
+        variedades.add(anterior['cultivo__variedad_id'])
+    atp.invalidar(variedades)
+
+
+@receiver(post_save, sender=InventarioProducto)
+@receiver(post_delete, sender=InventarioProducto)
+@receiver(post_save, sender=DetallePedido)
+@receiver(post_delete, sender=DetallePedido)
+def invalidar_atp_por_linea(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    atp.invalidar(atp.variedades_de_productos([instance.producto_id]))
+
+
+@receiver(post_save, sender=Pedido)
+def invalidar_atp_por_pedido(sender, instance, raw=False, created=False, **kwargs):
+    # Cambiar el estado o la fecha de entrega mueve la demanda de sus líneas
+    if raw or created:
+        return
+    atp.invalidar(atp.variedades_de_productos(instance.detalles.values('producto_id')))
+
+
+@receiver(post_save, sender=Variedad)
+def invalidar_atp_por_variedad(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    atp.invalidar([instance.pk])
+
+
+#####################################
+# INFORMES FINANCIEROS
+#####################################
+
+# Fuentes de las secciones de informes.py que invalida un cambio en cada modelo
+FUENTES_INFORMES = {
+    CostoOperativo: ('costos',),
+    TipoCosto: ('costos', 'presupuesto'),
+    Pedido: ('ventas',),
+    DetallePedido: ('ventas',),
+    Pago: ('pagos',),
+    Presupuesto: ('presupuesto',),
+    LineaPresupuesto: ('presupuesto',),
+}
+
+
+def invalidar_informes(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    informes.invalidar(FUENTES_INFORMES[sender])
+
+
+# Con sender explícito: un receptor sin sender quitaría el borrado rápido a todos los modelos
+for modelo in FUENTES_INFORMES:
+    post_save.connect(invalidar_informes, sender=modelo)
+    post_delete.connect(invalidar_informes, sender=modelo)
+
+
+#####################################
+# OCUPACIÓN DE PARCELAS
+#####################################
+
+@receiver(post_save, sender=Cultivo)
+def actualizar_ocupacion_parcela(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    parcelas.ajustar(parcelas.cambios_por_cultivo(instance, getattr(instance, '_anterior', None)))
+
+
+@receiver(post_delete, sender=Cultivo)
+def liberar_ocupacion_parcela(sender, instance, **kwargs):
+    parcelas.ajustar(parcelas.cambios_por_cultivo(instance, signo=-1))
+
+
+#####################################
+# TOTALES DE PEDIDOS Y FACTURAS
+#####################################
+
+@receiver(pre_save, sender=DetallePedido)
+def guardar_detalle_anterior(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._anterior = _valores_anteriores(
+        sender, instance, ('pedido_id', 'producto_id', 'cantidad', 'subtotal', 'descuento'),
+    )
+
+
+@receiver(post_save, sender=DetallePedido)
+def acumular_total_pedido(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    totales.ajustar_pedidos(totales.cambios_por_detalle(instance, getattr(instance, '_anterior', None)))
+
+
+@receiver(post_delete, sender=DetallePedido)
+def descontar_total_pedido(sender, instance, **kwargs):
+    totales.ajustar_pedidos(totales.cambios_por_detalle(instance, signo=-1))
+
+
+@receiver(pre_save, sender=Pago)
+def guardar_pago_anterior(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._anterior = _valores_anteriores(sender, instance, ('factura_id', 'monto'))
+
+
+@receiver(post_save, sender=Pago)
+def acumular_pagado_factura(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    totales.ajustar_facturas(totales.cambios_por_pago(instance, getattr(instance, '_anterior', None)))
+
+
+@receiver(post_delete, sender=Pago)
+def descontar_pagado_factura(sender, instance, **kwargs):
+    totales.ajustar_facturas(totales.cambios_por_pago(instance, signo=-1))
+
+
+#####################################
+# ÍNDICE ESPACIAL
+#####################################
+
+@receiver(post_migrate)
+def restaurar_indices_espaciales(sender, using, **kwargs):
+    # Las migraciones que reconstruyen Parcela o FuenteAgua en SQLite borran
+    # los disparadores del R*Tree; se vuelven a crear tras migrar
+    if sender.name != 'agro_management':
+        return
+    geometria.restaurar_indices_espaciales(connections[using])
+
+
+#####################################
+# EVENTOS DE ESTADO
+#####################################
+
+@receiver(pre_save, sender=Pedido)
+@receiver(pre_save, sender=Envio)
+def guardar_estado_anterior(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = _valores_anteriores(sender, instance, ('estado',))
+    instance._estado_anterior = anterior['estado'] if anterior else None
+
+
+@receiver(post_save, sender=Pedido)
+def publicar_estado_pedido(sender, instance, raw=False, created=False, **kwargs):
+    anterior = getattr(instance, '_estado_anterior', None)
+    if raw or (not created and anterior == instance.estado):
+        return
+    eventos.publicar_cambios([
+        eventos.cambio_pedido(instance.pk, instance.cliente_id, instance.estado, anterior, instance.codigo),
+    ])
+
+
+@receiver(post_save, sender=Envio)
+def publicar_estado_envio(sender, instance, raw=False, created=False, **kwargs):
+    anterior = getattr(instance, '_estado_anterior', None)
+    if raw or (not created and anterior == instance.estado):
+        return
+    pedidos = list(instance.pedidos.values_list('pk', 'cliente_id')) if not created else []
+    eventos.publicar_cambios([eventos.cambio_envio(
+        instance.pk, instance.estado, anterior, instance.codigo,
+        [pedido_id for pedido_id, _ in pedidos], {cliente_id for _, cliente_id in pedidos},
+    )])
+
+
+#####################################
+# CÓDIGOS DE NEGOCIO
+#####################################
+
+@receiver(pre_save)
+def asignar_codigo(sender, instance, raw=False, **kwargs):
+    # Sólo los modelos de CODIGOS_FORMATOS; bulk_create llama a secuencias.asignar
+    if raw or secuencias.formato(sender) is None:
+        return
+    secuencias.asignar([instance])
+
+
+@receiver(post_migrate)
+def sincronizar_secuencias(sender, using, **kwargs):
+    # Los códigos cargados por fixtures o importaciones no pasan por la secuencia
+    if sender.name != 'agro_management':
+        return
+    secuencias.sincronizar_tras_migrar(using)
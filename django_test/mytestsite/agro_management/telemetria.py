@@ -0,0 +1,251 @@
+"""
+Telemetría de vehículos (GPS) y maquinaria (horómetros).
+
+Las lecturas llegan en lotes y se insertan con bulk_create en
+LecturaTelemetria, que solo crece y se consulta siempre por (dispositivo,
+momento). En la misma transacción cada lote se acumula en ResumenTelemetria
+por minuto y por hora (suma y máximos combinables, así un lote sólo lee los
+resúmenes de sus propios intervalos) y actualiza EstadoDispositivo, la
+última posición conocida de cada equipo, que a su vez alimenta
+Maquinaria.ubicacion_actual y el estado En ruta / Disponible del vehículo.
+
+Las series largas se leen de los resúmenes, nunca del histórico crudo, y la
+retención borra por lotes las lecturas y resúmenes por minuto antiguos.
+"""
+
+import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    DispositivoTelemetria, EstadoDispositivo, LecturaTelemetria, Maquinaria, ResumenTelemetria, Vehiculo,
+)
+
+GRANULARIDADES = {
+    'minuto': lambda momento: momento.replace(second=0, microsecond=0),
+    'hora': lambda momento: momento.replace(minute=0, second=0, microsecond=0),
+}
+
+CAMPOS_RESUMEN = [
+    'lecturas', 'suma_velocidad', 'lecturas_velocidad', 'velocidad_maxima', 'horas_motor_min',
+    'horas_motor_max', 'ultimo_momento', 'latitud', 'longitud',
+]
+
+CAMPOS_ESTADO = ['momento', 'latitud', 'longitud', 'velocidad', 'horas_motor']
+
+# Tramos a partir de los cuales una serie se lee de los resúmenes en lugar de las lecturas
+SERIE_MAXIMA_LECTURAS = datetime.timedelta(hours=6)
+SERIE_MAXIMA_MINUTOS = datetime.timedelta(days=7)
+
+
+def leer_momento(valor):
+    """Momento UTC a partir de un texto ISO 8601 o de segundos desde la época."""
+    if isinstance(valor, (int, float)):
+        return datetime.datetime.fromtimestamp(valor, tz=datetime.timezone.utc)
+    momento = datetime.datetime.fromisoformat(valor)
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    return momento.astimezone(datetime.timezone.utc)
+
+
+def _numero(valor, minimo=None, maximo=None):
+    if valor is None:
+        return None
+    numero = float(valor)
+    if numero != numero or (minimo is not None and numero < minimo) or (maximo is not None and numero > maximo):
+        raise ValueError(f"Valor fuera de rango: {valor}")
+    return numero
+
+
+def leer_lectura(dispositivo_id, datos):
+    """
+    Convierte un diccionario recibido ({momento, latitud, longitud,
+    velocidad, horas_motor}) en una LecturaTelemetria sin guardar. El momento
+    puede ser ISO 8601 o segundos desde la época. Lanza ValueError si no es válido.
+    """
+    try:
+        horas_motor = datos.get('horas_motor')
+        return LecturaTelemetria(
+            dispositivo_id=dispositivo_id,
+            momento=leer_momento(datos['momento']),
+            latitud=_numero(datos.get('latitud'), -90, 90),
+            longitud=_numero(datos.get('longitud'), -180, 180),
+            velocidad=_numero(datos.get('velocidad'), 0),
+            horas_motor=Decimal(str(horas_motor)) if horas_motor is not None else None,
+        )
+    except (KeyError, TypeError, InvalidOperation, OverflowError) as error:
+        raise ValueError(f"Lectura no válida: {error}") from error
+
+
+@transaction.atomic
+def ingerir(lecturas, batch_size=1000):
+    """Guarda un lote de lecturas y actualiza resúmenes y estados. Devuelve cuántas se guardaron."""
+    if not lecturas:
+        return 0
+    # Las ingestas simultáneas del mismo dispositivo se turnan: sin este
+    # bloqueo dos lotes podrían crear el mismo intervalo y el segundo
+    # sobrescribiría los conteos del primero
+    list(
+        DispositivoTelemetria.objects.select_for_update()
+        .filter(pk__in={lectura.dispositivo_id for lectura in lecturas})
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    LecturaTelemetria.objects.bulk_create(lecturas, batch_size=batch_size)
+    for granularidad in GRANULARIDADES:
+        _acumular_resumenes(lecturas, granularidad, batch_size)
+    _actualizar_estados(lecturas)
+    return len(lecturas)
+
+
+def _combinar(resumen, lectura):
+    resumen.lecturas += 1
+    if lectura.velocidad is not None:
+        resumen.suma_velocidad += lectura.velocidad
+        resumen.lecturas_velocidad += 1
+        if resumen.velocidad_maxima is None or lectura.velocidad > resumen.velocidad_maxima:
+            resumen.velocidad_maxima = lectura.velocidad
+    if lectura.horas_motor is not None:
+        if resumen.horas_motor_min is None or lectura.horas_motor < resumen.horas_motor_min:
+            resumen.horas_motor_min = lectura.horas_motor
+        if resumen.horas_motor_max is None or lectura.horas_motor > resumen.horas_motor_max:
+            resumen.horas_motor_max = lectura.horas_motor
+    if lectura.momento >= resumen.ultimo_momento:
+        resumen.ultimo_momento = lectura.momento
+        if lectura.latitud is not None:
+            resumen.latitud, resumen.longitud = lectura.latitud, lectura.longitud
+
+
+def _acumular_resumenes(lecturas, granularidad, batch_size):
+    truncar = GRANULARIDADES[granularidad]
+    claves = {(lectura.dispositivo_id, truncar(lectura.momento)) for lectura in lecturas}
+    # Sólo se leen los resúmenes de los intervalos que toca el lote; ingerir()
+    # ya bloqueó sus dispositivos
+    resumenes = {
+        (resumen.dispositivo_id, resumen.inicio): resumen
+        for resumen in ResumenTelemetria.objects.filter(
+            granularidad=granularidad,
+            dispositivo_id__in={dispositivo_id for dispositivo_id, _ in claves},
+            inicio__range=(min(inicio for _, inicio in claves), max(inicio for _, inicio in claves)),
+        )
+        if (resumen.dispositivo_id, resumen.inicio) in claves
+    }
+    for lectura in lecturas:
+        clave = (lectura.dispositivo_id, truncar(lectura.momento))
+        if clave not in resumenes:
+            resumenes[clave] = ResumenTelemetria(
+                dispositivo_id=clave[0], granularidad=granularidad, inicio=clave[1],
+                ultimo_momento=lectura.momento,
+            )
+        _combinar(resumenes[clave], lectura)
+    ResumenTelemetria.objects.bulk_create(
+        resumenes.values(),
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['dispositivo', 'granularidad', 'inicio'],
+        update_fields=CAMPOS_RESUMEN,
+    )
+
+
+def _actualizar_estados(lecturas):
+    ultimas = {}
+    for lectura in lecturas:
+        actual = ultimas.get(lectura.dispositivo_id)
+        if actual is None or lectura.momento > actual.momento:
+            ultimas[lectura.dispositivo_id] = lectura
+    anteriores = dict(EstadoDispositivo.objects.filter(pk__in=ultimas).values_list('pk', 'momento'))
+    estados = [
+        EstadoDispositivo(dispositivo_id=dispositivo_id, **{campo: getattr(lectura, campo) for campo in CAMPOS_ESTADO})
+        for dispositivo_id, lectura in ultimas.items()
+        if dispositivo_id not in anteriores or lectura.momento > anteriores[dispositivo_id]
+    ]
+    if not estados:
+        return
+    EstadoDispositivo.objects.bulk_create(
+        estados, update_conflicts=True, unique_fields=['dispositivo'], update_fields=CAMPOS_ESTADO,
+    )
+    _propagar(estados)
+
+
+def _propagar(estados):
+    """Lleva la última posición a Maquinaria y el movimiento al estado del Vehiculo."""
+    equipos = {
+        pk: (vehiculo_id, maquinaria_id)
+        for pk, vehiculo_id, maquinaria_id in DispositivoTelemetria.objects.filter(
+            pk__in=[estado.dispositivo_id for estado in estados],
+        ).values_list('pk', 'vehiculo_id', 'maquinaria_id')
+    }
+    umbral = getattr(settings, 'TELEMETRIA_VELOCIDAD_EN_RUTA', 5)
+    maquinas, en_ruta, detenidos = [], [], []
+    for estado in estados:
+        vehiculo_id, maquinaria_id = equipos.get(estado.dispositivo_id, (None, None))
+        if maquinaria_id and estado.latitud is not None:
+            maquinas.append(Maquinaria(pk=maquinaria_id, ubicacion_actual=f"{estado.latitud:.6f}, {estado.longitud:.6f}"))
+        if vehiculo_id and estado.velocidad is not None:
+            (en_ruta if estado.velocidad >= umbral else detenidos).append(vehiculo_id)
+    Maquinaria.objects.bulk_update(maquinas, ['ubicacion_actual'], batch_size=500)
+    # Sólo se alterna entre Disponible y En ruta; otros estados (mantenimiento) se respetan
+    Vehiculo.objects.filter(pk__in=en_ruta, estado__iexact='disponible').update(estado='En ruta')
+    Vehiculo.objects.filter(pk__in=detenidos, estado__iexact='en ruta').update(estado='Disponible')
+
+
+def serie(dispositivo_id, desde, hasta, granularidad=None):
+    """
+    Serie de un dispositivo en [desde, hasta). Sin granularidad se elige
+    según la amplitud del tramo: lecturas, resúmenes por minuto o por hora.
+    """
+    if granularidad is None:
+        amplitud = hasta - desde
+        granularidad = (
+            'lectura' if amplitud <= SERIE_MAXIMA_LECTURAS
+            else 'minuto' if amplitud <= SERIE_MAXIMA_MINUTOS
+            else 'hora'
+        )
+    if granularidad == 'lectura':
+        puntos = list(
+            LecturaTelemetria.objects
+            .filter(dispositivo_id=dispositivo_id, momento__gte=desde, momento__lt=hasta)
+            .order_by('momento')
+            .values('momento', 'latitud', 'longitud', 'velocidad', 'horas_motor')
+        )
+        return granularidad, puntos
+    if granularidad not in GRANULARIDADES:
+        raise ValueError(f"Granularidad desconocida: {granularidad}")
+    puntos = list(
+        ResumenTelemetria.objects
+        .filter(dispositivo_id=dispositivo_id, granularidad=granularidad, inicio__gte=desde, inicio__lt=hasta)
+        .order_by('inicio')
+        .values('inicio', 'lecturas', 'velocidad_maxima', 'horas_motor_min', 'horas_motor_max', 'latitud', 'longitud',
+                'suma_velocidad', 'lecturas_velocidad')
+    )
+    for punto in puntos:
+        suma, n = punto.pop('suma_velocidad'), punto.pop('lecturas_velocidad')
+        punto['velocidad_media'] = suma / n if n else None
+    return granularidad, puntos
+
+
+def depurar(ahora=None, lote=10000):
+    """
+    Borra por lotes las lecturas con más de TELEMETRIA_DIAS_LECTURAS días y
+    los resúmenes por minuto con más de TELEMETRIA_DIAS_RESUMEN_MINUTO. Los
+    resúmenes por hora se conservan. Devuelve (lecturas, resúmenes) borrados.
+    """
+    ahora = ahora or timezone.now()
+    limite_lecturas = ahora - datetime.timedelta(days=getattr(settings, 'TELEMETRIA_DIAS_LECTURAS', 30))
+    limite_minutos = ahora - datetime.timedelta(days=getattr(settings, 'TELEMETRIA_DIAS_RESUMEN_MINUTO', 90))
+    return (
+        _borrar_por_lotes(LecturaTelemetria.objects.filter(momento__lt=limite_lecturas), lote),
+        _borrar_por_lotes(ResumenTelemetria.objects.filter(granularidad='minuto', inicio__lt=limite_minutos), lote),
+    )
+
+
+def _borrar_por_lotes(consulta, lote):
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(consulta.values_list('pk', flat=True)[:lote])
+            if not ids:
+                return total
+            total += consulta.model.objects.filter(pk__in=ids).delete()[0]
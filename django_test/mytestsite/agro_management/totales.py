@@ -0,0 +1,163 @@
+"""
+Totales mantenidos de pedidos y facturas.
+
+Pedido.total, Pedido.lineas y Pedido.peso_total acumulan el importe neto
+(subtotal menos descuento), el número y los kilogramos (cantidad ×
+capacidad de la presentación) de sus DetallePedido; Factura.pagado y Factura.saldo
+acumulan sus Pago. Cada alta, modificación o baja de una línea o un pago
+aplica sólo su diferencia con incrementos atómicos (F), en la misma
+transacción que el cambio, de modo que los listados leen los totales sin
+agregar las líneas. Una factura emitida pasa a pagada cuando su saldo llega a
+cero.
+
+Las operaciones masivas que no emiten señales (QuerySet.update, bulk_create)
+y los cambios de presentación de un producto dejan los totales desfasados; reconciliar_pedidos() y reconciliar_facturas()
+los recalculan en bloque con una sentencia UPDATE por tabla.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .atp import expresion_kg_por_unidad, kg_por_unidad
+from .models import DetallePedido, Factura, Pago, Pedido, ProductoTerminado
+
+CERO = Decimal('0')
+
+# Columnas mantenidas por este módulo: nunca se escriben desde save() del padre
+CAMPOS_PEDIDO = ('total', 'lineas', 'peso_total')
+CAMPOS_FACTURA = ('pagado', 'saldo')
+
+
+def _importe(valor):
+    return Decimal(valor or 0)
+
+
+def _delta(cambios, campo, output_field):
+    return Case(
+        *[When(pk=pk, then=Value(valores[campo])) for pk, valores in cambios.items()],
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def campos_actualizables(instancia, mantenidos):
+    """
+    Campos que save() puede escribir en una instancia ya guardada: todos
+    salvo la clave primaria y las columnas mantenidas, para que una
+    instancia cargada antes de un cambio en sus líneas no las sobrescriba.
+    """
+    return [
+        campo.attname for campo in instancia._meta.concrete_fields
+        if not campo.primary_key and campo.name not in mantenidos
+    ]
+
+
+def kg_por_producto(producto_ids):
+    """Kilogramos por unidad de cada producto según su presentación."""
+    return {
+        pk: kg_por_unidad(capacidad, unidad)
+        for pk, capacidad, unidad in ProductoTerminado.objects.filter(pk__in=producto_ids).values_list(
+            'pk', 'presentacion__capacidad', 'presentacion__unidad_medida',
+        )
+    }
+
+
+def cambios_por_detalle(detalle, anterior=None, signo=1):
+    """Devuelve los deltas {pedido_id: {'total', 'lineas', 'peso'}} de guardar o eliminar una línea."""
+    kg = kg_por_producto({detalle.producto_id, anterior['producto_id']} if anterior else {detalle.producto_id})
+    cambios = defaultdict(lambda: {'total': CERO, 'lineas': 0, 'peso': CERO})
+    if anterior:
+        cambios[anterior['pedido_id']]['total'] -= _importe(anterior['subtotal']) - _importe(anterior['descuento'])
+        cambios[anterior['pedido_id']]['lineas'] -= 1
+        cambios[anterior['pedido_id']]['peso'] -= _importe(anterior['cantidad']) * kg.get(anterior['producto_id'], CERO)
+    cambios[detalle.pedido_id]['total'] += signo * (_importe(detalle.subtotal) - _importe(detalle.descuento))
+    cambios[detalle.pedido_id]['lineas'] += signo
+    cambios[detalle.pedido_id]['peso'] += signo * _importe(detalle.cantidad) * kg.get(detalle.producto_id, CERO)
+    return cambios
+
+
+def cambios_por_pago(pago, anterior=None, signo=1):
+    """Devuelve los deltas {factura_id: {'pagado'}} de guardar o eliminar un pago."""
+    cambios = defaultdict(lambda: {'pagado': CERO})
+    if anterior:
+        cambios[anterior['factura_id']]['pagado'] -= _importe(anterior['monto'])
+    cambios[pago.factura_id]['pagado'] += signo * _importe(pago.monto)
+    return cambios
+
+
+def ajustar_pedidos(cambios):
+    """Aplica los deltas de total, líneas y peso a varios pedidos en una sola sentencia UPDATE."""
+    cambios = {pk: valores for pk, valores in cambios.items() if any(valores.values())}
+    if not cambios:
+        return 0
+    return Pedido.objects.filter(pk__in=cambios).update(
+        total=F('total') + _delta(cambios, 'total', DecimalField(max_digits=12, decimal_places=2)),
+        lineas=F('lineas') + _delta(cambios, 'lineas', IntegerField()),
+        peso_total=F('peso_total') + _delta(cambios, 'peso', DecimalField(max_digits=12, decimal_places=2)),
+    )
+
+
+def ajustar_facturas(cambios):
+    """Aplica los deltas de lo pagado a varias facturas en una sola sentencia UPDATE."""
+    cambios = {pk: valores for pk, valores in cambios.items() if valores['pagado']}
+    if not cambios:
+        return 0
+    delta = _delta(cambios, 'pagado', DecimalField(max_digits=12, decimal_places=2))
+    actualizadas = Factura.objects.filter(pk__in=cambios).update(
+        pagado=F('pagado') + delta,
+        saldo=F('saldo') - delta,
+    )
+    actualizar_estados(cambios)
+    return actualizadas
+
+
+def actualizar_estados(factura_ids=None):
+    """
+    Marca como pagadas las facturas emitidas cuyo saldo llegó a cero y
+    devuelve a emitidas las pagadas que vuelven a tener saldo (un pago
+    anulado o corregido). Las facturas anuladas no cambian.
+    """
+    facturas = Factura.objects.all() if factura_ids is None else Factura.objects.filter(pk__in=factura_ids)
+    facturas.filter(estado='emitida', saldo__lte=0).update(estado='pagada')
+    facturas.filter(estado='pagada', saldo__gt=0).update(estado='emitida')
+
+
+@transaction.atomic
+def reconciliar_pedidos(pedido_ids=None):
+    """Recalcula total, lineas y peso_total de los pedidos indicados (o de todos) desde sus líneas."""
+    detalles = DetallePedido.objects.filter(pedido=OuterRef('pk')).order_by().values('pedido')
+    pedidos = Pedido.objects.all() if pedido_ids is None else Pedido.objects.filter(pk__in=pedido_ids)
+    return pedidos.update(
+        total=Coalesce(
+            Subquery(detalles.annotate(neto=Sum(F('subtotal') - F('descuento'))).values('neto')),
+            Value(CERO),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        lineas=Coalesce(Subquery(detalles.annotate(n=Count('pk')).values('n')), Value(0)),
+        peso_total=Coalesce(
+            Subquery(detalles.annotate(
+                kg=Sum(F('cantidad') * expresion_kg_por_unidad('producto__presentacion')),
+            ).values('kg')),
+            Value(CERO),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+
+
+@transaction.atomic
+def reconciliar_facturas(factura_ids=None):
+    """Recalcula pagado y saldo de las facturas indicadas (o de todas) desde sus pagos."""
+    pagos = Pago.objects.filter(factura=OuterRef('pk')).order_by().values('factura').annotate(suma=Sum('monto'))
+    pagado = Coalesce(
+        Subquery(pagos.values('suma')),
+        Value(CERO),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    facturas = Factura.objects.all() if factura_ids is None else Factura.objects.filter(pk__in=factura_ids)
+    actualizadas = facturas.update(pagado=pagado, saldo=F('total') - pagado)
+    actualizar_estados(factura_ids)
+    return actualizadas
@@ -0,0 +1,217 @@
+"""
+Trazabilidad de insumos a clientes para retiros de producto.
+
+El linaje tiene una profundidad fija:
+
+    LoteInsumo → UsoInsumo → LaborAgricola → Cultivo → ProductoTerminado
+        → DetallePedido → Pedido → Cliente / Envio
+
+Cada salto es una clave foránea indexada, así que tanto la traza hacia
+adelante (lote → clientes y envíos) como hacia atrás (producto → lotes,
+parcela y trabajadores) se resuelven con una consulta con JOIN por nivel, sin
+tabla de cierre ni recorridos objeto a objeto. Un insumo sólo alcanza a los
+productos procesados a partir de su primera aplicación en el cultivo.
+"""
+
+import csv
+import io
+from collections import defaultdict
+
+from django.db.models import Min, Sum
+
+from .models import (
+    AsignacionLabor, DetallePedido, Envio, ProductoTerminado, UsoInsumo, UsoMaquinaria,
+)
+
+COLUMNAS_RETIRO = [
+    'Lotes insumo', 'Producto', 'Lote producción', 'Pedido', 'Fecha pedido', 'Estado pedido',
+    'Cliente', 'RUC/DNI', 'Teléfono', 'Email', 'Cantidad', 'Envíos',
+]
+
+
+def _ids(lotes):
+    if hasattr(lotes, 'values_list'):
+        return list(lotes.values_list('pk', flat=True))
+    return [getattr(lote, 'pk', lote) for lote in lotes]
+
+
+def productos_afectados(lotes):
+    """
+    Productos terminados alcanzados por los lotes indicados.
+
+    Devuelve un diccionario {producto_id: fila} donde cada fila incluye los
+    códigos de los lotes de insumo que lo alcanzan.
+    """
+    aplicaciones = defaultdict(list)
+    for cultivo_id, codigo_lote, primer_uso in (
+            UsoInsumo.objects
+            .filter(lote_insumo__in=_ids(lotes))
+            .values_list('labor__cultivo_id', 'lote_insumo__codigo_lote')
+            .annotate(primer_uso=Min('fecha_uso'))
+            .order_by()):
+        aplicaciones[cultivo_id].append((codigo_lote, primer_uso))
+
+    productos = {}
+    for fila in (
+            ProductoTerminado.objects
+            .filter(cultivo__in=aplicaciones)
+            .values('pk', 'codigo', 'lote_produccion', 'fecha_procesamiento', 'cultivo_id', 'cantidad')):
+        lotes_producto = sorted(
+            codigo for codigo, primer_uso in aplicaciones[fila['cultivo_id']]
+            if primer_uso <= fila['fecha_procesamiento']
+        )
+        if lotes_producto:
+            productos[fila['pk']] = dict(fila, lotes=lotes_producto)
+    return productos
+
+
+def rastrear_lotes(lotes):
+    """
+    Traza hacia adelante: productos, pedidos, clientes y envíos alcanzados
+    por uno o varios lotes de insumo.
+    """
+    productos = productos_afectados(lotes)
+    detalles = list(
+        DetallePedido.objects
+        .filter(producto__in=productos)
+        .values(
+            'producto_id', 'cantidad', 'pedido_id', 'pedido__codigo', 'pedido__fecha_pedido',
+            'pedido__estado', 'pedido__cliente_id', 'pedido__cliente__nombre',
+            'pedido__cliente__ruc_dni', 'pedido__cliente__telefono', 'pedido__cliente__email',
+        )
+        .order_by('pedido__cliente__nombre', 'pedido__codigo')
+    )
+    envios_por_pedido = defaultdict(list)
+    envios = {}
+    for pedido_id, envio_id, codigo, estado, fecha in (
+            Envio.pedidos.through.objects
+            .filter(pedido__in={detalle['pedido_id'] for detalle in detalles})
+            .values_list('pedido_id', 'envio_id', 'envio__codigo', 'envio__estado', 'envio__fecha_programada')):
+        envios_por_pedido[pedido_id].append(codigo)
+        envios[envio_id] = {'codigo': codigo, 'estado': estado, 'fecha_programada': fecha}
+
+    clientes = {}
+    for detalle in detalles:
+        clientes[detalle['pedido__cliente_id']] = {
+            'nombre': detalle['pedido__cliente__nombre'],
+            'ruc_dni': detalle['pedido__cliente__ruc_dni'],
+            'telefono': detalle['pedido__cliente__telefono'],
+            'email': detalle['pedido__cliente__email'],
+        }
+    return {
+        'productos': list(productos.values()),
+        'detalles': [
+            dict(detalle, lotes=productos[detalle['producto_id']]['lotes'],
+                 producto=productos[detalle['producto_id']],
+                 envios=sorted(envios_por_pedido[detalle['pedido_id']]))
+            for detalle in detalles
+        ],
+        'clientes': list(clientes.values()),
+        'envios': list(envios.values()),
+    }
+
+
+def lista_retiro(lotes):
+    """Filas de la lista de retiro (una por línea de pedido alcanzada)."""
+    return [
+        [
+            ' '.join(detalle['lotes']),
+            detalle['producto']['codigo'],
+            detalle['producto']['lote_produccion'],
+            detalle['pedido__codigo'],
+            detalle['pedido__fecha_pedido'].isoformat(),
+            detalle['pedido__estado'],
+            detalle['pedido__cliente__nombre'],
+            detalle['pedido__cliente__ruc_dni'],
+            detalle['pedido__cliente__telefono'],
+            detalle['pedido__cliente__email'],
+            detalle['cantidad'],
+            ' '.join(detalle['envios']),
+        ]
+        for detalle in rastrear_lotes(lotes)['detalles']
+    ]
+
+
+def exportar_lista_retiro(lotes):
+    """Lista de retiro en CSV (bytes UTF-8)."""
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(COLUMNAS_RETIRO)
+    escritor.writerows(lista_retiro(lotes))
+    return salida.getvalue().encode('utf-8')
+
+
+def rastrear_producto(codigo):
+    """
+    Traza hacia atrás: lotes de insumo, parcela y trabajadores que
+    intervinieron en un producto terminado hasta su procesamiento.
+    """
+    producto = (
+        ProductoTerminado.objects
+        .select_related('cultivo__parcela', 'cultivo__variedad')
+        .get(codigo=codigo)
+    )
+    cultivo = producto.cultivo
+    labores = {'labor__cultivo': cultivo, 'labor__fecha_realizacion__lte': producto.fecha_procesamiento}
+
+    # Misma regla que productos_afectados: cuenta la fecha de aplicación del
+    # insumo, no la de la labor a la que se registró
+    lotes = list(
+        UsoInsumo.objects
+        .filter(labor__cultivo=cultivo, fecha_uso__lte=producto.fecha_procesamiento)
+        .values(
+            'lote_insumo_id', 'lote_insumo__codigo_lote', 'lote_insumo__insumo__nombre',
+            'lote_insumo__proveedor', 'lote_insumo__proveedor_registrado__nombre',
+        )
+        .annotate(cantidad=Sum('cantidad'), primer_uso=Min('fecha_uso'))
+        .order_by('primer_uso')
+    )
+    trabajadores = {}
+    for trabajador_id, codigo_trabajador, nombre, rol in (
+            AsignacionLabor.objects
+            .filter(**labores)
+            .values_list('trabajador_id', 'trabajador__codigo', 'trabajador__nombre_completo', 'rol')
+            .distinct()):
+        trabajador = trabajadores.setdefault(trabajador_id, {
+            'codigo': codigo_trabajador, 'nombre': nombre, 'roles': set(),
+        })
+        trabajador['roles'].add(rol)
+    for trabajador_id, codigo_trabajador, nombre in (
+            UsoMaquinaria.objects
+            .filter(operador__isnull=False, **labores)
+            .values_list('operador_id', 'operador__codigo', 'operador__nombre_completo')
+            .distinct()):
+        trabajador = trabajadores.setdefault(trabajador_id, {
+            'codigo': codigo_trabajador, 'nombre': nombre, 'roles': set(),
+        })
+        trabajador['roles'].add('Operador de maquinaria')
+
+    return {
+        'producto': {
+            'codigo': producto.codigo,
+            'lote_produccion': producto.lote_produccion,
+            'fecha_procesamiento': producto.fecha_procesamiento,
+        },
+        'cultivo': {
+            'id': cultivo.pk,
+            'variedad': str(cultivo.variedad),
+            'fecha_siembra': cultivo.fecha_siembra,
+            'fecha_cosecha_real': cultivo.fecha_cosecha_real,
+        },
+        'parcela': {'codigo': cultivo.parcela.codigo, 'nombre': cultivo.parcela.nombre},
+        'lotes': [
+            {
+                'id': fila['lote_insumo_id'],
+                'codigo_lote': fila['lote_insumo__codigo_lote'],
+                'insumo': fila['lote_insumo__insumo__nombre'],
+                'proveedor': fila['lote_insumo__proveedor_registrado__nombre'] or fila['lote_insumo__proveedor'],
+                'cantidad': fila['cantidad'],
+                'primer_uso': fila['primer_uso'],
+            }
+            for fila in lotes
+        ],
+        'trabajadores': [
+            dict(trabajador, roles=sorted(trabajador['roles']))
+            for trabajador in sorted(trabajadores.values(), key=lambda t: t['codigo'])
+        ],
+    }
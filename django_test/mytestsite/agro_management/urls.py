@@ -0,0 +1,75 @@
+"""
+Rutas URL de la aplicación agro_management.
+"""
+
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    # API de asignación de labores
+    path('api/asignaciones/proponer/', views.api_proponer_asignaciones, name='api_proponer_asignaciones'),
+    path('api/asignaciones/crear/', views.api_crear_asignaciones, name='api_crear_asignaciones'),
+    
+    # API de cumplimiento de capacitaciones
+    path('api/capacitaciones/brechas/', views.api_brechas_capacitacion, name='api_brechas_capacitacion'),
+    path('api/capacitaciones/por-vencer/', views.api_capacitaciones_por_vencer, name='api_capacitaciones_por_vencer'),
+    
+    # API de proveedores
+    path('api/proveedores/ranking/', views.api_ranking_proveedores, name='api_ranking_proveedores'),
+    
+    # API de trazabilidad
+    path('api/trazabilidad/lotes/<int:pk>/', views.api_trazar_lote, name='api_trazar_lote'),
+    path('api/trazabilidad/lotes/<int:pk>/retiro.csv', views.api_lista_retiro, name='api_lista_retiro'),
+    path('api/trazabilidad/productos/<str:codigo>/', views.api_trazar_producto, name='api_trazar_producto'),
+    
+    # API de disponible para prometer
+    path('api/atp/promesa/', views.api_fecha_promesa, name='api_fecha_promesa'),
+    
+    # API de ocupación de parcelas
+    path('api/parcelas/libres/', views.api_parcelas_libres, name='api_parcelas_libres'),
+    
+    # API de consultas espaciales (tipo: parcelas o fuentes-agua)
+    path('api/geo/<str:tipo>/caja/', views.api_geo_caja, name='api_geo_caja'),
+    path('api/geo/<str:tipo>/radio/', views.api_geo_radio, name='api_geo_radio'),
+    path('api/geo/<str:tipo>/cercanos/', views.api_geo_cercanos, name='api_geo_cercanos'),
+    
+    # API de cuentas por cobrar
+    path('api/cobranzas/antiguedad/', views.api_antiguedad_saldos, name='api_antiguedad_saldos'),
+    path('api/cobranzas/evolucion/', views.api_evolucion_saldos, name='api_evolucion_saldos'),
+    path('api/cobranzas/remesas/', views.api_aplicar_remesa, name='api_aplicar_remesa'),
+    
+    # API de consolidación y secuencia de envíos
+    path('api/envios/consolidar/', views.api_consolidar_envios, name='api_consolidar_envios'),
+    path('api/envios/<int:pk>/planificar/', views.api_planificar_envio, name='api_planificar_envio'),
+    
+    # API de transiciones de estado en bloque (pedido, envio, factura, mantenimiento)
+    path('api/estados/<str:modelo>/', views.api_transicionar, name='api_transicionar'),
+    
+    # API de facturación en lote de pedidos entregados
+    path('api/facturacion/pedidos-entregados/', views.api_facturar_pedidos, name='api_facturar_pedidos'),
+    
+    # API de telemetría (la ingesta se autentica con el token del dispositivo)
+    path('api/telemetria/lecturas/', views.api_ingerir_telemetria, name='api_ingerir_telemetria'),
+    path('api/telemetria/estado/', views.api_estado_telemetria, name='api_estado_telemetria'),
+    path('api/telemetria/<str:codigo>/serie/', views.api_serie_telemetria, name='api_serie_telemetria'),
+    
+    # API de sensores de campo
+    path('api/sensores/lecturas/', views.api_registrar_lecturas_sensores, name='api_registrar_lecturas_sensores'),
+    path('api/sensores/parcelas/', views.api_sensores_por_parcela, name='api_sensores_por_parcela'),
+    path('api/sensores/<str:codigo>/serie/', views.api_serie_sensor, name='api_serie_sensor'),
+    path('api/riego/balance/', views.api_balance_riego, name='api_balance_riego'),
+    
+    # API de fenología por grados-día
+    path('api/cultivos/<int:pk>/fenologia/', views.api_fenologia_cultivo, name='api_fenologia_cultivo'),
+    
+    # API de lectura asíncrona
+    path('api/dashboard/', views.api_dashboard, name='api_dashboard'),
+    path('api/parcelas/', views.api_parcelas, name='api_parcelas'),
+    path('api/parcelas/<int:pk>/', views.api_parcela, name='api_parcela'),
+    path('api/cultivos/', views.api_cultivos, name='api_cultivos'),
+    path('api/cultivos/<int:pk>/', views.api_cultivo, name='api_cultivo'),
+    
+    # API de eventos de estado de pedidos y envíos (SSE, requiere ASGI)
+    path('api/eventos/estado/', views.api_eventos_estado, name='api_eventos_estado'),
+]
@@ -3,9 +3,27 @@ from django.views.generic import ListView, DetailView, CreateView, UpdateView, D
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Sum, Avg, Count
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from django.conf import settings
+from django.db import connection, connections
+from asgiref.sync import sync_to_async
+import asyncio
 import datetime
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from .asignacion import crear_asignaciones, labores_del_periodo, proponer_asignaciones
+from . import cumplimiento
+from .proveedores import ranking_proveedores
+from . import atp, cobranzas, envios, estados, eventos, facturacion, geometria, parcelas, rutas, sensores, telemetria, trazabilidad
 
 from .models import (
     # Cultivo
@@ -28,7 +46,7 @@ from .models import (
     Maquinaria, MantenimientoMaquinaria, UsoMaquinaria, TipoCosto,
     CostoOperativo, Presupuesto, LineaPresupuesto, InformeFinanciero,
     AnalisisRentabilidad, Proveedor, ContactoProveedor, Contrato_Proveedor,
-    EvaluacionProveedor
+    EvaluacionProveedor, DispositivoTelemetria, EstadoDispositivo, Sensor, PrediccionEtapa
 )
 
 # Dashboard
@@ -145,4 +163,732 @@ class AnalisisSueloCreateView(LoginRequiredMixin, CreateView):
     model = AnalisisSuelo
     template_name = 'agro_management/analisis_suelo_form.html'
     fields = ['parcela', 'fecha_analisis', 'ph', 'materia_organica', 'nitratos', 'fosfatos', 'potasio', 'calcio', 'magnesio', 'sodio', 'sulfatos']
-    success_url = reverse_lazy('parcela_list')
\ No newline at end of file
+    success_url = reverse_lazy('parcela_list')
+
+# ---- API ----
+
+def _fechas_de_peticion(request):
+    datos = request.GET if request.method == 'GET' else request.POST
+    try:
+        fecha_inicio = datetime.date.fromisoformat(datos['fecha_inicio'])
+        fecha_fin = datetime.date.fromisoformat(datos.get('fecha_fin') or datos['fecha_inicio'])
+    except (KeyError, ValueError):
+        return None, None
+    return fecha_inicio, fecha_fin
+
+# Asignación de labores
+@login_required
+@require_GET
+def api_proponer_asignaciones(request):
+    fecha_inicio, fecha_fin = _fechas_de_peticion(request)
+    if fecha_inicio is None:
+        return JsonResponse({'error': 'Indique fecha_inicio (y opcionalmente fecha_fin) en formato AAAA-MM-DD'}, status=400)
+    propuesta = proponer_asignaciones(labores_del_periodo(fecha_inicio, fecha_fin))
+    return JsonResponse(propuesta)
+
+@login_required
+@require_POST
+def api_crear_asignaciones(request):
+    fecha_inicio, fecha_fin = _fechas_de_peticion(request)
+    if fecha_inicio is None:
+        return JsonResponse({'error': 'Indique fecha_inicio (y opcionalmente fecha_fin) en formato AAAA-MM-DD'}, status=400)
+    propuesta = proponer_asignaciones(labores_del_periodo(fecha_inicio, fecha_fin))
+    creadas = crear_asignaciones(propuesta, rol=request.POST.get('rol') or 'Operario')
+    return JsonResponse({'creadas': len(creadas), 'sin_cubrir': propuesta['sin_cubrir']}, status=201)
+
+# Cumplimiento de capacitaciones
+@login_required
+@require_GET
+def api_brechas_capacitacion(request):
+    hoy = timezone.localdate()
+    try:
+        cargo = int(request.GET['cargo']) if request.GET.get('cargo') else None
+        capacitacion = int(request.GET['capacitacion']) if request.GET.get('capacitacion') else None
+    except ValueError:
+        return JsonResponse({'error': 'cargo y capacitacion deben ser números enteros'}, status=400)
+    filas = cumplimiento.brechas(hoy=hoy, cargo=cargo, capacitacion=capacitacion)
+    brechas = [
+        {
+            'trabajador': fila.trabajador.codigo,
+            'nombre': fila.trabajador.nombre_completo,
+            'cargo': fila.trabajador.cargo.nombre,
+            'capacitacion': fila.capacitacion.nombre,
+            'estado': 'vencida' if fila.fecha_vencimiento and fila.fecha_vencimiento < hoy else fila.estado,
+            'fecha_vencimiento': fila.fecha_vencimiento,
+        }
+        for fila in filas
+    ]
+    return JsonResponse({'brechas': brechas})
+
+@login_required
+@require_GET
+def api_capacitaciones_por_vencer(request):
+    try:
+        dias = int(request.GET.get('dias', 30))
+    except ValueError:
+        return JsonResponse({'error': 'dias debe ser un número entero'}, status=400)
+    filas = cumplimiento.por_vencer(dias=dias)
+    return JsonResponse({'por_vencer': [
+        {
+            'trabajador': fila.trabajador.codigo,
+            'capacitacion': fila.capacitacion.nombre,
+            'fecha_vencimiento': fila.fecha_vencimiento,
+        }
+        for fila in filas
+    ]})
+
+# Ranking de proveedores
+@login_required
+@require_GET
+def api_ranking_proveedores(request):
+    try:
+        limite = int(request.GET.get('limite', 20))
+    except ValueError:
+        return JsonResponse({'error': 'limite debe ser un número entero'}, status=400)
+    return JsonResponse({'ranking': [
+        {
+            'proveedor': fila.proveedor.codigo,
+            'nombre': fila.proveedor.nombre,
+            'puntuacion': fila.puntuacion,
+            'promedio_90': fila.promedio_90,
+            'evaluaciones_90': fila.evaluaciones_90,
+            'promedio_365': fila.promedio_365,
+            'evaluaciones_365': fila.evaluaciones_365,
+            'tasa_caducidad': fila.tasa_caducidad,
+            'tasa_consumo': fila.tasa_consumo,
+        }
+        for fila in ranking_proveedores(limite)
+    ]})
+
+# Trazabilidad
+@login_required
+@require_GET
+def api_trazar_lote(request, pk):
+    lote = get_object_or_404(LoteInsumo, pk=pk)
+    traza = trazabilidad.rastrear_lotes([lote])
+    return JsonResponse({
+        'lote': lote.codigo_lote,
+        'productos': [
+            {'codigo': p['codigo'], 'lote_produccion': p['lote_produccion'], 'fecha_procesamiento': p['fecha_procesamiento']}
+            for p in traza['productos']
+        ],
+        'pedidos': [
+            {
+                'pedido': d['pedido__codigo'],
+                'estado': d['pedido__estado'],
+                'cliente': d['pedido__cliente__nombre'],
+                'producto': d['producto']['codigo'],
+                'cantidad': d['cantidad'],
+                'envios': d['envios'],
+            }
+            for d in traza['detalles']
+        ],
+        'clientes': traza['clientes'],
+        'envios': traza['envios'],
+    })
+
+@login_required
+@require_GET
+def api_lista_retiro(request, pk):
+    lote = get_object_or_404(LoteInsumo, pk=pk)
+    respuesta = HttpResponse(trazabilidad.exportar_lista_retiro([lote]), content_type='text/csv; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="retiro_{lote.codigo_lote}.csv"'
+    return respuesta
+
+@login_required
+@require_GET
+def api_trazar_producto(request, codigo):
+    try:
+        traza = trazabilidad.rastrear_producto(codigo)
+    except ProductoTerminado.DoesNotExist:
+        return JsonResponse({'error': f'No existe el producto {codigo}'}, status=404)
+    return JsonResponse(traza)
+
+# Disponible para prometer
+@login_required
+@require_POST
+def api_fecha_promesa(request):
+    productos = request.POST.getlist('producto')
+    cantidades = request.POST.getlist('cantidad')
+    try:
+        lineas = [(int(producto), Decimal(cantidad)) for producto, cantidad in zip(productos, cantidades, strict=True)]
+        fecha = request.POST.get('fecha_entrega_solicitada')
+        fecha = datetime.date.fromisoformat(fecha) if fecha else None
+    except (ValueError, InvalidOperation):
+        return JsonResponse({'error': 'Indique pares producto/cantidad válidos y la fecha en formato AAAA-MM-DD'}, status=400)
+    if not lineas:
+        return JsonResponse({'error': 'El pedido no tiene líneas'}, status=400)
+    try:
+        promesa = atp.prometer(lineas, fecha_solicitada=fecha)
+    except ProductoTerminado.DoesNotExist as error:
+        return JsonResponse({'error': str(error)}, status=404)
+    return JsonResponse(promesa)
+
+# Ocupación de parcelas
+@login_required
+@require_GET
+def api_parcelas_libres(request):
+    fecha_inicio, fecha_fin = _fechas_de_peticion(request)
+    if fecha_inicio is None:
+        return JsonResponse({'error': 'Indique fecha_inicio (y opcionalmente fecha_fin) en formato AAAA-MM-DD'}, status=400)
+    try:
+        area = Decimal(request.GET.get('area', '0'))
+    except InvalidOperation:
+        return JsonResponse({'error': 'area debe ser un número'}, status=400)
+    return JsonResponse({'parcelas': parcelas.parcelas_libres(area, fecha_inicio, fecha_fin)})
+
+# Consultas espaciales
+MODELOS_GEO = {'parcelas': Parcela, 'fuentes-agua': FuenteAgua}
+
+def _objeto_geo(objeto, distancia=None):
+    datos = {
+        'id': objeto.pk,
+        'codigo': getattr(objeto, 'codigo', None),
+        'nombre': objeto.nombre,
+        'latitud': objeto.latitud,
+        'longitud': objeto.longitud,
+    }
+    if distancia is not None:
+        datos['distancia_m'] = round(distancia, 1)
+    return datos
+
+def _parametros_float(request, *nombres):
+    try:
+        return [float(request.GET[nombre]) for nombre in nombres]
+    except (KeyError, ValueError):
+        return None
+
+@login_required
+@require_GET
+def api_geo_caja(request, tipo):
+    modelo = MODELOS_GEO.get(tipo)
+    if modelo is None:
+        return JsonResponse({'error': f'Tipo desconocido: {tipo}'}, status=404)
+    caja = _parametros_float(request, 'min_lon', 'min_lat', 'max_lon', 'max_lat')
+    if caja is None:
+        return JsonResponse({'error': 'Indique min_lon, min_lat, max_lon y max_lat'}, status=400)
+    return JsonResponse({'resultados': [_objeto_geo(objeto) for objeto in geometria.en_caja(modelo, *caja)]})
+
+@login_required
+@require_GET
+def api_geo_radio(request, tipo):
+    modelo = MODELOS_GEO.get(tipo)
+    if modelo is None:
+        return JsonResponse({'error': f'Tipo desconocido: {tipo}'}, status=404)
+    parametros = _parametros_float(request, 'lat', 'lon', 'metros')
+    if parametros is None:
+        return JsonResponse({'error': 'Indique lat, lon y metros'}, status=400)
+    return JsonResponse({'resultados': [
+        _objeto_geo(objeto, distancia) for distancia, objeto in geometria.en_radio(modelo, *parametros)
+    ]})
+
+@login_required
+@require_GET
+def api_geo_cercanos(request, tipo):
+    modelo = MODELOS_GEO.get(tipo)
+    if modelo is None:
+        return JsonResponse({'error': f'Tipo desconocido: {tipo}'}, status=404)
+    parametros = _parametros_float(request, 'lat', 'lon')
+    try:
+        k = int(request.GET.get('k', 1))
+    except ValueError:
+        parametros = None
+    if parametros is None:
+        return JsonResponse({'error': 'Indique lat, lon y opcionalmente k'}, status=400)
+    return JsonResponse({'resultados': [
+        _objeto_geo(objeto, distancia) for distancia, objeto in geometria.mas_cercanos(modelo, *parametros, k=k)
+    ]})
+
+# Cuentas por cobrar
+def _cliente_antiguedad(fila):
+    datos = {'cliente': fila['pedido__cliente_id'], 'nombre': fila['pedido__cliente__nombre']}
+    datos.update({campo: fila[campo] for campo in cobranzas.CAMPOS_SALDO})
+    return datos
+
+@login_required
+@require_GET
+def api_antiguedad_saldos(request):
+    try:
+        fecha = request.GET.get('fecha')
+        fecha = datetime.date.fromisoformat(fecha) if fecha else timezone.localdate()
+    except ValueError:
+        return JsonResponse({'error': 'La fecha debe tener formato AAAA-MM-DD'}, status=400)
+    return JsonResponse({
+        'fecha': fecha,
+        'total': cobranzas.antiguedad_total(fecha),
+        'clientes': [_cliente_antiguedad(fila) for fila in cobranzas.antiguedad_por_cliente(fecha)],
+    })
+
+@login_required
+@require_GET
+def api_evolucion_saldos(request):
+    fecha_inicio, fecha_fin = _fechas_de_peticion(request)
+    if fecha_inicio is None:
+        return JsonResponse({'error': 'Indique fecha_inicio (y opcionalmente fecha_fin) en formato AAAA-MM-DD'}, status=400)
+    try:
+        cliente = int(request.GET['cliente']) if request.GET.get('cliente') else None
+    except ValueError:
+        return JsonResponse({'error': 'cliente debe ser un número entero'}, status=400)
+    return JsonResponse({'evolucion': cobranzas.evolucion(fecha_inicio, fecha_fin, cliente)})
+
+@login_required
+@require_POST
+def api_aplicar_remesa(request):
+    archivo = request.FILES.get('archivo')
+    metodo_pago = request.POST.get('metodo_pago', '').strip()
+    try:
+        fecha = request.POST.get('fecha')
+        fecha = datetime.date.fromisoformat(fecha) if fecha else timezone.localdate()
+    except ValueError:
+        return JsonResponse({'error': 'La fecha debe tener formato AAAA-MM-DD'}, status=400)
+    if archivo is None or not metodo_pago:
+        return JsonResponse({'error': 'Adjunte el archivo CSV de la remesa e indique metodo_pago'}, status=400)
+    filas = cobranzas.leer_remesa(io.TextIOWrapper(archivo, encoding='utf-8-sig'))
+    resultado = cobranzas.aplicar_remesa(
+        filas, fecha, metodo_pago, referencia=request.POST.get('referencia', '').strip(),
+    )
+    return JsonResponse(resultado)
+
+# Consolidación de envíos
+@login_required
+@require_POST
+def api_consolidar_envios(request):
+    fecha_inicio, fecha_fin = _fechas_de_peticion(request)
+    if fecha_inicio is None:
+        return JsonResponse({'error': 'Indique fecha_inicio (y opcionalmente fecha_fin) en formato AAAA-MM-DD'}, status=400)
+    if request.POST.get('simular'):
+        return JsonResponse(envios.planificar(fecha_inicio, fecha_fin))
+    return JsonResponse(envios.consolidar(fecha_inicio, fecha_fin), status=201)
+
+@login_required
+@require_POST
+def api_planificar_envio(request, pk):
+    envio = get_object_or_404(Envio, pk=pk)
+    try:
+        rutas.planificar_envios([envio.pk])
+    except ImproperlyConfigured as error:
+        return JsonResponse({'error': str(error)}, status=503)
+    return JsonResponse({'envio': envio.codigo, 'paradas': list(
+        envio.paradas.order_by('orden').values(
+            'orden', 'pedido__codigo', 'pedido__direccion_entrega', 'distancia_acumulada',
+            'minutos_llegada', 'llegada_estimada',
+        )
+    )})
+
+# Transiciones de estado en bloque
+@login_required
+@require_POST
+def api_transicionar(request, modelo):
+    try:
+        datos = json.loads(request.body)
+        ids = [int(pk) for pk in datos['ids']]
+        destino = datos['estado']
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'error': 'Envíe JSON con ids (lista de identificadores) y estado'}, status=400)
+    try:
+        resultado = estados.transicionar(
+            modelo, ids, destino, usuario=request.user, motivo=str(datos.get('motivo') or '')[:255],
+        )
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse(resultado)
+
+# Facturación en lote
+@login_required
+@require_POST
+def api_facturar_pedidos(request):
+    try:
+        fecha = request.POST.get('fecha')
+        fecha = datetime.date.fromisoformat(fecha) if fecha else None
+    except ValueError:
+        return JsonResponse({'error': 'La fecha debe tener formato AAAA-MM-DD'}, status=400)
+    resultado = facturacion.facturar(fecha=fecha)
+    return JsonResponse(resultado, status=201 if resultado['facturadas'] else 200)
+
+# Telemetría
+@csrf_exempt
+@require_POST
+def api_ingerir_telemetria(request):
+    # Los equipos se autentican con el token de su DispositivoTelemetria: Authorization: Token <token>
+    esquema, _, token = request.headers.get('Authorization', '').partition(' ')
+    dispositivo = None
+    if esquema == 'Token' and token:
+        dispositivo = DispositivoTelemetria.objects.filter(token=token, activo=True).only('pk').first()
+    if dispositivo is None:
+        return JsonResponse({'error': 'Token de dispositivo no válido'}, status=401)
+    try:
+        datos = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'El cuerpo debe ser JSON'}, status=400)
+    datos = datos.get('lecturas') if isinstance(datos, dict) else datos
+    if not isinstance(datos, list):
+        return JsonResponse({'error': 'Envíe una lista de lecturas'}, status=400)
+    if len(datos) > getattr(settings, 'TELEMETRIA_LOTE_MAXIMO', 5000):
+        return JsonResponse({'error': 'Demasiadas lecturas en un solo lote'}, status=413)
+    lecturas, errores = [], []
+    for posicion, lectura in enumerate(datos):
+        try:
+            lecturas.append(telemetria.leer_lectura(dispositivo.pk, lectura))
+        except (ValueError, AttributeError) as error:
+            errores.append({'posicion': posicion, 'error': str(error)})
+    return JsonResponse({'recibidas': telemetria.ingerir(lecturas), 'errores': errores}, status=201 if lecturas else 400)
+
+@login_required
+@require_GET
+def api_serie_telemetria(request, codigo):
+    dispositivo = get_object_or_404(DispositivoTelemetria, codigo=codigo)
+    try:
+        desde = telemetria.leer_momento(request.GET['desde'])
+        hasta = telemetria.leer_momento(request.GET['hasta']) if request.GET.get('hasta') else timezone.now()
+        granularidad, puntos = telemetria.serie(dispositivo.pk, desde, hasta, request.GET.get('granularidad'))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Indique desde (y opcionalmente hasta) en ISO 8601 y una granularidad válida'}, status=400)
+    return JsonResponse({'dispositivo': dispositivo.codigo, 'granularidad': granularidad, 'puntos': puntos})
+
+@login_required
+@require_GET
+def api_estado_telemetria(request):
+    return JsonResponse({'estados': list(
+        EstadoDispositivo.objects.values(
+            'dispositivo__codigo', 'dispositivo__vehiculo__codigo', 'dispositivo__maquinaria__codigo',
+            'momento', 'latitud', 'longitud', 'velocidad', 'horas_motor',
+        ).order_by('dispositivo__codigo')
+    )})
+
+# Sensores de campo
+@csrf_exempt
+@require_POST
+def api_registrar_lecturas_sensores(request):
+    # Cada sensor se autentica con su propio token: Authorization: Token <token>
+    esquema, _, token = request.headers.get('Authorization', '').partition(' ')
+    sensor = None
+    if esquema == 'Token' and token:
+        sensor = Sensor.objects.filter(token=token, activo=True).only('pk', 'codigo').first()
+    if sensor is None:
+        return JsonResponse({'error': 'Token de sensor no válido'}, status=401)
+    try:
+        datos = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'El cuerpo debe ser JSON'}, status=400)
+    datos = datos.get('lecturas') if isinstance(datos, dict) else datos
+    if not isinstance(datos, list) or not all(isinstance(fila, dict) for fila in datos):
+        return JsonResponse({'error': 'Envíe una lista de lecturas {momento, valor}'}, status=400)
+    if len(datos) > getattr(settings, 'TELEMETRIA_LOTE_MAXIMO', 5000):
+        return JsonResponse({'error': 'Demasiadas lecturas en un solo lote'}, status=413)
+    ternas, errores = sensores.leer_lecturas(datos, sensor)
+    return JsonResponse({'recibidas': sensores.registrar_lecturas(ternas), 'errores': errores}, status=201 if ternas else 400)
+
+@login_required
+@require_GET
+def api_serie_sensor(request, codigo):
+    sensor = get_object_or_404(Sensor, codigo=codigo)
+    try:
+        desde = telemetria.leer_momento(request.GET['desde'])
+        hasta = telemetria.leer_momento(request.GET['hasta']) if request.GET.get('hasta') else timezone.now()
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Indique desde (y opcionalmente hasta) en ISO 8601'}, status=400)
+    granularidad = request.GET.get('granularidad', 'hora')
+    if granularidad == 'lectura':
+        puntos = [{'momento': momento, 'valor': valor} for momento, valor in sensores.lecturas_crudas(sensor.pk, desde, hasta)]
+    elif granularidad in ('hora', 'dia'):
+        puntos = sensores.serie(sensor.pk, desde, hasta, granularidad)
+    else:
+        return JsonResponse({'error': 'La granularidad debe ser lectura, hora o dia'}, status=400)
+    return JsonResponse({'sensor': sensor.codigo, 'granularidad': granularidad, 'puntos': puntos})
+
+@login_required
+@require_GET
+def api_sensores_por_parcela(request):
+    tipo = request.GET.get('tipo', 'humedad_suelo')
+    if tipo not in dict(Sensor.TIPO_CHOICES):
+        return JsonResponse({'error': 'Tipo de sensor desconocido'}, status=400)
+    try:
+        dias = int(request.GET.get('dias', 7))
+        if dias < 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'dias debe ser un número entero positivo'}, status=400)
+    hoy = timezone.localdate()
+    datos = sensores.por_parcela(tipo, hoy - datetime.timedelta(days=dias - 1), hoy)
+    return JsonResponse({'tipo': tipo, 'dias': dias, 'parcelas': [
+        {'parcela': parcela_id, **valores} for parcela_id, valores in sorted(datos.items())
+    ]})
+
+@login_required
+@require_GET
+def api_balance_riego(request):
+    return JsonResponse({'planes': sensores.balance_riego()})
+
+# Fenología
+@login_required
+@require_GET
+def api_fenologia_cultivo(request, pk):
+    cultivo = get_object_or_404(Cultivo, pk=pk)
+    etapas = list(
+        PrediccionEtapa.objects
+        .filter(cultivo=cultivo)
+        .order_by('umbral__grados_dia')
+        .values('umbral__etapa', 'umbral__grados_dia', 'umbral__es_cosecha', 'fecha_estimada', 'fecha_observada',
+                'grados_dia_acumulados', 'fecha_calculo')
+    )
+    return JsonResponse({
+        'cultivo': cultivo.pk,
+        'fecha_siembra': cultivo.fecha_siembra,
+        'fecha_cosecha_estimada': cultivo.fecha_cosecha_estimada,
+        'etapas': etapas,
+    })
+
+# Lectura asíncrona (tableros y aplicación móvil)
+CAMPOS_PARCELA = (
+    'id', 'codigo', 'nombre', 'superficie', 'ubicacion', 'fecha_ultima_utilizacion', 'potencial_productivo',
+    'latitud', 'longitud',
+)
+CAMPOS_CULTIVO = (
+    'id', 'parcela_id', 'parcela__codigo', 'variedad_id', 'variedad__nombre', 'fecha_siembra',
+    'fecha_cosecha_estimada', 'fecha_cosecha_real', 'area_sembrada', 'rendimiento_obtenido',
+)
+
+def _valores_parcelas(consulta):
+    # fecha_ultima_utilizacion se sirve derivada de los segmentos de ocupación
+    return parcelas.con_ultima_utilizacion(consulta).values(*CAMPOS_PARCELA, 'fin_ocupacion')
+
+def _fila_parcela(fila):
+    fila['fecha_ultima_utilizacion'] = parcelas.ultima_utilizacion(
+        fila['fecha_ultima_utilizacion'], fila.pop('fin_ocupacion'),
+    )
+    return fila
+
+def _consulta_aislada(consulta):
+    # Cada consulta va en un hilo del ejecutor con su propia conexión, que se cierra al terminar
+    def ejecutar():
+        try:
+            return consulta()
+        finally:
+            connections.close_all()
+    return sync_to_async(ejecutar, thread_sensitive=False)()
+
+async def _en_paralelo(**consultas):
+    """
+    Ejecuta a la vez consultas independientes (funciones sin argumentos) y
+    devuelve sus resultados por nombre. El ORM asíncrono serializa sus
+    consultas en un único hilo; éstas no. Con SQLite, que corre dentro del
+    proceso, los hilos sólo competirían por el GIL, así que por omisión se
+    ejecutan seguidas en un único salto a un hilo.
+    """
+    concurrentes = getattr(settings, 'API_CONSULTAS_CONCURRENTES', None)
+    if concurrentes is None:
+        concurrentes = connection.vendor != 'sqlite'
+    if not concurrentes:
+        return await sync_to_async(lambda: {nombre: consulta() for nombre, consulta in consultas.items()})()
+    resultados = await asyncio.gather(*(_consulta_aislada(consulta) for consulta in consultas.values()))
+    return dict(zip(consultas, resultados))
+
+def _pagina(request, maximo=500):
+    desde = int(request.GET.get('desde', 0))
+    limite = min(int(request.GET.get('limite', 50)), maximo)
+    if desde < 0 or limite < 1:
+        raise ValueError
+    return desde, limite
+
+@login_required
+@require_GET
+async def api_dashboard(request):
+    indicadores = await _en_paralelo(
+        cultivos_activos=Cultivo.objects.filter(fecha_cosecha_real__isnull=True).count,
+        parcelas_total=Parcela.objects.count,
+        productos_inventario=lambda: InventarioProducto.objects.aggregate(total=Sum('cantidad_disponible'))['total'] or 0,
+        pedidos_pendientes=Pedido.objects.filter(estado='pendiente').count,
+        envios_hoy=Envio.objects.filter(fecha_programada=timezone.localdate()).count,
+        saldo_por_cobrar=lambda: cobranzas.facturas_pendientes().aggregate(total=Sum('saldo'))['total'] or 0,
+    )
+    return JsonResponse(indicadores)
+
+@login_required
+@require_GET
+async def api_parcelas(request):
+    try:
+        desde, limite = _pagina(request)
+    except ValueError:
+        return JsonResponse({'error': 'desde y limite deben ser números enteros positivos'}, status=400)
+    consulta = _valores_parcelas(Parcela.objects.order_by('codigo'))
+    return JsonResponse({
+        'total': await Parcela.objects.acount(),
+        'parcelas': [_fila_parcela(fila) async for fila in consulta[desde:desde + limite]],
+    })
+
+@login_required
+@require_GET
+async def api_parcela(request, pk):
+    datos = await _en_paralelo(
+        parcela=lambda: next(map(_fila_parcela, _valores_parcelas(Parcela.objects.filter(pk=pk))), None),
+        analisis_suelo=lambda: list(
+            AnalisisSuelo.objects.filter(parcela_id=pk).order_by('-fecha_analisis')
+            .values('id', 'fecha_analisis', 'ph', 'materia_organica', 'nitrogeno', 'fosforo', 'potasio')
+        ),
+        cultivos=lambda: list(Cultivo.objects.filter(parcela_id=pk).order_by('-fecha_siembra').values(*CAMPOS_CULTIVO)),
+        sensores=lambda: list(Sensor.objects.filter(parcela_id=pk).order_by('codigo').values('id', 'codigo', 'tipo', 'activo')),
+    )
+    if datos['parcela'] is None:
+        return JsonResponse({'error': 'Parcela no encontrada'}, status=404)
+    return JsonResponse(datos)
+
+@login_required
+@require_GET
+async def api_cultivos(request):
+    try:
+        desde, limite = _pagina(request)
+    except ValueError:
+        return JsonResponse({'error': 'desde y limite deben ser números enteros positivos'}, status=400)
+    # Mismos filtros que CultivoListView
+    cultivos = Cultivo.objects.order_by('-fecha_siembra', 'pk')
+    try:
+        if request.GET.get('fecha_siembra'):
+            cultivos = cultivos.filter(fecha_siembra__year=int(request.GET['fecha_siembra']))
+        if request.GET.get('parcela'):
+            cultivos = cultivos.filter(parcela_id=int(request.GET['parcela']))
+        if request.GET.get('tipo_cultivo'):
+            cultivos = cultivos.filter(variedad__tipo_cultivo_id=int(request.GET['tipo_cultivo']))
+    except ValueError:
+        return JsonResponse({'error': 'Filtros no válidos'}, status=400)
+    return JsonResponse({
+        'total': await cultivos.acount(),
+        'cultivos': [fila async for fila in cultivos.values(*CAMPOS_CULTIVO)[desde:desde + limite]],
+    })
+
+@login_required
+@require_GET
+async def api_cultivo(request, pk):
+    datos = await _en_paralelo(
+        cultivo=lambda: Cultivo.objects.filter(pk=pk).values(*CAMPOS_CULTIVO).first(),
+        etapas=lambda: list(
+            EtapaFenologica.objects.filter(cultivo_id=pk).order_by('fecha_inicio')
+            .values('id', 'nombre', 'fecha_inicio', 'fecha_fin')
+        ),
+        etapas_previstas=lambda: list(
+            PrediccionEtapa.objects.filter(cultivo_id=pk).order_by('umbral__grados_dia')
+            .values('umbral__etapa', 'fecha_estimada', 'fecha_observada')
+        ),
+        planes_riego=lambda: list(
+            PlanRiego.objects.filter(cultivo_id=pk)
+            .values('id', 'sistema_riego__nombre', 'fuente_agua__nombre', 'frecuencia_dias', 'cantidad_agua', 'duracion')
+        ),
+        planes_fertilizacion=lambda: list(PlanFertilizacion.objects.filter(cultivo_id=pk).values('id', 'nombre')),
+        controles=lambda: list(
+            ControlPlagasEnfermedades.objects.filter(cultivo_id=pk).order_by('-fecha_deteccion')
+            .values('id', 'tipo_incidencia', 'plaga__nombre', 'enfermedad__nombre', 'fecha_deteccion',
+                    'nivel_infestacion', 'area_afectada')
+        ),
+        labores=lambda: list(
+            LaborAgricola.objects.filter(cultivo_id=pk).order_by('-fecha_realizacion')
+            .values('id', 'tipo_labor__nombre', 'fecha_realizacion', 'horas_empleadas', 'personal_asignado')
+        ),
+    )
+    if datos['cultivo'] is None:
+        return JsonResponse({'error': 'Cultivo no encontrado'}, status=404)
+    return JsonResponse(datos)
+
+# Eventos de estado (Server-Sent Events)
+def _ids_de_peticion(request, nombre):
+    return [int(valor) for valor in request.GET.get(nombre, '').split(',') if valor.strip()]
+
+def _evento_sse(datos, tipo=None, numero=None):
+    lineas = []
+    if numero is not None:
+        lineas.append(f"id: {numero}")
+    if tipo:
+        lineas.append(f"event: {tipo}")
+    lineas.append(f"data: {json.dumps(datos, cls=DjangoJSONEncoder)}")
+    return '\n'.join(lineas) + '\n\n'
+
+async def _estado_actual(pedido_ids, envio_ids, cliente_ids):
+    # Instantánea inicial: el cliente no necesita consultar nada al conectarse
+    pedidos = Pedido.objects.filter(pk__in=pedido_ids)
+    if cliente_ids:
+        pedidos = pedidos | Pedido.objects.filter(cliente_id__in=cliente_ids).exclude(estado__in=('entregado', 'cancelado'))
+    estados = [
+        {'tipo': 'pedido', **fila}
+        async for fila in pedidos.values('id', 'codigo', 'cliente', 'estado')
+    ]
+    estados += [
+        {'tipo': 'envio', **fila}
+        async for fila in Envio.objects.filter(pk__in=envio_ids).values('id', 'codigo', 'estado')
+    ]
+    return estados
+
+def _evento_publicado(evento):
+    # Los canales son internos del broker y delatan qué clientes y pedidos toca el cambio
+    datos = {clave: valor for clave, valor in evento.items() if clave != 'canales'}
+    return _evento_sse(datos, evento['tipo'], evento['numero'])
+
+async def _flujo_eventos(suscripcion, iniciales, latido, tipos):
+    try:
+        yield 'retry: 5000\n\n'
+        for evento in iniciales:
+            yield evento
+        while not suscripcion.agotada:
+            evento = await suscripcion.siguiente(latido)
+            if evento is None:
+                yield ': latido\n\n'
+            elif evento['tipo'] in tipos:
+                yield _evento_publicado(evento)
+    finally:
+        suscripcion.cerrar()
+
+async def _puede_ver(usuario, permiso):
+    return usuario.is_staff or await usuario.ahas_perm(permiso)
+
+@login_required
+@require_GET
+async def api_eventos_estado(request):
+    """
+    Flujo SSE con los cambios de estado de los pedidos, envíos y clientes
+    indicados (?pedidos=1,2&envios=3&clientes=4) o, para personal, de todos
+    (?todos=1). Al conectarse envía el estado actual; al reconectarse con
+    Last-Event-ID, los eventos perdidos.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'El flujo de eventos requiere un servidor ASGI'}, status=501)
+    try:
+        pedido_ids = _ids_de_peticion(request, 'pedidos')
+        envio_ids = _ids_de_peticion(request, 'envios')
+        cliente_ids = _ids_de_peticion(request, 'clientes')
+        ultimo = request.headers.get('Last-Event-ID') or request.GET.get('desde')
+        ultimo = int(ultimo) if ultimo else None
+    except ValueError:
+        return JsonResponse({'error': 'Los identificadores deben ser números enteros'}, status=400)
+    # Los pedidos de un cliente no son de todos los usuarios: cada canal exige
+    # ser personal o tener permiso de ver el modelo que publica
+    usuario = await request.auser()
+    ver_pedidos = await _puede_ver(usuario, 'agro_management.view_pedido')
+    ver_envios = await _puede_ver(usuario, 'agro_management.view_envio')
+    if (pedido_ids or cliente_ids) and not ver_pedidos:
+        return JsonResponse({'error': 'No tiene permiso para ver pedidos'}, status=403)
+    if envio_ids and not ver_envios:
+        return JsonResponse({'error': 'No tiene permiso para ver envíos'}, status=403)
+    # Los canales de pedido y de cliente también llevan los envíos de esos
+    # pedidos: sólo se entregan a quien puede ver envíos
+    tipos = {tipo for tipo, permitido in (('pedido', ver_pedidos), ('envio', ver_envios)) if permitido}
+    canales = (
+        [f'pedido:{pk}' for pk in pedido_ids] + [f'envio:{pk}' for pk in envio_ids]
+        + [f'cliente:{pk}' for pk in cliente_ids]
+    )
+    if request.GET.get('todos'):
+        if not usuario.is_staff:
+            return JsonResponse({'error': 'Sólo el personal puede suscribirse a todos los cambios'}, status=403)
+        canales += ['pedidos', 'envios']
+    if not canales:
+        return JsonResponse({'error': 'Indique pedidos, envios, clientes o todos'}, status=400)
+
+    # Suscribirse antes de leer el estado actual para no perder cambios intermedios
+    suscripcion, pendientes = eventos.obtener_broker().suscribir(canales, desde=ultimo)
+    if pendientes is None:
+        iniciales = [_evento_sse(estado, 'estado') for estado in await _estado_actual(pedido_ids, envio_ids, cliente_ids)]
+    else:
+        iniciales = [_evento_publicado(evento) for evento in pendientes if evento['tipo'] in tipos]
+    respuesta = StreamingHttpResponse(
+        _flujo_eventos(suscripcion, iniciales, getattr(settings, 'EVENTOS_LATIDO_SEGUNDOS', 15), tipos),
+        content_type='text/event-stream',
+    )
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
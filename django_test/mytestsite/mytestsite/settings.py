@@ -93,6 +93,22 @@ DATABASES = {
     }
 }
 
+#####################################
+# CACHÉ
+#####################################
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Secciones de los informes financieros: en la base de datos para que las
+    # compartan los procesos web y los comandos (la tabla la crea la migración 0026)
+    'informes': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_informes',
+    },
+}
+
 #####################################
 # VALIDACIÓN DE CONTRASEÑAS
 #####################################
@@ -135,5 +151,113 @@ USE_TZ = True
 # URL para archivos estáticos
 STATIC_URL = 'static/'
 
+#####################################
+# CONFIGURACIÓN DE LA APLICACIÓN
+#####################################
+
+# Directorio donde se escriben los informes financieros generados
+INFORMES_DIR = BASE_DIR / 'informes'
+
+# Segundos que se conservan en caché las secciones calculadas de un informe
+INFORMES_CACHE_TIMEOUT = 60 * 60
+
+# Procesos de trabajo para calcular secciones (None: uno por sección)
+INFORMES_MAX_WORKERS = None
+
+# Días de uso reciente con los que se estima el uso diario de cada máquina
+MANTENIMIENTO_DIAS_PROMEDIO_USO = 30
+
+# Horas máximas que una máquina u operador puede tener reservadas en un día
+OCUPACION_HORAS_MAXIMAS_DIA = 24
+
+# Horas máximas que se asignan a un trabajador en un día
+ASIGNACION_HORAS_MAXIMAS_DIA = 8
+
+# Parámetros de nómina: horas de un mes, jornada ordinaria semanal y recargo de horas extra
+NOMINA_HORAS_MES = 240
+NOMINA_HORAS_ORDINARIAS_SEMANA = 48
+NOMINA_FACTOR_HORA_EXTRA = '1.25'
+
+# Puntuaciones (0 a 1) para confirmar o proponer un proveedor a partir del texto de un lote
+PROVEEDORES_UMBRAL_CONFIRMACION = 0.92
+PROVEEDORES_UMBRAL_PROPUESTA = 0.75
+
+# Pesos de las subpuntuaciones de EvaluacionProveedor y de la puntuación compuesta de IndicadorProveedor
+PROVEEDORES_PESOS_EVALUACION = {
+    'calidad_productos': 0.4,
+    'puntualidad_entregas': 0.3,
+    'precio_competitividad': 0.2,
+    'servicio_atencion': 0.1,
+}
+PROVEEDORES_PESOS_INDICADOR = {
+    'evaluacion': 0.7,
+    'caducidad': 0.15,
+    'consumo': 0.15,
+}
+
+# Observaciones ficticias con las que los factores de pronóstico se contraen hacia el rendimiento esperado
+PRONOSTICO_PESO_PREVIO = 3
+
+# Siembras recientes de una parcela cuyo tipo de cultivo no se recomienda repetir
+ROTACION_CICLOS_SIN_REPETIR = 2
+
+# Hora de salida de los envíos creados por la consolidación de pedidos
+ENVIOS_HORA_SALIDA = '06:00'
+
+# Matriz de distancias y tiempos entre puntos de entrega (CSV: origen,destino,distancia_km,minutos)
+RUTAS_MATRIZ_DISTANCIAS = BASE_DIR / 'datos' / 'matriz_distancias.csv'
+
+# Minutos que se detiene un envío en cada dirección de entrega
+RUTAS_MINUTOS_POR_PARADA = 10
+
+# Telemetría: días que se conservan las lecturas y los resúmenes por minuto (los horarios no se borran)
+TELEMETRIA_DIAS_LECTURAS = 30
+TELEMETRIA_DIAS_RESUMEN_MINUTO = 90
+
+# Velocidad (km/h) a partir de la cual un vehículo con GPS pasa a En ruta
+TELEMETRIA_VELOCIDAD_EN_RUTA = 5
+
+# Lecturas máximas por petición de ingesta
+TELEMETRIA_LOTE_MAXIMO = 5000
+
+# Sensores de campo: días que se conservan los bloques de lecturas y los agregados por hora (los diarios no se borran)
+SENSORES_DIAS_BLOQUES = 90
+SENSORES_DIAS_AGREGADO_HORA = 400
+
+# Humedad del suelo (% volumétrico) por debajo de la cual se recomienda regar
+SENSORES_HUMEDAD_OBJETIVO = 30
+
+# Días hacia adelante en que se buscan las etapas fenológicas por grados-día
+FENOLOGIA_HORIZONTE_DIAS = 365
+
+# Consultas independientes de la API asíncrona en hilos paralelos (None: sí, salvo con SQLite)
+API_CONSULTAS_CONCURRENTES = None
+
+# Eventos de estado: broker (clase con publicar/suscribir), eventos que se guardan para
+# las reconexiones, eventos en cola por conexión y segundos entre latidos de una conexión inactiva
+EVENTOS_BROKER = 'agro_management.eventos.BrokerLocal'
+EVENTOS_HISTORIAL = 1000
+EVENTOS_COLA_MAXIMA = 1000
+EVENTOS_LATIDO_SEGUNDOS = 15
+
+# Facturación en lote: tasa de impuestos sobre el neto, días hasta el vencimiento
+# y si se factura al marcar pedidos como entregados
+FACTURACION_TASA_IMPUESTOS = '0.18'
+FACTURACION_DIAS_CREDITO = 30
+FACTURACION_AL_ENTREGAR = True
+
+# Códigos de negocio asignados por secuencias.py a los registros que se guardan sin código:
+# formato por modelo ({anio} reinicia la numeración cada año) y números que reserva cada proceso
+CODIGOS_FORMATOS = {
+    'agro_management.Pedido': 'PED-{anio}-{numero:06d}',
+    'agro_management.Envio': 'ENV-{anio}-{numero:06d}',
+    'agro_management.Factura': 'F-{numero:08d}',
+    'agro_management.CostoOperativo': 'CO-{anio}-{numero:06d}',
+    'agro_management.MantenimientoMaquinaria': 'MAN-{anio}-{numero:06d}',
+    'agro_management.Contrato': 'CTR-{numero:06d}',
+    'agro_management.ProductoTerminado': 'PT-{anio}-{numero:06d}',
+}
+CODIGOS_BLOQUE = 100
+
 # Tipo de clave primaria por defecto
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -3,6 +3,7 @@ Configuración de URLs para el proyecto mytestsite.
 
 Este archivo define las rutas principales del proyecto:
 - /admin/: Panel de administración de Django
+- /agro/: Rutas de la aplicación agro_management (API)
 - /: Redirección al panel de administración
 """
 
@@ -16,6 +17,9 @@ urlpatterns = [
     # Ruta para el panel de administración de Django
     path('admin/', admin.site.urls),
     
+    # Rutas de la aplicación de gestión agrícola
+    path('agro/', include('agro_management.urls')),
+    
     # Redireccionar la página principal al panel de administración
     path('', RedirectView.as_view(url='/admin/', permanent=True)),
 ]